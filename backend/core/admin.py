@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Patient, Staff, Appointment, Billing, InventoryItem, Acte
+from .models import Patient, Staff, Appointment, Billing, InventoryItem, Acte, WorkingHours, StockMovement, ActeConsumable
 
 
 @admin.register(Patient)
@@ -26,10 +26,16 @@ class StaffAdmin(admin.ModelAdmin):
 
 @admin.register(Appointment)
 class AppointmentAdmin(admin.ModelAdmin):
-    list_display = ('id', 'patient', 'staff', 'date', 'status', 'tenant')
+    list_display = ('id', 'patient', 'staff', 'date', 'duration_minutes', 'status', 'tenant')
     list_filter = ('status',)
 
 
+@admin.register(WorkingHours)
+class WorkingHoursAdmin(admin.ModelAdmin):
+    list_display = ('staff', 'weekday', 'start', 'end')
+    list_filter = ('weekday',)
+
+
 @admin.register(Billing)
 class BillingAdmin(admin.ModelAdmin):
     def paid_display(self, obj):
@@ -46,9 +52,37 @@ class InventoryAdmin(admin.ModelAdmin):
     list_display = ('sku', 'name', 'quantity', 'tenant')
     search_fields = ('sku', 'name')
 
+    def get_readonly_fields(self, request, obj=None):
+        # after creation stock only changes through StockMovement
+        return ('quantity',) if obj is not None else ()
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ('occurred_at', 'item', 'kind', 'delta', 'reference', 'staff', 'tenant')
+    search_fields = ('item__sku', 'item__name', 'reference')
+    list_filter = ('kind',)
+
+    # append-only ledger: posted through the API (StockMovement.post)
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class ActeConsumableInline(admin.TabularInline):
+    model = ActeConsumable
+    extra = 0
+    autocomplete_fields = ('item',)
+
 
 @admin.register(Acte)
 class ActeAdmin(admin.ModelAdmin):
+    inlines = [ActeConsumableInline]
     list_display = ('code', 'name', 'parent', 'amount', 'currency', 'active', 'tenant')
     search_fields = ('code', 'name', 'parent__name')
     list_filter = ('active',)
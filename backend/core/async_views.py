@@ -0,0 +1,125 @@
+"""Async versions of the heaviest read endpoints.
+
+Routed in front of their DRF counterparts when `ASYNC_READ_VIEWS` is on
+(the default under hms.asgi): billing totals, patient detail and `me/`.
+They run on the event loop and use the async ORM, so a worker keeps serving
+other requests while a slow query runs. Authentication, role checks, tenant
+scoping and response bodies are those of the sync views; other methods on
+the same routes (patient updates, ...) are handed to the viewsets.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from hms import perf
+from hms.replicas import read_alias
+from tenants.sharding import db_for_tenant
+
+from . import views
+from .models import Patient, Staff
+from .permissions import RolePermission
+from .serializers import PatientSerializer
+
+# as routed: with the action's own permission_classes
+_totals_view = views.BillingViewSet.as_view({'get': 'totals'}, **views.BillingViewSet.totals.kwargs)
+_patient_view = views.PatientViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'})
+
+
+def _render(data, status=200):
+    # same bytes as the DRF views' JSON responses
+    with perf.timed('render'):
+        body = JSONRenderer().render(data)
+    return HttpResponse(body, status=status, content_type='application/json')
+
+
+def _authorize(request, authenticated=True, view=None):
+    """Authenticate `request` with the DRF authenticators and apply the
+    IsAuthenticated / RolePermission checks; returns the DRF request."""
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    user = drf_request.user
+    if authenticated and not user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    if view is not None and not RolePermission().has_permission(drf_request, view):
+        raise exceptions.PermissionDenied()
+    return drf_request
+
+
+async def _authorized(request, **kwargs):
+    """(DRF request, None), or (None, error response) as APIView would answer."""
+    try:
+        return await sync_to_async(_authorize)(request, **kwargs), None
+    except exceptions.APIException as exc:
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = _render(data, status=exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            authenticators = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+            header = authenticators[0]().authenticate_header(request) if authenticators else None
+            if header:
+                response['WWW-Authenticate'] = header
+            else:
+                response.status_code = 403
+        return None, response
+
+
+@csrf_exempt
+async def billing_totals(request):
+    """Async `BillingViewSet.totals`."""
+    if request.method != 'GET':
+        return await sync_to_async(_totals_view)(request)
+    drf_request, denied = await _authorized(request, authenticated=False)
+    if denied:
+        return denied
+    try:
+        qs = views.BillingViewSet.totals_queryset(getattr(request, 'tenant', None), drf_request.query_params)
+    except ValueError as exc:
+        return _render({'detail': str(exc)}, status=400)
+    return _render(views.BillingViewSet.totals_result([row async for row in qs]))
+
+
+@csrf_exempt
+async def patient_detail(request, pk):
+    """Async `PatientViewSet.retrieve`, with the paginated nested history and
+    the same conditional GET handling."""
+    if request.method != 'GET':
+        return await sync_to_async(_patient_view)(request, pk=pk)
+    drf_request, denied = await _authorized(request, view=views.PatientViewSet())
+    if denied:
+        return denied
+    view = views.PatientViewSet(request=drf_request, args=(), kwargs={'pk': pk}, action='retrieve', format_kwarg=None)
+    validators = await sync_to_async(view.validators)()
+    if validators is not None:
+        not_modified = get_conditional_response(request, *validators)
+        if not_modified is not None:
+            return view.with_validators(not_modified, *validators)
+    tenant = getattr(request, 'tenant', None)
+    patient = None
+    if tenant is not None:
+        alias = await sync_to_async(read_alias)(db_for_tenant(tenant))
+        patient = await Patient.objects.using(alias).filter(tenant=tenant, pk=pk).afirst()
+    if patient is None:
+        return _render({'detail': 'No Patient matches the given query.'}, status=404)
+
+    serializer = perf.timed_serializer(PatientSerializer(patient, context={'request': drf_request}))
+    start, end = serializer.history_window()
+    serializer.context['appointments'] = [a async for a in patient.appointments.all().order_by('-date')[start:end]]
+    serializer.context['billings'] = [b async for b in PatientSerializer.billing_history(patient)[start:end]]
+    response = _render(serializer.data)
+    return view.with_validators(response, *validators) if validators is not None else response
+
+
+@csrf_exempt
+async def current_user(request):
+    """Async `views.current_user`."""
+    if request.method != 'GET':
+        return await sync_to_async(views.current_user)(request)
+    drf_request, denied = await _authorized(request)
+    if denied:
+        return denied
+    user = drf_request.user
+    staff = await Staff.objects.select_related('tenant', 'user').filter(user_id=user.pk).afirst()
+    return JsonResponse(views.profile_payload(user, staff))
@@ -1,11 +1,39 @@
 from django.contrib.auth import get_user_model
 from django.db.models import Q
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from tenants.sharding import find_staff
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Signed claims describing the user's Staff profile. TenantMiddleware and
+# RolePermission trust them so they need no database queries; tokens issued
+# before these claims existed fall back to the database.
+STAFF_CLAIMS = ('tenant_id', 'tenant_slug', 'staff_id', 'role')
+
+
+def add_staff_claims(token, user):
+    """Embed (or refresh) the STAFF_CLAIMS of `user` into `token`."""
+    claims = dict.fromkeys(STAFF_CLAIMS)
+    try:
+        # the profile lives on the tenant's shard, unknown at login time
+        staff = find_staff(user)
+    except Exception:
+        staff = None
+    if staff is not None:
+        claims['staff_id'] = str(staff.id)
+        claims['role'] = staff.role
+        tenant = getattr(staff, 'tenant', None)
+        if tenant is not None:
+            claims['tenant_id'] = str(tenant.id)
+            claims['tenant_slug'] = tenant.slug
+    for key, value in claims.items():
+        token[key] = value
+    return token
+
 
 class EmailOrUsernameTokenSerializer(TokenObtainPairSerializer):
     """Allow users to authenticate with either username or email.
@@ -16,7 +44,8 @@ class EmailOrUsernameTokenSerializer(TokenObtainPairSerializer):
 
     @classmethod
     def get_token(cls, user):
-        return super().get_token(user)
+        # claims are copied from the refresh token into its access tokens
+        return add_staff_claims(super().get_token(user), user)
 
     def validate(self, attrs):
         username = attrs.get('username')
@@ -70,3 +99,24 @@ class EmailOrUsernameTokenSerializer(TokenObtainPairSerializer):
 
 class EmailOrUsernameTokenView(TokenObtainPairView):
     serializer_class = EmailOrUsernameTokenSerializer
+
+
+class StaffClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Token refresh that re-reads the user's Staff profile so role/tenant
+    changes show up in the new access token instead of being copied from
+    the refresh token."""
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        user_id = RefreshToken(attrs['refresh'], verify=False).payload.get(api_settings.USER_ID_CLAIM)
+        user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is not None:
+            access = add_staff_claims(AccessToken(data['access']), user)
+            data['access'] = str(access)
+            if 'refresh' in data:
+                data['refresh'] = str(add_staff_claims(RefreshToken(data['refresh']), user))
+        return data
+
+
+class StaffClaimsTokenRefreshView(TokenRefreshView):
+    serializer_class = StaffClaimsTokenRefreshSerializer
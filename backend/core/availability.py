@@ -0,0 +1,139 @@
+"""Staff availability: free slots and booking conflicts.
+
+Bookings of every requested staff member over the whole range are loaded
+with a single query and folded into sorted, merged busy intervals per staff;
+working hours come from a second query. Free time is then the working spans
+minus the busy intervals, walked linearly, so searching a week for dozens of
+doctors stays cheap.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import APPOINTMENT_MAX_DURATION, Appointment, WorkingHours
+
+# statuses that do not occupy the staff member's agenda
+FREE_STATUSES = ('cancelled',)
+
+
+def _default_hours():
+    """settings.APPOINTMENT_WORKING_HOURS: {weekday: [(start, end), ...]}, Mon-Fri 08:00-17:00 by default."""
+    hours = getattr(settings, 'APPOINTMENT_WORKING_HOURS', None)
+    if hours is None:
+        hours = {day: [('08:00', '17:00')] for day in range(5)}
+    return {
+        int(day): [(time.fromisoformat(str(a)), time.fromisoformat(str(b))) for a, b in spans]
+        for day, spans in hours.items()
+    }
+
+
+def busy_intervals(tenant, staff_ids, start, end, exclude_id=None):
+    """{staff_id: [(start, end), ...]} of merged bookings overlapping [start, end)."""
+    qs = (
+        Appointment.objects.filter(
+            tenant=tenant,
+            staff_id__in=staff_ids,
+            date__lt=end,
+            # a booking can start before the range and run into it
+            date__gt=start - timedelta(minutes=APPOINTMENT_MAX_DURATION),
+        )
+        .exclude(status__in=FREE_STATUSES)
+        .order_by('staff_id', 'date')
+    )
+    if exclude_id is not None:
+        qs = qs.exclude(id=exclude_id)
+    default = getattr(settings, 'APPOINTMENT_DEFAULT_DURATION', 30)
+    busy = defaultdict(list)
+    for staff_id, date, minutes in qs.values_list('staff_id', 'date', 'duration_minutes'):
+        b_start, b_end = date, date + timedelta(minutes=minutes or default)
+        if b_end <= start:
+            continue
+        intervals = busy[staff_id]
+        if intervals and b_start <= intervals[-1][1]:
+            intervals[-1] = (intervals[-1][0], max(intervals[-1][1], b_end))
+        else:
+            intervals.append((b_start, b_end))
+    return busy
+
+
+def working_spans(staff_ids, start, end):
+    """{staff_id: [(start, end), ...]} of working time within [start, end), in order."""
+    custom = defaultdict(lambda: defaultdict(list))
+    for staff_id, weekday, s, e in (
+        WorkingHours.objects.filter(staff_id__in=staff_ids)
+        .order_by('start').values_list('staff_id', 'weekday', 'start', 'end')
+    ):
+        custom[staff_id][weekday].append((s, e))
+    default = _default_hours()
+    tz = timezone.get_current_timezone()
+
+    spans = {}
+    first_day = timezone.localtime(start, tz).date()
+    last_day = timezone.localtime(end, tz).date()
+    for staff_id in staff_ids:
+        hours = custom.get(staff_id) or default
+        out = []
+        day = first_day
+        while day <= last_day:
+            for s, e in hours.get(day.weekday(), []):
+                s_dt = max(timezone.make_aware(datetime.combine(day, s), tz), start)
+                e_dt = min(timezone.make_aware(datetime.combine(day, e), tz), end)
+                if s_dt < e_dt:
+                    out.append((s_dt, e_dt))
+            day += timedelta(days=1)
+        spans[staff_id] = out
+    return spans
+
+
+def free_slots(tenant, staff_ids, start, end, slot_minutes=30):
+    """{staff_id: [(start, end), ...]} of bookable slots of `slot_minutes` in [start, end)."""
+    staff_ids = list(staff_ids)
+    busy = busy_intervals(tenant, staff_ids, start, end)
+    spans = working_spans(staff_ids, start, end)
+    step = timedelta(minutes=slot_minutes)
+    result = {}
+    for staff_id in staff_ids:
+        intervals = busy.get(staff_id, [])
+        slots = []
+        i = 0
+        for s, e in spans[staff_id]:
+            cursor = s
+            # skip bookings that ended before this span
+            while i < len(intervals) and intervals[i][1] <= cursor:
+                i += 1
+            j = i
+            while cursor + step <= e:
+                if j < len(intervals) and intervals[j][0] < cursor + step:
+                    # overlaps a booking: jump past it
+                    cursor = max(cursor, intervals[j][1])
+                    j += 1
+                    continue
+                slots.append((cursor, cursor + step))
+                cursor += step
+        result[staff_id] = slots
+    return result
+
+
+def conflicts(tenant, staff_id, start, duration_minutes=None, exclude_id=None):
+    """Appointments of `staff_id` overlapping a booking at `start` (minimal dicts)."""
+    minutes = duration_minutes or getattr(settings, 'APPOINTMENT_DEFAULT_DURATION', 30)
+    end = start + timedelta(minutes=minutes)
+    qs = (
+        Appointment.objects.filter(
+            tenant=tenant,
+            staff_id=staff_id,
+            date__lt=end,
+            date__gt=start - timedelta(minutes=APPOINTMENT_MAX_DURATION),
+        )
+        .exclude(status__in=FREE_STATUSES)
+        .order_by('date')
+    )
+    if exclude_id is not None:
+        qs = qs.exclude(id=exclude_id)
+    found = []
+    for appt in qs.only('id', 'date', 'duration_minutes'):
+        if appt.end > start:
+            found.append({'id': str(appt.id), 'date': appt.date, 'end': appt.end})
+    return found
@@ -0,0 +1,95 @@
+"""In-process, per-tenant cache of the Acte catalog.
+
+The catalog changes rarely but is read on every invoice creation and acte
+listing. Each worker keeps the most recently used tenants' catalogs in an
+LRU map; an entry is valid as long as its version matches the tenant's
+`ActeCatalogVersion` row, which is bumped on every Acte write. Checking
+freshness therefore costs one primary-key lookup instead of reloading the
+catalog.
+
+Cached Acte instances are shared between requests: treat them as read-only.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from hms import metrics
+
+from .models import Acte, ActeCatalogVersion
+
+
+class ActeCatalog:
+    def __init__(self, tenant_id, version, actes):
+        self.tenant_id = tenant_id
+        self.version = version
+        self.actes = sorted(actes, key=lambda a: ((a.name or '').lower(), a.id))
+        self.by_id = {a.id: a for a in actes}
+        self.by_code = {}
+        self.by_name = {}
+        for a in self.actes:
+            if a.code:
+                self.by_code.setdefault(a.code.lower(), a)
+            self.by_name.setdefault((a.name or '').lower(), a)
+        self.serialized = None
+
+    @property
+    def etag(self):
+        return f'"actes-{uuid.UUID(str(self.tenant_id)).hex}-{self.version}"'
+
+    def lookup(self, ref):
+        """Resolve an id, code or name (case-insensitive); ids win over codes, codes over names."""
+        if ref is None:
+            return None
+        key = str(ref).strip()
+        try:
+            acte = self.by_id.get(uuid.UUID(key))
+        except ValueError:
+            acte = None
+        return acte or self.by_code.get(key.lower()) or self.by_name.get(key.lower())
+
+    def get_serialized(self, serializer_class):
+        # serialize once per version; list responses reuse it
+        if self.serialized is None:
+            self.serialized = serializer_class(self.actes, many=True).data
+        return self.serialized
+
+
+_lock = threading.Lock()
+_catalogs = OrderedDict()
+stats = {'hits': 0, 'misses': 0}
+
+
+def _max_tenants():
+    return getattr(settings, 'ACTE_CATALOG_CACHE_SIZE', 128)
+
+
+def get_catalog(tenant):
+    """Return the up-to-date ActeCatalog of `tenant` (a Tenant or its id)."""
+    tenant_id = getattr(tenant, 'pk', tenant)
+    version = ActeCatalogVersion.current(tenant_id)
+    with _lock:
+        catalog = _catalogs.get(tenant_id)
+        if catalog is not None and catalog.version == version:
+            _catalogs.move_to_end(tenant_id)
+            stats['hits'] += 1
+            metrics.cache_lookup('acte_catalog', True)
+            return catalog
+        stats['misses'] += 1
+        metrics.cache_lookup('acte_catalog', False)
+    catalog = ActeCatalog(tenant_id, version, list(Acte.objects.filter(tenant_id=tenant_id)))
+    with _lock:
+        _catalogs[tenant_id] = catalog
+        _catalogs.move_to_end(tenant_id)
+        while len(_catalogs) > _max_tenants():
+            _catalogs.popitem(last=False)
+    return catalog
+
+
+def invalidate(tenant_id=None):
+    """Drop one tenant's cached catalog (or all of them) in this process."""
+    with _lock:
+        if tenant_id is None:
+            _catalogs.clear()
+        else:
+            _catalogs.pop(tenant_id, None)
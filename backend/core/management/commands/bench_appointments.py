@@ -0,0 +1,136 @@
+import math
+import random
+import time
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the filtered appointment list (today's agenda for one status: date_from, "
+        "date_to and status filters) as the appointment table grows, and print the query "
+        "plan. Seeds a throwaway tenant, deleted afterwards unless --keep is given; the "
+        "response cache is off while measuring."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000', help='Comma-separated appointment counts to measure at (default 10000,100000)')
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per size (default 50)')
+        parser.add_argument('--days', type=int, default=730, help='Appointments are spread over this many days around today (default 730)')
+        parser.add_argument('--status', default='scheduled', help='Status filter of the timed request (default scheduled)')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded tenant and its appointments')
+
+    def handle(self, *args, **options):
+        from core.models import Appointment, Patient, Staff
+        from tenants.models import Tenant
+
+        try:
+            sizes = sorted(int(s) for s in options['sizes'].split(',') if s.strip())
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated integers')
+        if not sizes or sizes[0] < 1 or options['requests'] < 1 or options['days'] < 1:
+            raise CommandError('--sizes, --requests and --days must be positive')
+
+        slug = f'bench-appointments-{uuid.uuid4().hex[:8]}'
+        tenant = Tenant.objects.create(name='Appointment benchmark', slug=slug)
+        try:
+            patients = Patient.objects.bulk_create([
+                Patient(tenant=tenant, first_name='Bench', last_name=str(i), medical_record_number=f'BENCH-{i}')
+                for i in range(50)
+            ])
+            staff = Staff.objects.bulk_create([Staff(tenant=tenant, role='doctor') for _ in range(10)])
+            today = timezone.localdate().isoformat()
+            params = {'date_from': today, 'date_to': today, 'status': options['status']}
+
+            self.stdout.write(f"{'appointments':>12} {'rows':>6} {'avg ms':>8} {'p50 ms':>8} {'p99 ms':>8}")
+            seeded = 0
+            for size in sizes:
+                self._seed(Appointment, tenant, patients, staff, size - seeded, options['days'])
+                seeded = size
+                rows, timings = self._measure(tenant, params, options['requests'])
+                self.stdout.write(
+                    f'{size:>12} {rows:>6} {sum(timings) / len(timings):>8.2f} '
+                    f'{self._pct(timings, 50):>8.2f} {self._pct(timings, 99):>8.2f}'
+                )
+            self.stdout.write('Query plan:')
+            self.stdout.write(self._plan(Appointment, tenant, params))
+        finally:
+            if options['keep']:
+                self.stdout.write(f"Kept tenant '{slug}'.")
+            else:
+                self._drop(tenant)
+
+    @staticmethod
+    def _seed(model, tenant, patients, staff, count, days):
+        statuses = [s for s, _ in model.STATUS]
+        now = timezone.now()
+        batch = []
+        for _ in range(count):
+            batch.append(model(
+                tenant=tenant, patient=random.choice(patients), staff=random.choice(staff),
+                date=now + timedelta(minutes=random.randint(-days * 720, days * 720)),
+                status=random.choice(statuses), duration_minutes=30,
+            ))
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch)
+
+    def _measure(self, tenant, params, count):
+        from core.views import AppointmentViewSet
+
+        view = AppointmentViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+        # superusers pass RolePermission without a staff profile
+        user = get_user_model()(username='bench', is_superuser=True)
+        timings, rows = [], 0
+        with override_settings(RESPONSE_CACHE_TTL=0):
+            for _ in range(count):
+                request = factory.get('/api/appointments/', params)
+                force_authenticate(request, user=user)
+                request.tenant = tenant
+                started = time.perf_counter()
+                response = view(request)
+                response.render()
+                timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    raise CommandError(f'Appointment list answered {response.status_code}: {response.content[:200]!r}')
+                rows = len(response.data)
+        return rows, sorted(timings)
+
+    @staticmethod
+    def _plan(model, tenant, params):
+        from core.views import AppointmentViewSet
+
+        start = AppointmentViewSet._parse_moment(params['date_from'])
+        qs = model.objects.filter(
+            tenant=tenant, status__in=[params['status']],
+            date__gte=start, date__lt=start + timedelta(days=1),
+        ).order_by('-date')
+        return qs.explain()
+
+    @staticmethod
+    def _drop(tenant):
+        from core.models import Appointment, Tombstone
+
+        # raw delete: no per-row signals (tombstones, cache bumps) for seeded rows
+        appointments = Appointment.objects.filter(tenant=tenant)
+        appointments._raw_delete(router.db_for_write(Appointment))
+        tenant_id = tenant.pk
+        tenant.delete()
+        Tombstone.objects.filter(tenant_id=tenant_id).delete()
+
+    @staticmethod
+    def _pct(timings, pct):
+        # nearest-rank percentile of sorted `timings`
+        return timings[max(math.ceil(pct / 100 * len(timings)) - 1, 0)]
@@ -0,0 +1,72 @@
+import copy
+import math
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the database connection cost of one request: a fresh connection per "
+        "request (DB_POOL=off) against the configured DB_POOL mode, each running a "
+        "trivial query between Django's request_started / request_finished signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias (default: default)')
+        parser.add_argument('--requests', type=int, default=200, help='Simulated requests per mode (default 200)')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias not in connections:
+            raise CommandError(f"Unknown database '{alias}'")
+        if options['requests'] < 1:
+            raise CommandError('--requests must be positive')
+        from hms import db_pool
+
+        fresh = self._unpooled(connections[alias])
+        try:
+            baseline = self._measure(lambda: fresh, options['requests'], close=fresh.close)
+        finally:
+            fresh.close()
+        configured = self._measure(lambda: connections[alias], options['requests'])
+
+        self.stdout.write(f"{'mode':<12} {'avg ms':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, timings in (('off', baseline), (db_pool.mode(), configured)):
+            self.stdout.write(f'{name:<12} {self._avg(timings):>8.3f} {self._pct(timings, 50):>8.3f} {self._pct(timings, 99):>8.3f}')
+        self.stdout.write(self.style.SUCCESS(f'Saved per request: {self._avg(baseline) - self._avg(configured):.3f} ms (avg)'))
+        if db_pool.mode() == 'pool':
+            self.stdout.write(str(db_pool.pool_stats().get(alias, {})))
+
+    @staticmethod
+    def _unpooled(connection):
+        # same database, reconnecting every time
+        settings_dict = copy.deepcopy(connection.settings_dict)
+        settings_dict['OPTIONS'] = {k: v for k, v in settings_dict.get('OPTIONS', {}).items() if k != 'pool'}
+        settings_dict['CONN_MAX_AGE'] = 0
+        return connection.__class__(settings_dict, connection.alias)
+
+    def _measure(self, get_connection, count, close=None):
+        timings = []
+        for _ in range(count):
+            started = time.perf_counter()
+            request_started.send(sender=self.__class__)
+            with get_connection().cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            request_finished.send(sender=self.__class__)
+            if close is not None:
+                close()
+            timings.append((time.perf_counter() - started) * 1000)
+        return sorted(timings)
+
+    @staticmethod
+    def _avg(timings):
+        return sum(timings) / len(timings)
+
+    @staticmethod
+    def _pct(timings, pct):
+        # nearest-rank percentile of sorted `timings`
+        return timings[max(math.ceil(pct / 100 * len(timings)) - 1, 0)]
@@ -0,0 +1,78 @@
+import math
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = ['/api/billing/totals/', '/api/me/']
+
+
+class Command(BaseCommand):
+    help = (
+        'Load a running server with concurrent GETs and report throughput and latency '
+        'percentiles per path. Run it against the WSGI and the ASGI (SERVER_MODE=asgi) '
+        'deployments started with the same WEB_CONCURRENCY to compare them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url', type=str, help='Server root, e.g. http://localhost:8000')
+        parser.add_argument('--path', action='append', dest='paths', help=f'Path to request (repeatable; default: {", ".join(DEFAULT_PATHS)})')
+        parser.add_argument('--token', type=str, help='Bearer access token')
+        parser.add_argument('--tenant', type=str, help='Tenant slug (X-Tenant-Slug header)')
+        parser.add_argument('--concurrency', type=int, default=32, help='Requests in flight (default 32)')
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per path (default 1000)')
+        parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('--concurrency and --requests must be positive')
+        headers = {'Accept': 'application/json'}
+        if options.get('token'):
+            headers['Authorization'] = f"Bearer {options['token']}"
+        if options.get('tenant'):
+            headers['X-Tenant-Slug'] = options['tenant']
+
+        base = options['base_url'].rstrip('/')
+        self.stdout.write(f"{'path':<40} {'ok':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for path in options.get('paths') or DEFAULT_PATHS:
+            latencies, errors, elapsed = self._run(base + path, headers, options)
+            latencies.sort()
+            self.stdout.write(
+                f'{path:<40} {len(latencies):>6} {errors:>6} {len(latencies) / elapsed:>8.1f} '
+                f'{self._percentile(latencies, 50):>8.1f} {self._percentile(latencies, 99):>8.1f} '
+                f'{(latencies[-1] if latencies else 0):>8.1f}'
+            )
+
+    def _run(self, url, headers, options):
+        latencies, errors, lock = [], 0, threading.Lock()
+
+        def hit(_):
+            nonlocal errors
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=options['timeout']) as response:
+                    response.read()
+                ok = True
+            except (urllib.error.URLError, OSError):
+                ok = False
+            spent = (time.perf_counter() - started) * 1000
+            with lock:
+                if ok:
+                    latencies.append(spent)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(hit, range(options['requests'])))
+        return latencies, errors, time.perf_counter() - started
+
+    @staticmethod
+    def _percentile(values, pct):
+        # nearest-rank percentile of sorted `values`
+        if not values:
+            return 0
+        return values[max(math.ceil(pct / 100 * len(values)) - 1, 0)]
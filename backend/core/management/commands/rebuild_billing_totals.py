@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized Billing.paid_total / Billing.remaining_due columns from BillingPayment rows, then the BillingDailyTotal rollup.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=str, help='Only rebuild billings of this tenant slug')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many billings are out of sync')
+
+    def handle(self, *args, **options):
+        from core.models import Billing, BillingDailyTotal, BillingPayment
+        from tenants.models import Tenant
+
+        qs = Billing.objects.all()
+        tenant = None
+        if options.get('tenant'):
+            tenant = Tenant.objects.filter(slug=options['tenant']).first()
+            if tenant is None:
+                raise CommandError(f"Tenant '{options['tenant']}' not found")
+            qs = qs.filter(tenant=tenant)
+
+        amount_field = DecimalField(max_digits=12, decimal_places=2)
+        paid = Coalesce(
+            Subquery(
+                BillingPayment.objects.filter(billing=OuterRef('pk')).order_by()
+                .values('billing').annotate(s=Sum('amount')).values('s'),
+                output_field=amount_field,
+            ),
+            Value(0),
+            output_field=amount_field,
+        )
+
+        stale = qs.annotate(actual_paid=paid).filter(
+            ~Q(paid_total=F('actual_paid')) | ~Q(remaining_due=F('amount') - F('actual_paid'))
+        ).count()
+        if options['dry_run']:
+            self.stdout.write(f'{stale} billing(s) out of sync.')
+            return
+
+        # single set-wise UPDATE ... SET paid_total = (SELECT SUM(...)), remaining_due = amount - (...)
+        updated = qs.update(paid_total=paid, remaining_due=F('amount') - paid)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt totals for {updated} billing(s) ({stale} were out of sync).'))
+
+        rows = BillingDailyTotal.rebuild(tenant=tenant)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} daily rollup row(s).'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Snapshot the on-hand quantity of inventory items moved since their last snapshot (run periodically, e.g. nightly).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=str, help='Only snapshot items of this tenant slug')
+
+    def handle(self, *args, **options):
+        from core.models import InventoryItem, StockSnapshot
+        from tenants.models import Tenant
+
+        items = InventoryItem.objects.all()
+        if options.get('tenant'):
+            tenant = Tenant.objects.filter(slug=options['tenant']).first()
+            if tenant is None:
+                raise CommandError(f"Tenant '{options['tenant']}' not found")
+            items = items.filter(tenant=tenant)
+
+        taken = StockSnapshot.take(items)
+        self.stdout.write(self.style.SUCCESS(f'Took {taken} stock snapshot(s).'))
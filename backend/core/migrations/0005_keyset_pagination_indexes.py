@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_alter_appointment_date'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='billing',
+            index=models.Index(fields=['tenant', '-issued_at', 'id'], name='core_billin_tenant__2233d6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['tenant', 'last_name', 'id'], name='core_patien_tenant__8516ef_idx'),
+        ),
+    ]
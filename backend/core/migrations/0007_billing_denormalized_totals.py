@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:38
+
+from django.db import migrations, models
+
+
+def backfill_totals(apps, schema_editor):
+    Billing = apps.get_model('core', 'Billing')
+    BillingPayment = apps.get_model('core', 'BillingPayment')
+    db = schema_editor.connection.alias
+    paid = dict(
+        BillingPayment.objects.using(db).order_by().values('billing_id')
+        .annotate(s=models.Sum('amount')).values_list('billing_id', 's')
+    )
+    billings = list(Billing.objects.using(db).only('id', 'amount'))
+    for b in billings:
+        b.paid_total = paid.get(b.id) or 0
+        b.remaining_due = (b.amount or 0) - b.paid_total
+    Billing.objects.using(db).bulk_update(billings, ['paid_total', 'remaining_due'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_record_number_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='billing',
+            name='paid_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='billing',
+            name='remaining_due',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
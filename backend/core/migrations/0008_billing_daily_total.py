@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollup(apps, schema_editor):
+    Billing = apps.get_model('core', 'Billing')
+    BillingDailyTotal = apps.get_model('core', 'BillingDailyTotal')
+    db = schema_editor.connection.alias
+    grouped = (
+        Billing.objects.using(db).annotate(day=TruncDate('issued_at')).order_by()
+        .values('tenant_id', 'day', 'currency')
+        .annotate(billed=models.Sum('amount'), paid=models.Sum('paid_total'))
+    )
+    BillingDailyTotal.objects.using(db).bulk_create([BillingDailyTotal(**g) for g in grouped], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_billing_denormalized_totals'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingDailyTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('currency', models.CharField(max_length=8)),
+                ('billed', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('paid', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tenants.tenant')),
+            ],
+            options={
+                'unique_together': {('tenant', 'day', 'currency')},
+            },
+        ),
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
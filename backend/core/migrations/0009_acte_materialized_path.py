@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:42
+
+from django.db import migrations, models
+
+
+def backfill_paths(apps, schema_editor):
+    Acte = apps.get_model('core', 'Acte')
+    db = schema_editor.connection.alias
+    rows = {a.id: a for a in Acte.objects.using(db).only('id', 'parent_id')}
+    paths = {}
+
+    def path_of(acte_id, seen=()):
+        if acte_id in paths:
+            return paths[acte_id]
+        acte = rows[acte_id]
+        prefix = ''
+        # ignore dangling parents and cycles: treat the acte as a root
+        if acte.parent_id in rows and acte.parent_id not in seen:
+            prefix = path_of(acte.parent_id, seen + (acte_id,))
+        paths[acte_id] = f"{prefix}{acte_id.hex}/"
+        return paths[acte_id]
+
+    for acte in rows.values():
+        acte.path = path_of(acte.id)
+        acte.depth = acte.path.count('/') - 1
+    Acte.objects.using(db).bulk_update(rows.values(), ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_billing_daily_total'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='acte',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='acte',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=512),
+        ),
+        migrations.AddIndex(
+            model_name='acte',
+            index=models.Index(fields=['path'], name='core_acte_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_versions(apps, schema_editor):
+    # every tenant with actes needs a row so deletions can bump it
+    Acte = apps.get_model('core', 'Acte')
+    ActeCatalogVersion = apps.get_model('core', 'ActeCatalogVersion')
+    db = schema_editor.connection.alias
+    tenant_ids = Acte.objects.using(db).order_by().values_list('tenant_id', flat=True).distinct()
+    ActeCatalogVersion.objects.using(db).bulk_create([ActeCatalogVersion(tenant_id=t, version=1) for t in tenant_ids])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_acte_materialized_path'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActeCatalogVersion',
+            fields=[
+                ('tenant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='tenants.tenant')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
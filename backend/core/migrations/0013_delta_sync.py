@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:54
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_appointment_tenant_indexes'),
+        ('tenants', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenant_id', models.UUIDField()),
+                ('resource', models.CharField(max_length=32)),
+                ('object_id', models.UUIDField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='acte',
+            index=models.Index(fields=['tenant', 'updated_at', 'id'], name='core_acte_tenant__9d504e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['tenant', 'updated_at', 'id'], name='core_appoin_tenant__e51ed2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='billing',
+            index=models.Index(fields=['tenant', 'updated_at', 'id'], name='core_billin_tenant__eb91df_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['tenant', 'updated_at', 'id'], name='core_invent_tenant__b75e9f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['tenant', 'updated_at', 'id'], name='core_patien_tenant__989a42_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='staff',
+            index=models.Index(fields=['tenant', 'updated_at', 'id'], name='core_staff_tenant__ecbb6f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['tenant_id', 'resource', 'deleted_at', 'id'], name='core_tombst_tenant__e79f6d_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:57
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+def opening_balances(apps, schema_editor):
+    # the ledger starts with each item's current quantity
+    InventoryItem = apps.get_model('core', 'InventoryItem')
+    StockMovement = apps.get_model('core', 'StockMovement')
+    db = schema_editor.connection.alias
+    now = django.utils.timezone.now()
+    StockMovement.objects.using(db).bulk_create([
+        StockMovement(tenant_id=tenant_id, item_id=pk, kind='adjustment', delta=quantity, occurred_at=now, note='Opening balance')
+        for pk, tenant_id, quantity in InventoryItem.objects.using(db).exclude(quantity=0).values_list('id', 'tenant_id', 'quantity')
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_delta_sync'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('receipt', 'Réception'), ('issue', 'Sortie'), ('adjustment', 'Ajustement')], max_length=16)),
+                ('delta', models.IntegerField()),
+                ('occurred_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reference', models.CharField(blank=True, max_length=128)),
+                ('note', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='core.inventoryitem')),
+                ('staff', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='core.staff')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tenants.tenant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item', 'occurred_at'], name='core_stockm_item_id_a4f12a_idx'), models.Index(fields=['tenant', '-occurred_at', 'id'], name='core_stockm_tenant__de3d42_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('quantity', models.IntegerField()),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='core.inventoryitem')),
+            ],
+            options={
+                'unique_together': {('item', 'taken_at')},
+            },
+        ),
+        migrations.RunPython(opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_stock_movement_ledger'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(condition=models.Q(('quantity__lte', models.F('reorder_level'))), fields=['tenant', 'name'], name='core_inventory_low_stock_idx'),
+        ),
+    ]
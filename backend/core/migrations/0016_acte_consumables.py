@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:59
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_inventory_low_stock_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActeConsumable',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)])),
+                ('acte', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consumables', to='core.acte')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='used_by', to='core.inventoryitem')),
+            ],
+            options={
+                'unique_together': {('acte', 'item')},
+            },
+        ),
+    ]
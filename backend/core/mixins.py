@@ -1,5 +1,34 @@
+import hashlib
+
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max, Subquery
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from hms import metrics, perf
+from hms.replicas import read_alias
+from rest_framework.response import Response
+from tenants.sharding import db_for_tenant
+
+from . import response_cache
+from .models import Tombstone
+from .permissions import request_role
+
+
 class TenantFilterMixin:
-    """ViewSet mixin that filters queryset by request.tenant and sets tenant on create."""
+    """ViewSet mixin that filters queryset by request.tenant (on the tenant's
+    shard, or one of its read replicas when the request allows it) and sets
+    tenant on create.
+
+    `list` and `retrieve` carry an ETag and Last-Modified and answer
+    If-None-Match / If-Modified-Since with 304 before serializing (see
+    `validators`).
+    """
+
+    # timestamp every write to the queryset's model moves
+    validator_field = 'updated_at'
+    # labels of the models responses are built from (ResponseCacheMixin too)
+    response_models = None
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -7,7 +36,102 @@ class TenantFilterMixin:
         if tenant is None:
             # No tenant detected — return empty queryset to avoid leaks
             return qs.none()
-        return qs.filter(tenant=tenant)
+        return qs.using(read_alias(db_for_tenant(tenant))).filter(tenant=tenant)
+
+    def get_serializer(self, *args, **kwargs):
+        # sampled requests time the serializer's `.data` (PerformanceMiddleware)
+        return perf.timed_serializer(super().get_serializer(*args, **kwargs))
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+    def validator_queryset(self):
+        """Rows the response is built from; override to skip annotations
+        that only serializing needs."""
+        return self.get_queryset()
+
+    def validators(self):
+        """(ETag, Last-Modified timestamp or None) of the requested list or
+        detail, or None when there is nothing to validate.
+
+        Computed in one aggregate query: count and max(`validator_field`) of
+        the filtered rows (the one row on detail routes) and, for every other
+        model of `response_models`, its tenant-wide latest write and deletion
+        (core.Tombstone). Lists also take the latest write and deletion of
+        the tenant's rows into Last-Modified, so a row leaving the filter or
+        being deleted moves it. ETags are weak: they identify the data, not
+        the bytes; they also catch writes within the second of Last-Modified,
+        which If-Modified-Since cannot.
+        """
+        tenant = getattr(self.request, 'tenant', None)
+        if tenant is None:
+            return None
+        qs = self.filter_queryset(self.validator_queryset())
+        model = qs.model
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        detail = lookup in self.kwargs
+        if detail:
+            try:
+                qs = qs.filter(**{self.lookup_field: self.kwargs[lookup]})
+            except (TypeError, ValueError, ValidationError):
+                return None  # malformed id: the handler answers 404
+        field = self.validator_field
+
+        from .sync import SYNC_MODELS
+
+        def latest(rows, column):
+            return Max(Subquery(rows.order_by(f'-{column}').values(column)[:1]))
+
+        def deleted(dependency):
+            resource = SYNC_MODELS.get(dependency)
+            if resource is None:
+                return None
+            return latest(Tombstone.objects.filter(tenant_id=tenant.pk, resource=resource), 'deleted_at')
+
+        moments = {}
+        if not detail:
+            moments['tenant_latest'] = latest(model._base_manager.filter(tenant=tenant), field)
+            moments['tenant_deleted'] = deleted(model)
+        for label in self.response_models or ():
+            dependency = apps.get_model(label)
+            if dependency is not model:
+                moments[f'{label}_latest'] = latest(dependency._base_manager.filter(tenant=tenant), 'updated_at')
+                moments[f'{label}_deleted'] = deleted(dependency)
+        moments = {name: expr for name, expr in moments.items() if expr is not None}
+        row = qs.order_by().aggregate(count=Count('pk'), latest=Max(field), **moments)
+        if detail and not row['count']:
+            return None  # let the handler answer 404
+
+        parts = [model._meta.label, str(row['count']), getattr(getattr(self.request, 'accepted_renderer', None), 'format', None) or 'json',
+                 request_role(self.request) or '']
+        parts += [f'{name}={row[name].isoformat() if row[name] else ""}' for name in ['latest', *sorted(moments)]]
+        etag = f'W/"{hashlib.sha256("|".join(parts).encode()).hexdigest()[:32]}"'
+        stamps = [row[name] for name in ['latest', *moments] if row[name] is not None]
+        # HTTP dates have whole seconds
+        return etag, (int(max(stamps).timestamp()) if stamps else None)
+
+    @staticmethod
+    def with_validators(response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        validators = self.validators() if request.method in ('GET', 'HEAD') else None
+        self.etag = validators and validators[0]
+        if validators is None:
+            return handler(request, *args, **kwargs)
+        not_modified = get_conditional_response(request, *validators)
+        if not_modified is not None:
+            return self.with_validators(not_modified, *validators)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            self.with_validators(response, *validators)
+        return response
 
     def perform_create(self, serializer):
         tenant = getattr(self.request, 'tenant', None)
@@ -32,3 +156,40 @@ class TenantFilterMixin:
         logger.warning('TenantFilterMixin: no tenant set on request during create; request path=%s, data keys=%s', getattr(self.request, 'path', ''), list(getattr(self.request, 'data', {}).keys()))
         # allow serializer to handle missing tenant (could raise)
         serializer.save()
+
+
+class ResponseCacheMixin:
+    """ViewSet mixin serving `list` / `retrieve` from core.response_cache.
+
+    `response_models` lists the labels of the models the responses are built
+    from (default: the queryset's model). Lookups happen after DRF's
+    authentication and permission checks, in the view's tenant; entries are
+    also keyed by the ETag TenantFilterMixin computed for the request, so an
+    entry is never served for data that changed since it was stored.
+    """
+
+    response_models = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        tenant = getattr(request, 'tenant', None)
+        if tenant is None or not response_cache.cacheable(request):
+            return handler(request, *args, **kwargs)
+        labels = self.response_models or (self.queryset.model._meta.label,)
+        # generations are read first: a write committed while the response is
+        # built leaves the entry under the old generation, never to be served
+        key = response_cache.key_for(request, tenant.pk, labels, request_role(request), getattr(self, 'etag', None))
+        hit = response_cache.get(key)
+        metrics.cache_lookup('response', hit is not None)
+        if hit is not None:
+            status_code, data, headers = hit
+            return Response(data, status=status_code, headers=headers)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            response_cache.store(key, response)
+        return response
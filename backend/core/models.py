@@ -1,7 +1,22 @@
 import uuid
-from django.db import models
+from decimal import Decimal
+from django.db import models, transaction, router, connections, IntegrityError
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Value
+from django.db.models.functions import Coalesce, Concat, Substr
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.utils import timezone
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from . import response_cache
+
+
+# upper bound of Appointment.duration_minutes; also bounds conflict-check scans
+APPOINTMENT_MAX_DURATION = 12 * 60
+
+# lower bound for "stock movements since the latest snapshot" when there is none
+LEDGER_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
 
 
 class TimestampedModel(models.Model):
@@ -29,50 +44,125 @@ class Patient(TimestampedModel):
     notes = models.TextField(blank=True)
 
     class Meta:
-        indexes = [models.Index(fields=['medical_record_number']), models.Index(fields=['last_name'])]
+        indexes = [
+            models.Index(fields=['medical_record_number']),
+            models.Index(fields=['last_name']),
+            # supports keyset pagination on (last_name, id) within a tenant
+            models.Index(fields=['tenant', 'last_name', 'id']),
+            # delta sync (core.sync): rows changed since a high-water mark
+            models.Index(fields=['tenant', 'updated_at', 'id']),
+        ]
         unique_together = (('tenant', 'medical_record_number'),)
 
     def __str__(self):
         return f"{self.last_name} {self.first_name}"
 
     def save(self, *args, **kwargs):
-        # Auto-generate medical_record_number in format YYYY/MM/NNNN when not provided.
+        # Auto-generate medical_record_number in format YYYY/MM/NNNN when not provided;
+        # allocation errors propagate (a patient is never saved without a proper number)
         if not self.medical_record_number:
-            try:
-                now = timezone.now()
-                year = now.year
-                month = now.month
-                # count existing patients for this tenant in this year/month
-                if self.tenant_id:
-                    existing_count = Patient.objects.filter(
-                        tenant_id=self.tenant_id,
-                        created_at__year=year,
-                        created_at__month=month,
-                    ).count()
-                else:
-                    existing_count = Patient.objects.filter(
-                        created_at__year=year,
-                        created_at__month=month,
-                    ).count()
-
-                seq = existing_count + 1
-                candidate = f"{year}/{str(month).zfill(2)}/{str(seq).zfill(4)}"
-                # ensure uniqueness (defensive loop)
-                while Patient.objects.filter(tenant=self.tenant, medical_record_number=candidate).exists():
-                    seq += 1
-                    candidate = f"{year}/{str(month).zfill(2)}/{str(seq).zfill(4)}"
-
-                self.medical_record_number = candidate
-            except Exception:
-                # fallback to a uuid-like short id if anything goes wrong
-                try:
-                    import uuid
-                    self.medical_record_number = uuid.uuid4().hex[:12]
-                except Exception:
-                    self.medical_record_number = 'UNKNOWN'
+            Patient.assign_record_numbers([self])
 
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def format_record_number(year, month, seq):
+        return f"{year}/{str(month).zfill(2)}/{str(seq).zfill(4)}"
+
+    @classmethod
+    def assign_record_numbers(cls, patients, now=None):
+        """Fill `medical_record_number` on unsaved patients that lack one.
+
+        Numbers are drawn from `RecordNumberSequence` with one atomic increment
+        per tenant, so a bulk import of N patients costs one round trip rather
+        than N. Intended for use before `Patient.objects.bulk_create(...)`.
+        """
+        now = now or timezone.now()
+        pending = {}
+        for p in patients:
+            if not p.medical_record_number:
+                pending.setdefault(p.tenant_id, []).append(p)
+        for tenant_id, group in pending.items():
+            if tenant_id is None:
+                raise ValueError('Patient.tenant is required to allocate a medical record number')
+            seqs = RecordNumberSequence.allocate(tenant_id, now.year, now.month, count=len(group))
+            for p, seq in zip(group, seqs):
+                p.medical_record_number = cls.format_record_number(now.year, now.month, seq)
+        return patients
+
+
+class RecordNumberSequence(models.Model):
+    """Per-tenant, per-month counter backing medical record numbers (YYYY/MM/NNNN).
+
+    `allocate` bumps the counter with a single `UPDATE ... RETURNING` (row lock
+    held until commit), which makes allocation O(1) and safe under concurrent
+    registrations.
+    """
+
+    tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE)
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    last_value = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = (('tenant', 'year', 'month'),)
+
+    def __str__(self):
+        return f"{self.tenant_id} {self.year}/{str(self.month).zfill(2)} -> {self.last_value}"
+
+    @classmethod
+    def allocate(cls, tenant_id, year, month, count=1, using=None):
+        """Reserve `count` consecutive numbers and return them as a range."""
+        if count < 1:
+            return range(0)
+        using = using or router.db_for_write(cls)
+        with transaction.atomic(using=using):
+            end = cls._increment(tenant_id, year, month, count, using)
+            if end is None:
+                # first allocation of the period: seed from any pre-existing numbers
+                seed = cls._existing_max(tenant_id, year, month, using)
+                try:
+                    with transaction.atomic(using=using):
+                        cls.objects.using(using).create(tenant_id=tenant_id, year=year, month=month, last_value=seed + count)
+                    end = seed + count
+                except IntegrityError:
+                    # another worker created the row first
+                    end = cls._increment(tenant_id, year, month, count, using)
+        return range(end - count + 1, end + 1)
+
+    @classmethod
+    def _increment(cls, tenant_id, year, month, count, using):
+        conn = connections[using]
+        if conn.vendor == 'postgresql' or (conn.vendor == 'sqlite' and conn.Database.sqlite_version_info >= (3, 35)):
+            qn = conn.ops.quote_name
+            sql = (
+                f"UPDATE {qn(cls._meta.db_table)} SET {qn('last_value')} = {qn('last_value')} + %s "
+                f"WHERE {qn('tenant_id')} = %s AND {qn('year')} = %s AND {qn('month')} = %s "
+                f"RETURNING {qn('last_value')}"
+            )
+            tenant_param = cls._meta.get_field('tenant').get_db_prep_value(tenant_id, conn)
+            with conn.cursor() as cursor:
+                cursor.execute(sql, [count, tenant_param, year, month])
+                row = cursor.fetchone()
+            return row[0] if row else None
+        # backends without UPDATE ... RETURNING: lock the row, then bump it
+        seq = cls.objects.using(using).select_for_update().filter(tenant_id=tenant_id, year=year, month=month).first()
+        if seq is None:
+            return None
+        cls.objects.using(using).filter(pk=seq.pk).update(last_value=models.F('last_value') + count)
+        return seq.last_value + count
+
+    @staticmethod
+    def _existing_max(tenant_id, year, month, using):
+        prefix = f"{year}/{str(month).zfill(2)}/"
+        existing = Patient.objects.using(using).filter(tenant_id=tenant_id, medical_record_number__startswith=prefix)
+        highest = 0
+        for mrn in existing.values_list('medical_record_number', flat=True).iterator():
+            suffix = mrn[len(prefix):]
+            if suffix.isdigit():
+                highest = max(highest, int(suffix))
+        return highest
+
 
 class Staff(TimestampedModel):
     ROLE_CHOICES = [("doctor", "Médecin"), ("nurse", "Infirmier"), ("reception", "Réceptionniste"), ("billing", "Caissier"), ("admin", "Administrateur")]
@@ -88,7 +178,7 @@ class Staff(TimestampedModel):
     is_active = models.BooleanField(default=True)
 
     class Meta:
-        indexes = [models.Index(fields=['role'])]
+        indexes = [models.Index(fields=['role']), models.Index(fields=['tenant', 'updated_at', 'id'])]
 
     def __str__(self):
         if self.user:
@@ -116,13 +206,58 @@ class Appointment(TimestampedModel):
     location = models.CharField(max_length=255, blank=True)
     status = models.CharField(max_length=32, choices=STATUS, default='scheduled')
     reason = models.TextField(blank=True)
+    # optional length of the booking; falls back to settings.APPOINTMENT_DEFAULT_DURATION
+    duration_minutes = models.PositiveSmallIntegerField(
+        null=True, blank=True,
+        validators=[MinValueValidator(1), MaxValueValidator(APPOINTMENT_MAX_DURATION)],
+    )
 
     class Meta:
-        indexes = [models.Index(fields=['date']), models.Index(fields=['status'])]
+        indexes = [
+            models.Index(fields=['date']),
+            models.Index(fields=['status']),
+            # per-staff agenda lookups (availability / conflict checks)
+            models.Index(fields=['staff', 'date']),
+            # tenant-leading indexes for agenda / date-range listings
+            models.Index(fields=['tenant', 'date']),
+            models.Index(fields=['tenant', 'status', 'date']),
+            models.Index(fields=['tenant', 'updated_at', 'id']),
+        ]
 
     def __str__(self):
         return f"Appt {self.id} - {self.patient} @ {self.date}"
 
+    @property
+    def duration(self):
+        minutes = self.duration_minutes or getattr(settings, 'APPOINTMENT_DEFAULT_DURATION', 30)
+        return timedelta(minutes=minutes)
+
+    @property
+    def end(self):
+        return self.date + self.duration if self.date else None
+
+
+class WorkingHours(models.Model):
+    """A span of a weekday during which a staff member can be booked.
+
+    A staff member may have several spans per weekday (e.g. a lunch break);
+    staff without any span use settings.APPOINTMENT_WORKING_HOURS.
+    """
+
+    WEEKDAYS = [(0, "Lundi"), (1, "Mardi"), (2, "Mercredi"), (3, "Jeudi"), (4, "Vendredi"), (5, "Samedi"), (6, "Dimanche")]
+
+    staff = models.ForeignKey('core.Staff', on_delete=models.CASCADE, related_name='working_hours')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAYS)
+    start = models.TimeField()
+    end = models.TimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=['staff', 'weekday'])]
+        ordering = ['weekday', 'start']
+
+    def __str__(self):
+        return f"{self.staff_id} {self.get_weekday_display()} {self.start}-{self.end}"
+
 
 class Billing(TimestampedModel):
     STATUS = [("pending", "En attente"), ("paid", "Payé"), ("declined", "Refusé")]
@@ -140,27 +275,151 @@ class Billing(TimestampedModel):
     description = models.TextField(blank=True)
     issued_at = models.DateTimeField(auto_now_add=True)
     paid_at = models.DateTimeField(null=True, blank=True)
+    # denormalized sums of `payments`, kept in sync by BillingPayment writes
+    # (core.signals receivers, BillingPaymentQuerySet bulk paths)
+    # (rebuild with `manage.py rebuild_billing_totals`)
+    paid_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    remaining_due = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
     class Meta:
         # `status` field was removed; keep index only for `issued_at`.
-        indexes = [models.Index(fields=['issued_at'])]
+        indexes = [
+            models.Index(fields=['issued_at']),
+            # supports keyset pagination on (-issued_at, id) within a tenant
+            models.Index(fields=['tenant', '-issued_at', 'id']),
+            models.Index(fields=['tenant', 'updated_at', 'id']),
+        ]
 
     def __str__(self):
         return f"Billing {self.id} - {self.amount} {self.currency} ({self.status})"
 
-    @property
-    def paid_total(self):
-        try:
-            return float(self.payments.aggregate(s=models.Sum('amount'))['s'] or 0)
-        except Exception:
-            return 0
+    def save(self, *args, **kwargs):
+        # paid_total / remaining_due are maintained with F-expressions by
+        # BillingPayment; never write back a possibly stale in-memory copy.
+        using = kwargs.get('using') or router.db_for_write(Billing, instance=self)
+        if self._state.adding:
+            self.paid_total = self.paid_total or Decimal('0')
+            self.remaining_due = Decimal(str(self.amount or 0)) - Decimal(str(self.paid_total))
+            with transaction.atomic(using=using):
+                super().save(*args, **kwargs)
+                BillingDailyTotal.bump(self, billed=self.remaining_due + self.paid_total, paid=self.paid_total, using=using)
+            return
+        update_fields = kwargs.pop('update_fields', None)
+        if update_fields is None:
+            update_fields = [f.name for f in self._meta.concrete_fields if not f.primary_key]
+        update_fields = [f for f in update_fields if f not in ('paid_total', 'remaining_due')]
+        with transaction.atomic(using=using):
+            previous = None
+            if {'amount', 'currency', 'issued_at'} & set(update_fields):
+                # locked: payments cannot move paid_total until we commit
+                previous = (
+                    Billing.objects.using(using).select_for_update().filter(pk=self.pk)
+                    .values('amount', 'currency', 'issued_at', 'paid_total').first()
+                )
+            super().save(*args, update_fields=update_fields, **kwargs)
+            if previous is None:
+                return
+            amount = Decimal(str(self.amount or 0))
+            amount_changed = 'amount' in update_fields and amount != previous['amount']
+            currency_changed = 'currency' in update_fields and self.currency != previous['currency']
+            day_changed = 'issued_at' in update_fields and self.issued_at != previous['issued_at']
+            if amount_changed:
+                self._refresh_totals(remaining_due=models.F('amount') - models.F('paid_total'))
+            if amount_changed or currency_changed or day_changed:
+                # move this billing's contribution in the daily rollup
+                paid = previous['paid_total']
+                old = Billing(tenant_id=self.tenant_id, currency=previous['currency'], issued_at=previous['issued_at'])
+                BillingDailyTotal.bump(old, billed=-previous['amount'], paid=-paid, using=using)
+                BillingDailyTotal.bump(self, billed=amount, paid=paid, using=using)
+
+    def _refresh_totals(self, **updates):
+        """Apply `updates` to the denormalized totals and reload them on this instance."""
+        using = self._state.db or router.db_for_write(Billing, instance=self)
+        # queryset updates bypass auto_now; keep updated_at moving for delta sync
+        updates.setdefault('updated_at', timezone.now())
+        Billing.objects.using(using).filter(pk=self.pk).update(**updates)
+        response_cache.bump([self.tenant_id], Billing._meta.label, using=using)
+        row = Billing.objects.using(using).filter(pk=self.pk).values('paid_total', 'remaining_due').first()
+        if row:
+            self.paid_total = row['paid_total']
+            self.remaining_due = row['remaining_due']
+
+    def apply_payment_delta(self, delta):
+        """Atomically add `delta` to paid_total (and subtract it from remaining_due)."""
+        self._refresh_totals(
+            paid_total=models.F('paid_total') + delta,
+            remaining_due=models.F('remaining_due') - delta,
+        )
+        BillingDailyTotal.bump(self, paid=delta, using=self._state.db)
+
+    def recompute_totals(self):
+        """Rebuild the denormalized totals from the payments table."""
+        paid = self.payments.aggregate(s=models.Sum('amount'))['s'] or Decimal('0')
+        current = Billing.objects.using(self._state.db).filter(pk=self.pk).values_list('paid_total', flat=True).first() or Decimal('0')
+        if paid != current:
+            self.apply_payment_delta(paid - current)
+
+
+class BillingDailyTotal(models.Model):
+    """Per-tenant, per-day, per-currency rollup of billed and paid amounts.
+
+    Rows are keyed by the billing's issue date and currency; payments count
+    towards the day their billing was issued, so `billed - paid` is the
+    outstanding amount for billings issued that day. Maintained incrementally
+    by Billing/BillingPayment writes (see `bump`) and rebuilt by
+    `manage.py rebuild_billing_totals`.
+    """
 
-    @property
-    def remaining_due(self):
-        try:
-            return float((self.amount or 0) - (self.payments.aggregate(s=models.Sum('amount'))['s'] or 0))
-        except Exception:
-            return float(self.amount or 0)
+    tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE)
+    day = models.DateField()
+    currency = models.CharField(max_length=8)
+    billed = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = (('tenant', 'day', 'currency'),)
+
+    def __str__(self):
+        return f"{self.tenant_id} {self.day} {self.currency}: {self.billed} / {self.paid}"
+
+    @classmethod
+    def bump(cls, billing, billed=0, paid=0, using=None):
+        """Add `billed` / `paid` deltas to the rollup row of `billing`'s day and currency."""
+        if not billed and not paid:
+            return
+        using = using or router.db_for_write(cls)
+        day = timezone.localtime(billing.issued_at).date() if billing.issued_at else timezone.localdate()
+        key = {'tenant_id': billing.tenant_id, 'day': day, 'currency': billing.currency}
+        updates = {'billed': models.F('billed') + billed, 'paid': models.F('paid') + paid}
+        with transaction.atomic(using=using):
+            if cls.objects.using(using).filter(**key).update(**updates):
+                return
+            try:
+                with transaction.atomic(using=using):
+                    cls.objects.using(using).create(billed=billed, paid=paid, **key)
+            except IntegrityError:
+                # created concurrently by another worker
+                cls.objects.using(using).filter(**key).update(**updates)
+
+    @classmethod
+    def rebuild(cls, tenant=None, using=None):
+        """Recompute rollup rows from Billing (requires up-to-date paid_total)."""
+        from django.db.models.functions import TruncDate
+        using = using or router.db_for_write(cls)
+        billings = Billing.objects.using(using).all()
+        rows = cls.objects.using(using).all()
+        if tenant is not None:
+            billings = billings.filter(tenant=tenant)
+            rows = rows.filter(tenant=tenant)
+        grouped = (
+            billings.annotate(day=TruncDate('issued_at')).order_by()
+            .values('tenant_id', 'day', 'currency')
+            .annotate(billed=models.Sum('amount'), paid=models.Sum('paid_total'))
+        )
+        with transaction.atomic(using=using):
+            rows.delete()
+            created = cls.objects.using(using).bulk_create([cls(**g) for g in grouped], batch_size=500)
+        return len(created)
 
 
 class BillingItem(TimestampedModel):
@@ -184,6 +443,12 @@ class BillingItem(TimestampedModel):
         indexes = [models.Index(fields=['billing']), models.Index(fields=['acte'])]
 
     def save(self, *args, **kwargs):
+        self.compute_total()
+        super().save(*args, **kwargs)
+
+    def compute_total(self):
+        """Snapshot price/currency from the acte when unit_price is unset and
+        compute `total`. Call before `bulk_create`, which skips `save()`."""
         # If an acte is provided and unit_price is not explicitly set, copy the acte amount
         try:
             if self.acte and (not self.unit_price or float(self.unit_price) == 0):
@@ -201,7 +466,40 @@ class BillingItem(TimestampedModel):
             self.total = calc_total
         except Exception:
             pass
-        super().save(*args, **kwargs)
+        return self.total
+
+
+class BillingPaymentQuerySet(models.QuerySet):
+    """Bulk writes that keep the billings' paid totals in step.
+
+    Single saves and deletes (queryset deletes included) are handled by the
+    BillingPayment signal receivers in core.signals; `bulk_create` and
+    `update` (hence `bulk_update`) send no signals, so they adjust the totals
+    themselves.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            deltas = {}
+            for payment in objs:
+                deltas[payment.billing_id] = deltas.get(payment.billing_id, Decimal('0')) + Decimal(str(payment.amount or 0))
+            BillingPayment.apply_billing_deltas(deltas, using=self.db)
+        return created
+
+    def update(self, **kwargs):
+        if 'amount' not in kwargs and 'billing' not in kwargs and 'billing_id' not in kwargs:
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            billing_ids = set(self.order_by().values_list('billing_id', flat=True).distinct())
+            rows = super().update(**kwargs)
+            moved_to = kwargs.get('billing_id', getattr(kwargs.get('billing'), 'pk', kwargs.get('billing')))
+            if moved_to is not None and rows:
+                billing_ids.add(moved_to)
+            for billing in Billing.objects.using(self.db).filter(pk__in=billing_ids):
+                billing.recompute_totals()
+        return rows
 
 
 class BillingPayment(TimestampedModel):
@@ -214,12 +512,30 @@ class BillingPayment(TimestampedModel):
     method = models.CharField(max_length=64, blank=True)
     paid_at = models.DateTimeField(auto_now_add=True)
 
+    objects = BillingPaymentQuerySet.as_manager()
+
     class Meta:
         indexes = [models.Index(fields=['billing']), models.Index(fields=['paid_at'])]
 
     def __str__(self):
         return f"Payment {self.id} - {self.amount} {self.currency} for {self.billing_id}"
 
+    def save(self, *args, **kwargs):
+        # the signal receivers adjusting the billing totals run in the same
+        # transaction as the payment write
+        using = kwargs.get('using') or router.db_for_write(BillingPayment, instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+    @staticmethod
+    def apply_billing_deltas(deltas, using=None):
+        """Add `{billing_id: delta}` to the billings' paid totals."""
+        deltas = {pk: d for pk, d in deltas.items() if d}
+        if not deltas:
+            return
+        for billing in Billing.objects.using(using).filter(pk__in=list(deltas)):
+            billing.apply_payment_delta(deltas[billing.pk])
+
 
 class InventoryItem(TimestampedModel):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -233,12 +549,237 @@ class InventoryItem(TimestampedModel):
     location = models.CharField(max_length=128, blank=True)
 
     class Meta:
-        indexes = [models.Index(fields=['sku']), models.Index(fields=['name'])]
+        indexes = [
+            models.Index(fields=['sku']),
+            models.Index(fields=['name']),
+            models.Index(fields=['tenant', 'updated_at', 'id']),
+            # partial index holding only low-stock rows (Postgres, SQLite);
+            # ignored by backends without partial index support
+            models.Index(
+                fields=['tenant', 'name'], name='core_inventory_low_stock_idx',
+                condition=models.Q(quantity__lte=models.F('reorder_level')),
+            ),
+        ]
         unique_together = (('tenant', 'sku'),)
 
     def __str__(self):
         return f"{self.name} ({self.sku})"
 
+    def save(self, *args, **kwargs):
+        # quantity only moves through StockMovement (atomic F-expression
+        # updates); never write back a possibly stale in-memory copy.
+        using = kwargs.get('using') or router.db_for_write(InventoryItem, instance=self)
+        if self._state.adding:
+            opening = self.quantity or 0
+            self.quantity = 0
+            with transaction.atomic(using=using):
+                super().save(*args, **kwargs)
+                if opening:
+                    StockMovement.post([StockMovement(
+                        tenant_id=self.tenant_id, item=self, kind='adjustment', delta=opening, note='Opening balance',
+                    )], using=using)
+            self.quantity = opening
+            return
+        update_fields = kwargs.pop('update_fields', None)
+        if update_fields is None:
+            update_fields = [f.name for f in self._meta.concrete_fields if not f.primary_key]
+        update_fields = [f for f in update_fields if f != 'quantity']
+        # self.quantity is left as it was and may be stale: callers that need
+        # the stored value use refresh_from_db(fields=['quantity'])
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+    @staticmethod
+    def low_stock_cache_key(tenant_id):
+        return f"inventory:low_stock:{tenant_id}"
+
+    @classmethod
+    def invalidate_low_stock(cls, tenant_ids, using=None):
+        """Drop the cached low-stock lists once the current transaction commits
+        (a reader between now and then would re-cache the old rows)."""
+        keys = [cls.low_stock_cache_key(t) for t in set(tenant_ids)]
+        transaction.on_commit(lambda: cache.delete_many(keys), using=using)
+
+    @classmethod
+    def with_quantity_at(cls, queryset, at):
+        """Annotate `quantity_at`: stock on hand at `at`, from the latest snapshot
+        taken by then plus the movements since, never scanning the whole ledger."""
+        snapshots = StockSnapshot.objects.filter(item=models.OuterRef('pk'), taken_at__lte=at).order_by('-taken_at')
+        queryset = queryset.annotate(
+            snapshot_at=models.Subquery(snapshots.values('taken_at')[:1]),
+            snapshot_quantity=models.Subquery(snapshots.values('quantity')[:1]),
+        )
+        since = Coalesce(models.OuterRef('snapshot_at'), Value(LEDGER_EPOCH))
+        moved = (
+            StockMovement.objects.filter(item=models.OuterRef('pk'), occurred_at__gt=since, occurred_at__lte=at)
+            .order_by().values('item').annotate(s=models.Sum('delta')).values('s')
+        )
+        return queryset.annotate(
+            quantity_at=Coalesce(models.F('snapshot_quantity'), 0) + Coalesce(models.Subquery(moved), 0),
+        )
+
+
+class InsufficientStock(Exception):
+    """Raised when stock movements would take items below zero; nothing is applied."""
+
+    def __init__(self, shortages):
+        # {item_id: quantity available}
+        self.shortages = shortages
+        super().__init__(f"Insufficient stock for {len(shortages)} item(s)")
+
+
+class StockMovement(models.Model):
+    """Append-only ledger entry changing an InventoryItem's quantity by `delta`.
+
+    Create movements with `StockMovement.post()`, which applies them to
+    `InventoryItem.quantity` atomically; rows are never updated or deleted.
+    """
+
+    KIND_CHOICES = [("receipt", "Réception"), ("issue", "Sortie"), ("adjustment", "Ajustement")]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE)
+    item = models.ForeignKey('core.InventoryItem', on_delete=models.CASCADE, related_name='movements')
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    # signed: positive for receipts, negative for issues, either for adjustments
+    delta = models.IntegerField()
+    occurred_at = models.DateTimeField(default=timezone.now)
+    reference = models.CharField(max_length=128, blank=True)
+    note = models.TextField(blank=True)
+    staff = models.ForeignKey('core.Staff', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # stock-at-date: movements of an item after its latest snapshot
+            models.Index(fields=['item', 'occurred_at']),
+            models.Index(fields=['tenant', '-occurred_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.delta:+d} {self.item_id} @ {self.occurred_at}"
+
+    @staticmethod
+    def signed_delta(kind, quantity):
+        """Delta of a movement of `quantity` units: receipts add, issues remove,
+        adjustments keep their sign."""
+        if kind == 'receipt':
+            return abs(quantity)
+        if kind == 'issue':
+            return -abs(quantity)
+        return quantity
+
+    @classmethod
+    def post(cls, movements, using=None):
+        """Insert unsaved `movements` and apply them to stock, all or nothing.
+
+        Deltas are summed per item and applied with a single conditional
+        `UPDATE ... SET quantity = quantity + CASE ...`, so the number of
+        queries does not depend on the number of movements or items. Raises
+        InsufficientStock (and applies nothing) if an item would go below zero.
+        """
+        if not movements:
+            return []
+        using = using or router.db_for_write(cls)
+        now = timezone.now()
+        deltas = {}
+        backdated = {}
+        for m in movements:
+            if m.occurred_at is None or m.occurred_at > now:
+                m.occurred_at = now
+            deltas[m.item_id] = deltas.get(m.item_id, 0) + m.delta
+            if m.occurred_at < now:
+                key = (m.item_id, m.occurred_at)
+                backdated[key] = backdated.get(key, 0) + m.delta
+        with transaction.atomic(using=using):
+            cls.apply_deltas(deltas, using=using, now=now)
+            cls.objects.using(using).bulk_create(movements)
+            tenant_ids = {m.tenant_id for m in movements}
+            InventoryItem.invalidate_low_stock(tenant_ids, using=using)
+            # bulk_create and the quantity UPDATE send no signals
+            response_cache.bump(tenant_ids, InventoryItem._meta.label, cls._meta.label, using=using)
+            if backdated:
+                StockSnapshot.include_backdated(backdated, using=using)
+        return movements
+
+    @staticmethod
+    def apply_deltas(deltas, using=None, now=None):
+        """Add `{item_id: delta}` to the items' quantities in one UPDATE."""
+        deltas = {pk: d for pk, d in deltas.items() if d}
+        if not deltas:
+            return
+        using = using or router.db_for_write(InventoryItem)
+        allow_negative = getattr(settings, 'INVENTORY_ALLOW_NEGATIVE_STOCK', False)
+        rows = models.Q()
+        for pk, d in deltas.items():
+            rows |= models.Q(pk=pk) if (d > 0 or allow_negative) else models.Q(pk=pk, quantity__gte=-d)
+        increment = models.Case(
+            *[models.When(pk=pk, then=Value(d)) for pk, d in deltas.items()],
+            default=Value(0), output_field=models.IntegerField(),
+        )
+        try:
+            with transaction.atomic(using=using):
+                updated = InventoryItem.objects.using(using).filter(rows).update(
+                    quantity=models.F('quantity') + increment, updated_at=now or timezone.now(),
+                )
+                if updated != len(deltas):
+                    raise InsufficientStock({})
+        except InsufficientStock:
+            available = dict(InventoryItem.objects.using(using).filter(pk__in=list(deltas)).values_list('pk', 'quantity'))
+            raise InsufficientStock({
+                pk: available.get(pk, 0) for pk, d in deltas.items()
+                if pk not in available or (d < 0 and not allow_negative and available[pk] < -d)
+            })
+
+
+class StockSnapshot(models.Model):
+    """Quantity on hand of an item at `taken_at` (every movement up to and
+    including that instant). Taken periodically by `manage.py snapshot_stock`
+    so stock at a past date only needs the movements since the latest one."""
+
+    item = models.ForeignKey('core.InventoryItem', on_delete=models.CASCADE, related_name='snapshots')
+    taken_at = models.DateTimeField()
+    quantity = models.IntegerField()
+
+    class Meta:
+        unique_together = (('item', 'taken_at'),)
+
+    def __str__(self):
+        return f"{self.item_id} = {self.quantity} @ {self.taken_at}"
+
+    @classmethod
+    def include_backdated(cls, deltas, using=None):
+        """Add backdated `{(item_id, occurred_at): delta}` movements to the
+        snapshots taken at or after they occurred, in one UPDATE."""
+        match = models.Q()
+        increment = Value(0)
+        for (item_id, occurred_at), d in deltas.items():
+            cond = models.Q(item_id=item_id, taken_at__gte=occurred_at)
+            match |= cond
+            increment = increment + models.Case(models.When(cond, then=Value(d)), default=Value(0), output_field=models.IntegerField())
+        cls.objects.using(using).filter(match).update(quantity=models.F('quantity') + increment)
+
+    @classmethod
+    def take(cls, items=None, using=None):
+        """Snapshot the current quantity of every item (of `items`) moved since its
+        latest snapshot. Items are locked meanwhile so a concurrent movement is
+        either already included or applied to the new snapshot afterwards."""
+        using = using or router.db_for_write(cls)
+        items = InventoryItem.objects.using(using).all() if items is None else items.using(using)
+        latest = cls.objects.filter(item=models.OuterRef('pk')).order_by('-taken_at').values('taken_at')[:1]
+        moved = StockMovement.objects.filter(
+            item=models.OuterRef('pk'),
+            occurred_at__gt=Coalesce(models.OuterRef('last_snapshot'), Value(LEDGER_EPOCH)),
+        )
+        with transaction.atomic(using=using):
+            now = timezone.now()
+            due = (
+                items.annotate(last_snapshot=models.Subquery(latest)).filter(models.Exists(moved))
+                .select_for_update(of=('self',)).values_list('pk', 'quantity')
+            )
+            snapshots = [cls(item_id=pk, taken_at=now, quantity=quantity) for pk, quantity in due]
+            cls.objects.using(using).bulk_create(snapshots)
+        return len(snapshots)
+
 
 class Acte(TimestampedModel):
     """Represents a medical act/procedure that can be used for scheduling and billing.
@@ -257,6 +798,10 @@ class Acte(TimestampedModel):
     tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE)
     # allow hierarchical acts: an Acte may have a parent Acte (sub-acts)
     parent = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='sub_actes')
+    # materialized path of the hierarchy: one `<id hex>/` segment per ancestor,
+    # ending with this acte's own id (e.g. `<root>/<child>/`). Maintained by save().
+    path = models.CharField(max_length=512, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     code = models.CharField(max_length=64, blank=True)
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
@@ -264,36 +809,167 @@ class Acte(TimestampedModel):
     currency = models.CharField(max_length=8, default='CDF')
     active = models.BooleanField(default=True)
 
+    PATH_SEGMENT_LENGTH = 33  # 32 hex chars + '/'
+
     class Meta:
-        indexes = [models.Index(fields=['code']), models.Index(fields=['name'])]
+        indexes = [
+            models.Index(fields=['code']),
+            models.Index(fields=['name']),
+            # prefix (LIKE 'abc/%') scans over subtrees; pattern ops for Postgres
+            models.Index(fields=['path'], name='core_acte_path_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['tenant', 'updated_at', 'id']),
+        ]
         unique_together = (('tenant', 'code'),)
 
     def __str__(self):
         return f"{self.name} ({self.code})"
 
+    @classmethod
+    def path_ids(cls, path):
+        """Ids encoded in a materialized path, root first."""
+        return [uuid.UUID(seg) for seg in path.split('/') if seg]
+
+    def is_descendant_of(self, other):
+        return bool(other.path) and self.path.startswith(other.path) and self.pk != other.pk
+
     def save(self, *args, **kwargs):
-        # Save first to ensure `id` exists for children/parent relations
-        super().save(*args, **kwargs)
-        # Keep parent amounts consistent: if this Acte has children, its amount
-        # should be the sum of its children's amounts. If this Acte is a child,
-        # propagate a recalculation to the parent.
-        try:
-            from django.db.models import Sum
-            # If this acte has children, compute and store their sum
-            children_qs = self.sub_actes.all()
-            if children_qs.exists():
-                total = children_qs.aggregate(s=Sum('amount'))['s'] or 0
-                # use update to avoid recursive save loops
-                if float(self.amount or 0) != float(total):
-                    Acte.objects.filter(id=self.id).update(amount=total)
-
-            # If this acte is a child, update its parent total
+        using = kwargs.get('using') or router.db_for_write(Acte, instance=self)
+        with transaction.atomic(using=using):
+            old_path = ''
+            if not self._state.adding:
+                old_path = Acte.objects.using(using).filter(pk=self.pk).values_list('path', flat=True).first() or ''
+            parent_path = ''
             if self.parent_id:
-                parent = Acte.objects.filter(id=self.parent_id).first()
-                if parent:
-                    total = parent.sub_actes.aggregate(s=Sum('amount'))['s'] or 0
-                    if float(parent.amount or 0) != float(total):
-                        Acte.objects.filter(id=parent.id).update(amount=total)
-        except Exception:
-            # never block saving the object for unexpected errors
-            pass
+                parent_path = Acte.objects.using(using).filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+            if old_path and parent_path.startswith(old_path):
+                raise ValueError('An acte cannot be moved under itself or one of its sub-actes')
+            self.path = f"{parent_path}{self.id.hex}/"
+            self.depth = len(self.path) // self.PATH_SEGMENT_LENGTH - 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'path', 'depth'}
+            super().save(*args, **kwargs)
+
+            if old_path and old_path != self.path:
+                # moved: rewrite the whole subtree's paths in one statement
+                Acte.objects.using(using).filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+                    depth=models.F('depth') + (self.depth - old_path.count('/') + 1),
+                    updated_at=timezone.now(),
+                )
+            # Keep parent amounts consistent: an acte with children is priced at
+            # the sum of its subtree, for every ancestor up to the root.
+            ancestors = set(self.path_ids(self.path)) | set(self.path_ids(old_path))
+            Acte.recompute_subtree_amounts(ancestors, using=using)
+            self.amount = Acte.objects.using(using).filter(pk=self.pk).values_list('amount', flat=True).first()
+
+    @classmethod
+    def recompute_subtree_amounts(cls, ids, using=None):
+        """Set-wise: every acte in `ids` that has children gets amount = sum of
+        the leaf amounts of its subtree (equivalently, of its children's
+        recomputed amounts). One UPDATE regardless of depth."""
+        if not ids:
+            return 0
+        using = using or router.db_for_write(cls)
+        has_children = models.Exists(cls.objects.filter(parent=models.OuterRef('pk')))
+        leaves = (
+            cls.objects.filter(tenant=models.OuterRef('tenant'), path__startswith=models.OuterRef('path'))
+            .exclude(pk=models.OuterRef('pk'))
+            .filter(~models.Exists(cls.objects.filter(parent=models.OuterRef('pk'))))
+            .order_by().values('tenant').annotate(s=models.Sum('amount')).values('s')
+        )
+        amount = Coalesce(models.Subquery(leaves, output_field=models.DecimalField(max_digits=10, decimal_places=2)), Value(0))
+        return cls.objects.using(using).filter(pk__in=ids).filter(has_children).annotate(new_amount=amount).exclude(
+            amount=models.F('new_amount'),
+        ).update(amount=amount, updated_at=timezone.now())
+
+
+class ActeConsumable(models.Model):
+    """Bill of materials: `quantity` units of `item` used each time `acte` is performed."""
+
+    acte = models.ForeignKey('core.Acte', on_delete=models.CASCADE, related_name='consumables')
+    item = models.ForeignKey('core.InventoryItem', on_delete=models.CASCADE, related_name='used_by')
+    quantity = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])
+
+    class Meta:
+        unique_together = (('acte', 'item'),)
+
+    def __str__(self):
+        return f"{self.acte_id} uses {self.quantity} x {self.item_id}"
+
+    @classmethod
+    def issue_for_billing(cls, billing, billing_items, staff=None, using=None):
+        """Deduct the consumables of every billed acte from stock.
+
+        Needs are summed per inventory item across all lines (one query for
+        the bills of materials) and posted as one issue movement per item
+        through StockMovement.post, i.e. a single conditional UPDATE. Raises
+        InsufficientStock, applying nothing, when an item runs short.
+        """
+        lines = {}
+        for line in billing_items:
+            if line.acte_id and line.quantity and line.quantity > 0:
+                lines[line.acte_id] = lines.get(line.acte_id, 0) + line.quantity
+        if not lines:
+            return []
+        needs = {}
+        for acte_id, item_id, quantity in cls.objects.using(using).filter(acte_id__in=list(lines)).values_list('acte_id', 'item_id', 'quantity'):
+            needs[item_id] = needs.get(item_id, 0) + quantity * lines[acte_id]
+        movements = [
+            StockMovement(
+                tenant_id=billing.tenant_id, item_id=item_id, kind='issue', delta=-need,
+                reference=f"billing:{billing.pk}", staff=staff,
+            )
+            for item_id, need in needs.items()
+        ]
+        return StockMovement.post(movements, using=using)
+
+
+class ActeCatalogVersion(models.Model):
+    """Per-tenant counter bumped on every Acte write (see core.signals).
+
+    Lets each worker's in-process catalog cache (core.catalog) detect stale
+    entries with a single primary-key lookup, and doubles as the ETag of
+    the catalog endpoints.
+    """
+
+    tenant = models.OneToOneField('tenants.Tenant', on_delete=models.CASCADE, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.tenant_id} v{self.version}"
+
+    @classmethod
+    def current(cls, tenant_id, using=None):
+        return cls.objects.using(using or router.db_for_read(cls)).filter(pk=tenant_id).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls, tenant_id, using=None, create=True):
+        using = using or router.db_for_write(cls)
+        with transaction.atomic(using=using):
+            if cls.objects.using(using).filter(pk=tenant_id).update(version=models.F('version') + 1) or not create:
+                return
+            try:
+                with transaction.atomic(using=using):
+                    cls.objects.using(using).create(tenant_id=tenant_id, version=1)
+            except IntegrityError:
+                cls.objects.using(using).filter(pk=tenant_id).update(version=models.F('version') + 1)
+
+
+class Tombstone(models.Model):
+    """Record of a deleted row, so delta-sync clients (core.sync) can drop it.
+
+    Written by the post_delete handlers in core.signals. `tenant_id` is a
+    plain column rather than a foreign key so tombstones survive, and can be
+    written during, the cascade of a tenant deletion.
+    """
+
+    tenant_id = models.UUIDField()
+    resource = models.CharField(max_length=32)
+    object_id = models.UUIDField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['tenant_id', 'resource', 'deleted_at', 'id'])]
+
+    def __str__(self):
+        return f"{self.resource} {self.object_id} deleted {self.deleted_at}"
@@ -0,0 +1,172 @@
+from collections import OrderedDict
+
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Keyset (seek) pagination over a composite ordering such as (last_name, id).
+
+    Each page is fetched with `WHERE (ordering) > (last row of previous page)`
+    instead of OFFSET, so page N costs the same as page 1 and no COUNT(*) is
+    issued. Cursors are signed and opaque to clients.
+
+    Views declare their ordering with `keyset_ordering = ('-date', 'id')`; when
+    absent the queryset ordering is used with `id` appended as a tie-breaker.
+    NULL values in nullable ordering fields always sort last.
+
+    Pagination is opt-in: a request without `cursor` or `page_size` keeps the
+    historical unpaginated list response so existing clients are unaffected.
+    """
+
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    signing_salt = 'core.pagination.keyset'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset, view)
+        model = queryset.model
+
+        order_by = []
+        for field in self.ordering:
+            expr = F(field.lstrip('-'))
+            order_by.append(expr.desc(nulls_last=True) if field.startswith('-') else expr.asc(nulls_last=True))
+        queryset = queryset.order_by(*order_by)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self._after(model, position))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_position = self._position(rows[-1]) if (self.has_next and rows) else None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_ordering(self, queryset, view):
+        ordering = getattr(view, 'keyset_ordering', None)
+        if not ordering:
+            ordering = [f for f in queryset.query.order_by if isinstance(f, str)]
+        ordering = list(ordering)
+        if not any(f.lstrip('-') in ('id', 'pk') for f in ordering):
+            ordering.append('id')
+        return ordering
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def encode_cursor(self, position):
+        # keep full precision: datetimes as ISO 8601 (with microseconds), UUIDs/decimals as str
+        values = []
+        for v in position:
+            if hasattr(v, 'isoformat'):
+                v = v.isoformat()
+            elif v is not None and not isinstance(v, (str, int, float, bool)):
+                v = str(v)
+            values.append(v)
+        return signing.dumps(values, salt=self.signing_salt, compress=True)
+
+    def decode_cursor(self, request):
+        raw = request.query_params.get(self.cursor_query_param)
+        if not raw:
+            return None
+        try:
+            values = signing.loads(raw, salt=self.signing_salt)
+        except signing.BadSignature:
+            raise NotFound('Invalid cursor')
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound('Invalid cursor')
+        return values
+
+    def _position(self, obj):
+        values = []
+        for field in self.ordering:
+            value = obj
+            parts = field.lstrip('-').split('__')
+            for i, part in enumerate(parts):
+                if value is None:
+                    break
+                if i == len(parts) - 1:
+                    # a foreign key orders (and filters) by its column, not the related row
+                    part = self._attname(type(value), part)
+                value = getattr(value, part, None)
+            values.append(value)
+        return values
+
+    @staticmethod
+    def _attname(model, name):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return name
+        return field.attname if field.concrete and field.is_relation else name
+
+    def _after(self, model, position, i=0):
+        """Build the strict "row comes after `position`" predicate for ordering[i:]."""
+        if i >= len(self.ordering):
+            return Q(pk__in=[])
+        field = self.ordering[i]
+        name = field.lstrip('-')
+        value = position[i]
+        rest = self._after(model, position, i + 1)
+        if value is None:
+            # nulls sort last: only other nulls (tie-broken by later fields) follow
+            return Q(**{f'{name}__isnull': True}) & rest
+        op = 'lt' if field.startswith('-') else 'gt'
+        cond = Q(**{f'{name}__{op}': value}) | (Q(**{name: value}) & rest)
+        if self._nullable(model, name):
+            cond |= Q(**{f'{name}__isnull': True})
+        return cond
+
+    @staticmethod
+    def _nullable(model, path):
+        opts = model._meta
+        for part in path.split('__'):
+            try:
+                field = opts.get_field(part)
+            except FieldDoesNotExist:
+                return True
+            if getattr(field, 'null', False):
+                return True
+            if field.is_relation and field.related_model is not None:
+                opts = field.related_model._meta
+        return False
@@ -8,9 +8,30 @@ DEFAULT_ROLE_MAP = {
     'StaffViewSet': ['admin'],
     'ActeViewSet': ['admin', 'doctor', 'billing'],
     'InventoryViewSet': ['admin', 'billing'],
+    'StockMovementViewSet': ['admin', 'billing'],
 }
 
 
+def request_role(request):
+    """Lower-cased staff role of the request's user, or None.
+
+    Prefers the signed `role` claim of the access token (no DB query);
+    legacy tokens without it fall back to the staff profile.
+    """
+    role = None
+    token = getattr(request, 'auth', None)
+    if token is not None and hasattr(token, 'get') and 'role' in token:
+        role = token.get('role')
+    else:
+        try:
+            staff = getattr(getattr(request, 'user', None), 'staff_profile', None)
+            if staff:
+                role = getattr(staff, 'role', None)
+        except Exception:
+            role = None
+    return str(role).lower() if role else None
+
+
 class RolePermission(permissions.BasePermission):
     """Permission that checks a user's staff role against allowed roles for a view.
 
@@ -27,20 +48,10 @@ class RolePermission(permissions.BasePermission):
         if getattr(user, 'is_superuser', False):
             return True
 
-        # Attempt to get staff role
-        role = None
-        try:
-            staff = getattr(user, 'staff_profile', None)
-            if staff:
-                role = getattr(staff, 'role', None)
-        except Exception:
-            role = None
-
+        role = request_role(request)
         if not role:
             return False
 
-        role = str(role).lower()
-
         # view-specific override
         allowed = getattr(view, 'allowed_roles', None)
         if allowed is None:
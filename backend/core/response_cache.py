@@ -0,0 +1,87 @@
+"""Tenant-aware cache of the core viewsets' GET responses.
+
+An entry is keyed by tenant, the requester's role, the negotiated renderer,
+path and query string, the ETag of the data (core.mixins.TenantFilterMixin)
+and by the current generation of every model the response is built from
+(`ResponseCacheMixin.response_models`). Saving or
+deleting a row gives its tenant's generation of that model a new value once
+the transaction commits (see core.signals), so later requests build and
+store a new entry; superseded entries expire after `RESPONSE_CACHE_TTL`
+seconds. Writes that bypass signals (queryset updates, bulk_create) call
+`bump()` themselves.
+
+Generations are stored in the cache (`RESPONSE_CACHE_ALIAS`) too. With the
+local-memory backend both are private to a worker process; the ETag, read
+from the database on every request, still changes with any write that moves
+a validator, whichever worker handled it. The file backend shares entries and
+generations between the workers of a host.
+"""
+import hashlib
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+# response headers kept with a cached entry
+KEPT_HEADERS = ('ETag', 'Last-Modified')
+
+
+def _cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def ttl():
+    return getattr(settings, 'RESPONSE_CACHE_TTL', 30)
+
+
+def _generation_key(tenant_id, label):
+    return f'core:respgen:{tenant_id}:{label}'
+
+
+def generations(tenant_id, labels):
+    """Current generation of each model label for the tenant.
+
+    A missing generation (never bumped, or evicted) starts at the current
+    time rather than 0, so an eviction cannot revive older entries.
+    """
+    keys = {label: _generation_key(tenant_id, label) for label in labels}
+    found = _cache().get_many(keys.values())
+    missing = {key: time.time_ns() for key in keys.values() if key not in found}
+    for key, value in missing.items():
+        _cache().add(key, value, timeout=None)
+    if missing:
+        found = {**found, **_cache().get_many(missing)}
+    return [found.get(keys[label], 0) for label in labels]
+
+
+def bump(tenant_ids, *labels, using=None):
+    """Invalidate the tenants' cached responses built from `labels`, on commit."""
+    values = {
+        _generation_key(tenant_id, label): time.time_ns()
+        for tenant_id in {t for t in tenant_ids if t is not None}
+        for label in labels
+    }
+    if values:
+        transaction.on_commit(partial(_cache().set_many, values, timeout=None), using=using)
+
+
+def key_for(request, tenant_id, labels, role, etag=None):
+    renderer = getattr(getattr(request, 'accepted_renderer', None), 'format', '')
+    raw = '|'.join([request.path, request.META.get('QUERY_STRING', ''), renderer, role or '', etag or '']
+                   + [str(g) for g in generations(tenant_id, labels)])
+    return f'core:resp:{tenant_id}:{hashlib.sha256(raw.encode()).hexdigest()}'
+
+
+def cacheable(request):
+    return ttl() > 0
+
+
+def get(key):
+    return _cache().get(key)
+
+
+def store(key, response):
+    headers = {h: response[h] for h in KEPT_HEADERS if response.has_header(h)}
+    _cache().set(key, (response.status_code, response.data, headers), ttl())
@@ -1,7 +1,13 @@
+import uuid
+from decimal import Decimal
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Patient, Staff, Appointment, Billing, InventoryItem, Acte, BillingItem
-from django.db.models import Q
+from .models import Patient, Staff, Appointment, Billing, InventoryItem, Acte, ActeConsumable, BillingItem, StockMovement
+from .catalog import get_catalog
+from django.conf import settings
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
 
 
 class PatientSerializer(serializers.ModelSerializer):
@@ -14,13 +20,36 @@ class PatientSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('medical_record_number',)
 
+    # nested history is paginated: ?history_page=N&history_page_size=M; callers
+    # that already fetched the page pass it as context['appointments' / 'billings']
+    HISTORY_PAGE_SIZE = 20
+    HISTORY_MAX_PAGE_SIZE = 100
+
+    def history_window(self):
+        request = self.context.get('request')
+        params = getattr(request, 'query_params', {}) if request is not None else {}
+        try:
+            page = max(int(params.get('history_page', 1)), 1)
+        except (TypeError, ValueError):
+            page = 1
+        try:
+            size = int(params.get('history_page_size', self.HISTORY_PAGE_SIZE))
+        except (TypeError, ValueError):
+            size = self.HISTORY_PAGE_SIZE
+        size = min(max(size, 1), self.HISTORY_MAX_PAGE_SIZE)
+        start = (page - 1) * size
+        return start, start + size
+
     def get_appointments(self, obj):
         try:
             # import here to avoid ordering issues
             from .serializers import AppointmentSerializer as _AS
         except Exception:
             _AS = AppointmentSerializer
-        qs = obj.appointments.all().order_by('-date')
+        qs = self.context.get('appointments')
+        if qs is None:
+            start, end = self.history_window()
+            qs = obj.appointments.all().order_by('-date')[start:end]
         return _AS(qs, many=True).data
 
     def get_billings(self, obj):
@@ -28,9 +57,45 @@ class PatientSerializer(serializers.ModelSerializer):
             from .serializers import BillingSerializer as _BS
         except Exception:
             _BS = BillingSerializer
-        qs = obj.billings.all().order_by('-issued_at')
+        qs = self.context.get('billings')
+        if qs is None:
+            start, end = self.history_window()
+            qs = self.billing_history(obj)[start:end]
         return _BS(qs, many=True).data
 
+    @staticmethod
+    def billing_history(obj):
+        return obj.billings.all().select_related('patient').prefetch_related('items__acte', 'payments').order_by('-issued_at')
+
+
+class PatientSummarySerializer(serializers.ModelSerializer):
+    """Lightweight patient row used by list views.
+
+    Only patient columns plus values annotated by the viewset queryset
+    (see `PatientViewSet.get_queryset`), so serializing a page never issues
+    extra queries. The full nested history is served by `PatientSerializer`.
+    """
+
+    medical_record_number = serializers.CharField(read_only=True)
+    appointments_count = serializers.IntegerField(read_only=True, default=0)
+    billings_count = serializers.IntegerField(read_only=True, default=0)
+    last_visit = serializers.DateTimeField(read_only=True, default=None)
+    outstanding_balance = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Patient
+        fields = '__all__'
+        read_only_fields = ('medical_record_number',)
+
+    def get_outstanding_balance(self, obj):
+        # one annotated column per currency: `outstanding_CDF`, `outstanding_USD`, ...
+        balances = {}
+        for cur, _label in Billing.CURRENCY_CHOICES:
+            val = getattr(obj, f'outstanding_{cur}', None)
+            if val:
+                balances[cur] = float(val)
+        return balances
+
 
 class StaffSerializer(serializers.ModelSerializer):
     display_name = serializers.SerializerMethodField()
@@ -103,7 +168,36 @@ class AppointmentSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class ActeReferenceField(serializers.Field):
+    """Acte reference accepted as an id, a code/name, a `{id|code|name}` dict
+    or an Acte instance.
+
+    Unlike PrimaryKeyRelatedField it does not hit the database per item:
+    values are only normalized here and resolved in one batch by
+    `BillingSerializer.resolve_actes`. Output is the acte id.
+    """
+
+    def get_attribute(self, instance):
+        return getattr(instance, 'acte_id', None)
+
+    def to_representation(self, value):
+        return value
+
+    def to_internal_value(self, data):
+        if isinstance(data, Acte):
+            return data
+        if isinstance(data, dict):
+            data = data.get('id') or data.get('code') or data.get('name')
+        if data is None:
+            return None
+        # strip surrounding whitespace/non-breaking spaces from display values
+        return str(data).strip() or None
+
+
 class BillingItemSerializer(serializers.ModelSerializer):
+    # writable so BillingSerializer.update can match incoming lines to existing ones
+    id = serializers.UUIDField(required=False)
+    acte = ActeReferenceField(required=False, allow_null=True)
     acte_display = serializers.CharField(source='acte.name', read_only=True)
 
     class Meta:
@@ -128,103 +222,69 @@ class BillingSerializer(serializers.ModelSerializer):
         # explicit fields (removed `status` and `insurance_reference`)
         fields = ['id', 'tenant', 'patient', 'appointment', 'amount', 'currency', 'description', 'issued_at', 'paid_at', 'items', 'patient_display', 'payments', 'remaining_due', 'paid_total']
 
-    def create(self, validated_data):
-        items_data = validated_data.pop('items', [])
-        # If amount not provided, compute from items (snapshot unit_price from Acte if needed)
-        total_amount = 0
+    @staticmethod
+    def resolve_actes(items_data, tenant):
+        """Replace each item's acte reference by an Acte instance.
+
+        All references (ids, codes, names) are resolved at once from the
+        tenant's cached catalog; ids win over codes, codes over names. Unknown
+        references, or references without a tenant to look them up in, raise
+        a ValidationError.
+        """
+        refs = {it.get('acte') for it in items_data if it.get('acte') and not isinstance(it.get('acte'), Acte)}
+        if not refs:
+            return items_data
+        if tenant is None:
+            # never fall back to a lookup across every tenant's actes
+            raise serializers.ValidationError({'tenant': 'A tenant is required to resolve actes'})
+        # served from the per-tenant in-process catalog (one version check)
+        catalog = get_catalog(tenant)
+        missing = []
         for it in items_data:
-            acte_id = it.get('acte')
-            acte_obj = None
-            # defensive normalization: frontend may send an Acte instance, a dict/object, or a display name
-            if acte_id is not None:
-                # if caller passed an Acte model instance accidentally
-                try:
-                    from .models import Acte as _ActeModel
-                except Exception:
-                    _ActeModel = Acte
-                if isinstance(acte_id, _ActeModel):
-                    acte_obj = acte_id
-                    acte_id = acte_obj.id
-                    it['acte'] = acte_id
-                # if caller passed a dict-like object (e.g., {id: ..., name: ...})
-                elif isinstance(acte_id, dict):
-                    # prefer explicit id field
-                    if acte_id.get('id'):
-                        acte_id = acte_id.get('id')
-                        it['acte'] = acte_id
-                    else:
-                        # fallback to name/code fields
-                        acte_id = acte_id.get('code') or acte_id.get('name') or acte_id
-                        it['acte'] = acte_id
-                # if it's a string, strip surrounding whitespace/non-breaking spaces
-                elif isinstance(acte_id, str):
-                    acte_id = acte_id.strip() if acte_id is not None else acte_id
-                    it['acte'] = acte_id
-                # now try to resolve acte by id, code or name so frontend may send display values
-                if acte_obj is None and acte_id:
-                    # try id lookup first (will safely accept UUID string)
-                    acte_obj = Acte.objects.filter(id=acte_id).first()
-                    if not acte_obj:
-                        acte_obj = Acte.objects.filter(Q(code__iexact=acte_id) | Q(name__iexact=acte_id)).first()
-                    if acte_obj:
-                        acte_id = acte_obj.id
-                        # replace in item so later code uses resolved id
-                        it['acte'] = acte_id
-            qty = int(it.get('quantity', 1) or 1)
-            disc = float(it.get('discount', 0) or 0)
-            unit_price = it.get('unit_price')
-            if acte_id and (not unit_price):
-                # acte_obj may already be resolved above
-                a = acte_obj or Acte.objects.filter(id=acte_id).first()
-                if a:
-                    unit_price = float(getattr(a, 'amount', 0) or 0)
-                    # prefer acte currency if available
-                    if getattr(a, 'currency', None) and not it.get('currency'):
-                        it['currency'] = a.currency
-            unit_price = float(unit_price or 0)
-            total_amount += max(qty * unit_price - float(disc), 0)
-
-        # set amount if missing
-        if not validated_data.get('amount'):
-            validated_data['amount'] = total_amount
-
-        billing = Billing.objects.create(**validated_data)
-        # create items using model to avoid nested serializer recursion
-        for it in items_data:
-            acte_id = it.get('acte')
-            # defensive normalization again before database use
-            if acte_id is not None:
-                try:
-                    from .models import Acte as _ActeModel
-                except Exception:
-                    _ActeModel = Acte
-                if isinstance(acte_id, _ActeModel):
-                    acte_id = acte_id.id
-                elif isinstance(acte_id, dict):
-                    acte_id = acte_id.get('id') or acte_id.get('code') or acte_id.get('name') or acte_id
-                elif isinstance(acte_id, str):
-                    acte_id = acte_id.strip()
-                it['acte'] = acte_id
-            # try resolve acte id again in case frontend provided name/code
-            if acte_id and not Acte.objects.filter(id=acte_id).exists():
-                a_lookup = Acte.objects.filter(Q(code__iexact=acte_id) | Q(name__iexact=acte_id)).first()
-                if a_lookup:
-                    acte_id = a_lookup.id
-            # snapshot price from acte if acte provided and unit_price missing
-            if acte_id and (not it.get('unit_price')):
-                a = Acte.objects.filter(id=acte_id).first()
-                if a:
-                    it['unit_price'] = getattr(a, 'amount', it.get('unit_price'))
-                    it['currency'] = getattr(a, 'currency', it.get('currency', billing.currency))
-
-            kwargs = {'billing': billing}
-            if acte_id:
-                kwargs['acte_id'] = acte_id
-            for f in ('description', 'quantity', 'unit_price', 'currency', 'discount'):
-                if f in it:
-                    kwargs[f] = it[f]
-            BillingItem.objects.create(**kwargs)
+            ref = it.get('acte')
+            if not ref or isinstance(ref, Acte):
+                continue
+            it['acte'] = catalog.lookup(ref)
+            if it['acte'] is None:
+                missing.append(str(ref))
+        if missing:
+            raise serializers.ValidationError({'items': [f"Unknown acte: {m}" for m in missing]})
+        return items_data
+
+    @staticmethod
+    def build_item(billing, it):
+        """Unsaved BillingItem for `it` with price snapshot and total computed."""
+        kwargs = {'billing': billing}
+        if it.get('acte'):
+            kwargs['acte'] = it['acte']
+        for f in ('description', 'quantity', 'unit_price', 'currency', 'discount'):
+            if f in it:
+                kwargs[f] = it[f]
+        item = BillingItem(**kwargs)
+        item.compute_total()
+        return item
 
+    def create(self, validated_data):
+        items_data = validated_data.pop('items', [])
+        self.resolve_actes(items_data, tenant=validated_data.get('tenant'))
+
+        with transaction.atomic():
+            billing = Billing(**validated_data)
+            items = [self.build_item(billing, it) for it in items_data]
+            # If amount not provided, compute from items (snapshot unit_price from Acte if needed)
+            if not validated_data.get('amount'):
+                billing.amount = sum(Decimal(str(item.total or 0)) for item in items)
+            billing.save()
+            # line totals were computed by build_item, so bulk_create (which skips save) is safe
+            BillingItem.objects.bulk_create(items)
+            # consumables of the billed actes leave stock with the invoice
+            # (InsufficientStock rolls the whole invoice back)
+            request = self.context.get('request')
+            staff = getattr(getattr(request, 'user', None), 'staff_profile', None)
+            ActeConsumable.issue_for_billing(billing, items, staff=staff)
+
+        # fixed number of queries for the response, whatever the line count
+        prefetch_related_objects([billing], 'items__acte', 'payments')
         return billing
 
     def get_patient_display(self, obj):
@@ -238,62 +298,93 @@ class BillingSerializer(serializers.ModelSerializer):
         return None
 
     def get_payments(self, obj):
-        try:
-            from .serializers import BillingItemSerializer as _bis
-        except Exception:
-            _bis = BillingItemSerializer
-        # reuse BillingItemSerializer for items, but payments need a serializer
-        try:
-            from .serializers import BillingItemSerializer as _p
-        except Exception:
-            _p = BillingItemSerializer
         payments_qs = getattr(obj, 'payments', None)
         if payments_qs is None:
             return []
-        # simple mapping
-        return [{'id': str(p.id), 'amount': float(p.amount), 'currency': p.currency, 'method': p.method, 'paid_at': p.paid_at} for p in payments_qs.all().order_by('-paid_at')]
+        # sort in Python so a `prefetch_related('payments')` on the queryset is honoured
+        payments = sorted(payments_qs.all(), key=lambda p: p.paid_at, reverse=True)
+        return [{'id': str(p.id), 'amount': float(p.amount), 'currency': p.currency, 'method': p.method, 'paid_at': p.paid_at} for p in payments]
 
     def get_paid_total(self, obj):
         try:
-            return float(getattr(obj, 'paid_total', 0) or 0)
+            return float(obj.paid_total or 0)
         except Exception:
-            try:
-                return float(obj.payments.aggregate(s=models.Sum('amount'))['s'] or 0)
-            except Exception:
-                return 0
+            return 0
 
     def get_remaining_due(self, obj):
         try:
-            return float(getattr(obj, 'remaining_due', 0) or 0)
+            return float(obj.remaining_due or 0)
         except Exception:
             return 0
 
     def update(self, instance, validated_data):
         items_data = validated_data.pop('items', None)
-        for attr, val in validated_data.items():
-            setattr(instance, attr, val)
-        instance.save()
         if items_data is not None:
-            # delete existing items and recreate
-            instance.items.all().delete()
-            for it in items_data:
-                acte_id = it.get('acte')
-                if acte_id and (not it.get('unit_price')):
-                    a = Acte.objects.filter(id=acte_id).first()
-                    if a:
-                        it['unit_price'] = getattr(a, 'amount', it.get('unit_price'))
-                        it['currency'] = getattr(a, 'currency', it.get('currency', instance.currency))
-                kwargs = {'billing': instance}
-                if acte_id:
-                    kwargs['acte_id'] = acte_id
-                for f in ('description', 'quantity', 'unit_price', 'currency', 'discount'):
-                    if f in it:
-                        kwargs[f] = it[f]
-                BillingItem.objects.create(**kwargs)
+            self.resolve_actes(items_data, tenant=instance.tenant_id)
+        # header and lines are saved together or not at all
+        with transaction.atomic(using=instance._state.db):
+            for attr, val in validated_data.items():
+                setattr(instance, attr, val)
+            instance.save()
+            if items_data is not None:
+                self.reconcile_items(instance, items_data)
         return instance
 
+    ITEM_FIELDS = ('acte', 'description', 'quantity', 'unit_price', 'currency', 'discount', 'total')
+
+    def _item_state(self, item):
+        # compare money values at column precision (compute_total yields floats)
+        cents = Decimal('0.01')
+        return [
+            Decimal(str(v)).quantize(cents) if isinstance(v, (float, Decimal)) else v
+            for v in (getattr(item, 'acte_id' if f == 'acte' else f) for f in self.ITEM_FIELDS)
+        ]
+
+    def reconcile_items(self, billing, items_data):
+        """Sync billing.items with `items_data`, matching lines by `id`.
+
+        Matched lines are updated in place (one bulk_update for the changed
+        ones), lines without a known id are bulk-created and lines missing
+        from the payload are deleted, so item ids stay stable across edits.
+        """
+        existing = {str(item.id): item for item in billing.items.all()}
+        to_create, to_update, keep = [], [], set()
+        now = timezone.now()
+        for it in items_data:
+            item = existing.get(str(it.get('id'))) if it.get('id') else None
+            if item is None or str(item.id) in keep:
+                to_create.append(self.build_item(billing, it))
+                continue
+            keep.add(str(item.id))
+            before = self._item_state(item)
+            if 'acte' in it and (it['acte'].id if it['acte'] else None) != item.acte_id:
+                item.acte = it['acte']
+                if 'unit_price' not in it:
+                    # re-snapshot the price of the new acte
+                    item.unit_price = 0
+            for f in ('description', 'quantity', 'unit_price', 'currency', 'discount'):
+                if f in it:
+                    setattr(item, f, it[f])
+            item.compute_total()
+            if self._item_state(item) != before:
+                item.updated_at = now
+                to_update.append(item)
+
+        removed = [pk for pk in existing if pk not in keep]
+        if removed:
+            BillingItem.objects.filter(billing=billing, id__in=removed).delete()
+        if to_update:
+            BillingItem.objects.bulk_update(to_update, list(self.ITEM_FIELDS) + ['updated_at'])
+        if to_create:
+            BillingItem.objects.bulk_create(to_create)
+        if hasattr(billing, '_prefetched_objects_cache'):
+            billing._prefetched_objects_cache.pop('items', None)
+
 
 class BillingItemSerializer(serializers.ModelSerializer):
+    # writable so BillingSerializer.update can match incoming lines to existing ones
+    id = serializers.UUIDField(required=False)
+    acte = ActeReferenceField(required=False, allow_null=True)
     acte_display = serializers.CharField(source='acte.name', read_only=True)
 
     class Meta:
@@ -315,8 +406,108 @@ class InventorySerializer(serializers.ModelSerializer):
         model = InventoryItem
         fields = '__all__'
 
+    def validate_quantity(self, value):
+        if value < 0 and not getattr(settings, 'INVENTORY_ALLOW_NEGATIVE_STOCK', False):
+            raise serializers.ValidationError('Quantity must not be negative')
+        return value
+
+    def update(self, instance, validated_data):
+        # quantity is never written directly (see InventoryItem.save): a new
+        # value is posted as an adjustment movement of the difference
+        quantity = validated_data.pop('quantity', None)
+        using = instance._state.db
+        with transaction.atomic(using=using):
+            instance = super().update(instance, validated_data)
+            if quantity is not None:
+                current = InventoryItem.objects.using(using).select_for_update().values_list(
+                    'quantity', flat=True).get(pk=instance.pk)
+                if quantity != current:
+                    request = self.context.get('request')
+                    staff = getattr(getattr(request, 'user', None), 'staff_profile', None)
+                    StockMovement.post([StockMovement(
+                        tenant_id=instance.tenant_id, item=instance, kind='adjustment',
+                        delta=quantity - current, staff=staff, note='Quantity edited',
+                    )], using=using)
+                instance.quantity = quantity
+        return instance
+
+
+class InventoryItemField(serializers.PrimaryKeyRelatedField):
+    """InventoryItem of the request's tenant, by id.
+
+    Batch writers preload the items into `context['items']` ({id: item}) so
+    validating many rows does not query once per row.
+    """
+
+    def get_queryset(self):
+        qs = InventoryItem.objects.all()
+        tenant = getattr(self.context.get('request'), 'tenant', None)
+        return qs.filter(tenant=tenant) if tenant is not None else qs.none()
+
+    def to_internal_value(self, data):
+        items = self.context.get('items')
+        if items is not None:
+            try:
+                item = items.get(uuid.UUID(str(data)))
+            except ValueError:
+                item = None
+            if item is None:
+                self.fail('does_not_exist', pk_value=data)
+            return item
+        return super().to_internal_value(data)
+
+
+class StockMovementSerializer(serializers.ModelSerializer):
+    item = InventoryItemField()
+    # units moved: positive for receipts and issues, signed for adjustments
+    quantity = serializers.IntegerField(write_only=True)
+
+    class Meta:
+        model = StockMovement
+        fields = ['id', 'tenant', 'item', 'kind', 'quantity', 'delta', 'occurred_at', 'reference', 'note', 'staff', 'created_at']
+        read_only_fields = ('tenant', 'delta', 'staff', 'created_at')
+
+    def validate(self, attrs):
+        quantity = attrs.pop('quantity')
+        if quantity == 0:
+            raise serializers.ValidationError({'quantity': 'Quantity must not be zero'})
+        if attrs['kind'] != 'adjustment' and quantity < 0:
+            raise serializers.ValidationError({'quantity': 'Quantity must be positive for receipts and issues'})
+        occurred_at = attrs.get('occurred_at')
+        if occurred_at is not None and occurred_at > timezone.now():
+            raise serializers.ValidationError({'occurred_at': 'Movements cannot be dated in the future'})
+        attrs['delta'] = StockMovement.signed_delta(attrs['kind'], quantity)
+        return attrs
+
+    def build(self, attrs):
+        """Unsaved StockMovement for validated `attrs` (see StockMovement.post)."""
+        request = self.context.get('request')
+        staff = getattr(getattr(request, 'user', None), 'staff_profile', None)
+        return StockMovement(tenant_id=attrs['item'].tenant_id, staff=staff, **attrs)
+
+    def create(self, validated_data):
+        validated_data.pop('tenant', None)
+        movement = self.build(validated_data)
+        StockMovement.post([movement])
+        return movement
+
+
+class ActeConsumableSerializer(serializers.ModelSerializer):
+    item = InventoryItemField()
+    item_display = serializers.CharField(source='item.name', read_only=True)
+
+    class Meta:
+        model = ActeConsumable
+        fields = ['id', 'item', 'item_display', 'quantity']
+
 
 class ActeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Acte
         fields = '__all__'
+
+    def validate_parent(self, parent):
+        if parent is not None and self.instance is not None:
+            if parent.pk == self.instance.pk or parent.is_descendant_of(self.instance):
+                raise serializers.ValidationError('An acte cannot be moved under itself or one of its sub-actes.')
+        return parent
@@ -0,0 +1,187 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+from django.db.models.functions import Substr
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from tenants import sharding
+from tenants.models import UserShard
+
+from . import catalog, response_cache, sync
+from .models import Acte, ActeCatalogVersion, Appointment, Billing, BillingDailyTotal, BillingPayment, InventoryItem, Staff, StockMovement
+
+
+@receiver(post_delete, sender=Billing)
+def billing_deleted(sender, instance, using, **kwargs):
+    # also fires for cascades (e.g. deleting a patient), unlike Billing.delete()
+    BillingDailyTotal.bump(instance, billed=-(instance.amount or 0), paid=-(instance.paid_total or 0), using=using)
+
+
+@receiver(pre_save, sender=BillingPayment)
+def payment_saving(sender, instance, using, raw=False, update_fields=None, **kwargs):
+    # remember what the row counted for before this save (raw fixture loads
+    # carry their billings' totals already)
+    instance._counted = None
+    if raw:
+        return
+    if instance._state.adding:
+        instance._counted = (instance.billing_id, Decimal('0'))
+    elif update_fields is None or {'amount', 'billing'} & set(update_fields):
+        instance._counted = BillingPayment.objects.using(using).filter(pk=instance.pk).values_list('billing_id', 'amount').first()
+
+
+@receiver(post_save, sender=BillingPayment)
+def payment_saved(sender, instance, using, raw=False, **kwargs):
+    counted = getattr(instance, '_counted', None)
+    instance._counted = None
+    if raw or counted is None:
+        return
+    billing_id, previous = counted
+    amount = Decimal(str(instance.amount or 0))
+    if billing_id == instance.billing_id:
+        if amount != previous:
+            instance.billing.apply_payment_delta(amount - previous)
+        return
+    # moved to another billing
+    BillingPayment.apply_billing_deltas({billing_id: -previous}, using=using)
+    if amount:
+        instance.billing.apply_payment_delta(amount)
+
+
+@receiver(post_delete, sender=BillingPayment)
+def payment_deleted(sender, instance, using, origin=None, **kwargs):
+    # payments only cascade from their billing's deletion, which takes the
+    # billing's whole paid_total out of the rollup (billing_deleted)
+    if getattr(origin, 'model', type(origin)) is not BillingPayment:
+        return
+    if instance.amount:
+        BillingPayment.apply_billing_deltas({instance.billing_id: -Decimal(str(instance.amount))}, using=using)
+
+
+@receiver(post_delete, sender=Acte)
+def acte_deleted(sender, instance, using, **kwargs):
+    if not instance.path:
+        return
+    # sub-actes were detached (SET_NULL): their subtrees become roots
+    Acte.objects.using(using).filter(path__startswith=instance.path).update(
+        path=Substr('path', len(instance.path) + 1),
+        depth=F('depth') - (instance.depth + 1),
+        updated_at=timezone.now(),
+    )
+    Acte.recompute_subtree_amounts(Acte.path_ids(instance.path)[:-1], using=using)
+
+
+@receiver(post_save, sender=Acte)
+def acte_saved(sender, instance, using, **kwargs):
+    ActeCatalogVersion.bump(instance.tenant_id, using=using)
+    catalog.invalidate(instance.tenant_id)
+
+
+@receiver(post_delete, sender=Acte)
+def acte_catalog_changed_on_delete(sender, instance, using, **kwargs):
+    # update-only: during a tenant cascade the version row may already be gone
+    ActeCatalogVersion.bump(instance.tenant_id, using=using, create=False)
+    catalog.invalidate(instance.tenant_id)
+
+
+@receiver(post_save, sender=InventoryItem)
+@receiver(post_delete, sender=InventoryItem)
+def inventory_item_changed(sender, instance, using, **kwargs):
+    # reorder_level edits, new and deleted items; quantity changes are
+    # invalidated by StockMovement.post
+    InventoryItem.invalidate_low_stock([instance.tenant_id], using=using)
+
+
+@receiver(pre_save, sender=Staff)
+def staff_user_mirrored(sender, instance, using, raw=False, **kwargs):
+    # a shard needs its own copy of the linked user (see tenants.sharding)
+    if not raw and using != DEFAULT_DB_ALIAS and instance.user_id:
+        user = instance.user
+        if not type(user).objects.using(using).filter(pk=user.pk).exists():
+            sharding.mirror(user, using)
+
+
+@receiver(pre_save, sender=Staff)
+def staff_user_changing(sender, instance, using, raw=False, update_fields=None, **kwargs):
+    # which user the row was linked to, for the UserShard directory
+    if raw or instance._state.adding:
+        instance._linked_user_id = None
+    elif update_fields is None or 'user' in update_fields or 'user_id' in update_fields:
+        instance._linked_user_id = Staff.objects.using(using).filter(pk=instance.pk).values_list('user_id', flat=True).first()
+    else:
+        instance._linked_user_id = instance.user_id
+
+
+@receiver(post_save, sender=Staff)
+def staff_user_recorded(sender, instance, using, created=False, raw=False, **kwargs):
+    previous = getattr(instance, '_linked_user_id', None)
+    if previous == instance.user_id and not (created or raw):
+        return
+    if previous is not None and previous != instance.user_id:
+        UserShard.forget(previous, using)
+    if instance.user_id is not None:
+        UserShard.record(instance.user_id, using)
+
+
+@receiver(post_delete, sender=Staff)
+def staff_user_forgotten(sender, instance, using, **kwargs):
+    if instance.user_id is not None:
+        UserShard.forget(instance.user_id, using)
+
+
+def record_tombstone(sender, instance, using, **kwargs):
+    sync.record_deletion(instance, using=using)
+
+
+for _model in sync.SYNC_MODELS:
+    post_delete.connect(record_tombstone, sender=_model, dispatch_uid=f'sync_tombstone_{_model.__name__}')
+
+
+# synced rows that on_delete=SET_NULL detaches when the row they point to is
+# deleted (sub-actes are handled by acte_deleted)
+SET_NULL_DEPENDENTS = {
+    get_user_model(): [(Staff, 'user')],
+    Staff: [(Appointment, 'staff')],
+    Appointment: [(Billing, 'appointment')],
+}
+
+
+def touch_set_null_dependents(sender, instance, using, **kwargs):
+    # the cascade is a queryset update that leaves updated_at alone: move it
+    # now (same transaction) so delta sync sends the detached rows again
+    now = timezone.now()
+    for model, field in SET_NULL_DEPENDENTS[sender]:
+        model.objects.using(using).filter(**{field: instance.pk}).update(updated_at=now)
+
+
+for _model in SET_NULL_DEPENDENTS:
+    pre_delete.connect(touch_set_null_dependents, sender=_model, dispatch_uid=f'sync_set_null_{_model.__name__}')
+
+
+def response_cache_changed(sender, instance, using, raw=False, **kwargs):
+    # raw saves copy rows as they are (loaddata, move_tenant): responses do not change
+    if not raw:
+        response_cache.bump([instance.tenant_id], sender._meta.label, using=using)
+
+
+# models the cached viewsets serve; billing lines and payments reach responses
+# through their billing (saved with its lines, bumped by Billing._refresh_totals)
+for _model in (*sync.SYNC_MODELS, StockMovement):
+    post_save.connect(response_cache_changed, sender=_model, dispatch_uid=f'response_cache_save_{_model.__name__}')
+    post_delete.connect(response_cache_changed, sender=_model, dispatch_uid=f'response_cache_delete_{_model.__name__}')
+
+
+@receiver(post_save, sender=get_user_model())
+def user_renamed(sender, instance, raw=False, update_fields=None, **kwargs):
+    # staff listings show and sort by the linked user's name; moving the staff
+    # row's updated_at also changes its ETag and hands it to delta sync
+    if raw or (update_fields is not None and not {'first_name', 'last_name', 'username'} & set(update_fields)):
+        return
+    staff = sharding.find_staff(instance)
+    if staff is not None:
+        Staff.objects.using(staff._state.db).filter(pk=staff.pk).update(updated_at=timezone.now())
+        response_cache.bump([staff.tenant_id], Staff._meta.label, using=staff._state.db)
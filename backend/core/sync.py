@@ -0,0 +1,150 @@
+"""Incremental (delta) sync of tenant data.
+
+Clients keep one opaque cursor per resource. Each call returns the rows of
+that resource created or updated since the cursor, read with a keyset scan
+over the (tenant, updated_at, id) indexes, plus the ids deleted since then,
+read from `Tombstone` rows written by core.signals.
+
+Rows whose `updated_at` is within `SYNC_SAFETY_LAG` seconds of now are held
+back until the next call, so a transaction that commits slightly after its
+timestamp was taken is not skipped. Tombstones older than
+`SYNC_TOMBSTONE_RETENTION_DAYS` are pruned (`manage.py prune_tombstones`);
+a cursor older than that gets a full resync flagged with `reset`.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Acte, Appointment, Billing, InventoryItem, Patient, Staff, Tombstone
+
+# model -> resource name (same names as the API routes)
+SYNC_MODELS = {
+    Patient: 'patients',
+    Appointment: 'appointments',
+    Billing: 'billing',
+    Acte: 'actes',
+    InventoryItem: 'inventory',
+    Staff: 'staff',
+}
+
+SIGNING_SALT = 'core.sync'
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _lag():
+    return timedelta(seconds=getattr(settings, 'SYNC_SAFETY_LAG', 2))
+
+
+def _retention():
+    return timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+
+def record_deletion(instance, using=None):
+    resource = SYNC_MODELS.get(type(instance))
+    if resource is None or instance.tenant_id is None:
+        return
+    Tombstone.objects.using(using).create(tenant_id=instance.tenant_id, resource=resource, object_id=instance.pk)
+
+
+def prune_tombstones(now=None):
+    """Delete tombstones past the retention period; returns how many."""
+    cutoff = (now or timezone.now()) - _retention()
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
+
+
+def encode_cursor(position):
+    updated_at, last_id, deleted_at, last_tombstone = position
+    return signing.dumps(
+        [updated_at.isoformat() if updated_at else None, str(last_id) if last_id else None,
+         deleted_at.isoformat() if deleted_at else None, last_tombstone],
+        salt=SIGNING_SALT, compress=True,
+    )
+
+
+def decode_cursor(raw):
+    """Position `(updated_at, last_id, deleted_at, last_tombstone_id)` of a cursor.
+
+    A plain ISO 8601 datetime is also accepted and means "changes since then".
+    """
+    if not raw:
+        return None
+    moment = parse_datetime(raw)
+    if moment is not None:
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return (moment, None, moment, None)
+    try:
+        updated_at, last_id, deleted_at, last_tombstone = signing.loads(raw, salt=SIGNING_SALT)
+        return (
+            parse_datetime(updated_at) if updated_at else None,
+            last_id,
+            parse_datetime(deleted_at) if deleted_at else None,
+            last_tombstone,
+        )
+    except (signing.BadSignature, TypeError, ValueError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def _after(field, moment, last_id):
+    if moment is None:
+        return Q()
+    if last_id is None:
+        return Q(**{f'{field}__gt': moment})
+    return Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'id__gt': last_id})
+
+
+def changes(queryset, resource, tenant_id, position=None, limit=DEFAULT_LIMIT, now=None):
+    """Rows of `queryset` changed after `position`, and ids deleted after it.
+
+    Returns `(rows, deleted_ids, next_position, has_more, reset)`. Without a
+    position (first sync, or `reset`) every row is returned and no deletions.
+    """
+    now = now or timezone.now()
+    until = now - _lag()
+    reset = False
+    updated_at, last_id, deleted_at, last_tombstone = position or (None, None, None, None)
+    if position is not None and (deleted_at is None or deleted_at < now - _retention()):
+        # tombstones this old may have been pruned: start over
+        updated_at = last_id = deleted_at = last_tombstone = None
+        position, reset = None, True
+
+    rows = list(
+        queryset.filter(_after('updated_at', updated_at, last_id), updated_at__lte=until)
+        .order_by('updated_at', 'id')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        updated_at, last_id = rows[-1].updated_at, rows[-1].pk
+    elif updated_at is None:
+        updated_at = until
+
+    deleted = []
+    if position is None:
+        # a full listing already excludes deleted rows
+        deleted_at, last_tombstone = until, None
+    else:
+        tombstones = list(
+            Tombstone.objects.filter(
+                _after('deleted_at', deleted_at, last_tombstone),
+                tenant_id=tenant_id, resource=resource, deleted_at__lte=until,
+            ).order_by('deleted_at', 'id').values_list('id', 'deleted_at', 'object_id')[:limit + 1]
+        )
+        if len(tombstones) > limit:
+            has_more = True
+            tombstones = tombstones[:limit]
+        if tombstones:
+            last_tombstone, deleted_at, _ = tombstones[-1]
+        deleted = [str(object_id) for _, _, object_id in tombstones]
+
+    return rows, deleted, (updated_at, last_id, deleted_at, last_tombstone), has_more, reset
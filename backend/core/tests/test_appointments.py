@@ -0,0 +1,55 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db.models.query import QuerySet
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import Appointment, Patient, Staff
+from tenants.models import Tenant
+
+
+class AppointmentConflictTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        user = get_user_model().objects.create_user(username='admin', password='x')
+        self.staff = Staff.objects.create(tenant=self.tenant, user=user, role='admin')
+        self.patient = Patient.objects.create(tenant=self.tenant, first_name='Ada', last_name='Lovelace')
+        self.at = (timezone.now() + timedelta(days=1)).replace(microsecond=0)
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}',
+            HTTP_X_TENANT_SLUG='clinic',
+        )
+
+    def book(self, at, **extra):
+        return self.client.post('/api/appointments/', {
+            'patient': str(self.patient.pk), 'staff': str(self.staff.pk), 'date': at.isoformat(),
+            'duration_minutes': 30, **extra,
+        }, format='json')
+
+    def test_overlapping_booking_is_refused(self):
+        self.assertEqual(self.book(self.at).status_code, 201)
+        self.assertEqual(self.book(self.at + timedelta(minutes=15)).status_code, 409)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_moving_into_a_taken_slot_is_refused(self):
+        self.book(self.at)
+        other = self.book(self.at + timedelta(hours=2)).json()['id']
+        response = self.client.patch(f'/api/appointments/{other}/', {'date': self.at.isoformat()}, format='json')
+        self.assertEqual(response.status_code, 409)
+
+    def test_check_runs_under_staff_row_lock(self):
+        locked = []
+        select_for_update = QuerySet.select_for_update
+
+        def spy(qs, *args, **kwargs):
+            locked.append(qs.model)
+            return select_for_update(qs, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'select_for_update', spy):
+            self.assertEqual(self.book(self.at).status_code, 201)
+        self.assertIn(Staff, locked)
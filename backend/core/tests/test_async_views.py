@@ -0,0 +1,83 @@
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import async_views, views
+from core.models import Billing, BillingPayment, Patient, Staff
+from tenants.models import Tenant
+
+
+class AsyncViewParityTests(TestCase):
+    """The async read views answer exactly like the DRF views they replace."""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        self.patient = Patient.objects.create(tenant=self.tenant, first_name='Ada', last_name='Lovelace')
+        billing = Billing.objects.create(tenant=self.tenant, patient=self.patient, amount=Decimal('100'))
+        BillingPayment.objects.create(billing=billing, amount=Decimal('40'))
+        self.admin = self.bearer('admin', 'admin')
+        self.factory = RequestFactory()
+
+    def bearer(self, username, role):
+        user = get_user_model().objects.create_user(username=username, password='x')
+        Staff.objects.create(tenant=self.tenant, user=user, role=role)
+        return f'Bearer {RefreshToken.for_user(user).access_token}'
+
+    def assertSameResponses(self, async_view, sync_view, path, auth=None, data=None, **kwargs):
+        answers = []
+        for view in (sync_view, async_to_sync(async_view)):
+            headers = {'HTTP_AUTHORIZATION': auth} if auth else {}
+            headers.update({k: v for k, v in kwargs.items() if k.startswith('HTTP_')})
+            request = self.factory.get(path, data or {}, **headers)
+            request.tenant = self.tenant
+            response = view(request, **{k: v for k, v in kwargs.items() if not k.startswith('HTTP_')})
+            if hasattr(response, 'render'):
+                response.render()
+            answers.append((response.status_code, response.content, response.get('ETag'), response.get('WWW-Authenticate')))
+        self.assertEqual(answers[1], answers[0])
+        return answers[0]
+
+    def test_billing_totals(self):
+        # as routed: with the action's own permission_classes (AllowAny)
+        sync_view = views.BillingViewSet.as_view({'get': 'totals'}, **views.BillingViewSet.totals.kwargs)
+        status, body, _, _ = self.assertSameResponses(async_views.billing_totals, sync_view, '/api/billing/totals/', auth=self.admin)
+        self.assertEqual(status, 200)
+        self.assertIn(b'"paid":40.0', body)
+        status, _, _, _ = self.assertSameResponses(
+            async_views.billing_totals, sync_view, '/api/billing/totals/', auth=self.admin, data={'date_from': 'nope'})
+        self.assertEqual(status, 400)
+        status, _, _, _ = self.assertSameResponses(async_views.billing_totals, sync_view, '/api/billing/totals/')
+        self.assertEqual(status, 200)
+
+    def test_patient_detail(self):
+        sync_view = views.PatientViewSet.as_view({'get': 'retrieve'})
+        path = f'/api/patients/{self.patient.pk}/'
+        status, _, etag, _ = self.assertSameResponses(async_views.patient_detail, sync_view, path, auth=self.admin, pk=self.patient.pk)
+        self.assertEqual(status, 200)
+        status, _, _, _ = self.assertSameResponses(
+            async_views.patient_detail, sync_view, path, auth=self.admin, pk=self.patient.pk, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status, 304)
+
+        missing = '00000000-0000-0000-0000-000000000000'
+        status, _, _, _ = self.assertSameResponses(
+            async_views.patient_detail, sync_view, f'/api/patients/{missing}/', auth=self.admin, pk=missing)
+        self.assertEqual(status, 404)
+
+    def test_patient_detail_denied(self):
+        sync_view = views.PatientViewSet.as_view({'get': 'retrieve'})
+        path = f'/api/patients/{self.patient.pk}/'
+        status, _, _, _ = self.assertSameResponses(async_views.patient_detail, sync_view, path, pk=self.patient.pk)
+        self.assertEqual(status, 401)
+        status, _, _, _ = self.assertSameResponses(
+            async_views.patient_detail, sync_view, path, auth=self.bearer('cook', 'kitchen'), pk=self.patient.pk)
+        self.assertEqual(status, 403)
+
+    def test_current_user(self):
+        status, body, _, _ = self.assertSameResponses(async_views.current_user, views.current_user, '/api/me/', auth=self.admin)
+        self.assertEqual(status, 200)
+        self.assertIn(b'"slug": "clinic"', body)
+        status, _, _, _ = self.assertSameResponses(async_views.current_user, views.current_user, '/api/me/')
+        self.assertEqual(status, 401)
@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from core.auth import add_staff_claims
+from core.models import Staff
+from core.permissions import request_role
+from middleware.tenant_middleware import TenantMiddleware
+from tenants.cache import tenant_cache
+from tenants.models import Tenant
+
+
+class StaffClaimsTests(TestCase):
+    def setUp(self):
+        tenant_cache.invalidate()
+        self.addCleanup(tenant_cache.invalidate)
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        self.user = get_user_model().objects.create_user(username='doc', password='secret')
+        self.staff = Staff.objects.create(tenant=self.tenant, user=self.user, role='doctor')
+
+    def obtain(self):
+        response = APIClient().post('/api/token/', {'username': 'doc', 'password': 'secret'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def assertClaims(self, raw, role='doctor'):
+        token = AccessToken(raw)
+        self.assertEqual(
+            (token['tenant_id'], token['tenant_slug'], token['staff_id'], token['role']),
+            (str(self.tenant.pk), 'clinic', str(self.staff.pk), role),
+        )
+
+    def test_token_carries_staff_claims(self):
+        self.assertClaims(self.obtain()['access'])
+
+    def test_refresh_keeps_and_updates_claims(self):
+        refresh = self.obtain()['refresh']
+        response = APIClient().post('/api/token/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertClaims(response.data['access'])
+
+        Staff.objects.filter(pk=self.staff.pk).update(role='admin')
+        response = APIClient().post('/api/token/refresh/', {'refresh': refresh}, format='json')
+        self.assertClaims(response.data['access'], role='admin')
+
+    def test_user_without_staff_gets_empty_claims(self):
+        loner = get_user_model().objects.create_user(username='loner', password='x')
+        token = add_staff_claims(RefreshToken.for_user(loner).access_token, loner)
+        self.assertEqual([token['tenant_id'], token['staff_id'], token['role']], [None, None, None])
+
+
+class TenantFromClaimsTests(TestCase):
+    def setUp(self):
+        tenant_cache.invalidate()
+        self.addCleanup(tenant_cache.invalidate)
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        self.other = Tenant.objects.create(name='Other', slug='other')
+        user = get_user_model().objects.create_user(username='doc', password='x')
+        Staff.objects.create(tenant=self.tenant, user=user, role='doctor')
+        self.token = add_staff_claims(RefreshToken.for_user(user).access_token, user)
+        self.factory = RequestFactory()
+
+    def resolve(self, **headers):
+        request = self.factory.get('/api/patients/', HTTP_AUTHORIZATION=f'Bearer {self.token}', **headers)
+        TenantMiddleware(lambda r: None)._resolve_tenant(request)
+        return request.tenant
+
+    def test_claims_resolve_the_tenant_without_queries(self):
+        self.assertEqual(self.resolve(), self.tenant)  # warms the slug cache
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolve(), self.tenant)
+
+    def test_header_slug_overrides_claims(self):
+        self.assertEqual(self.resolve(HTTP_X_TENANT_SLUG='other'), self.other)
+
+    def test_renamed_slug_falls_back_to_tenant_id(self):
+        Tenant.objects.filter(pk=self.tenant.pk).update(slug='renamed')
+        self.assertEqual(TenantMiddleware._tenant_from_claims(self.token.payload).slug, 'renamed')
+
+    def test_request_role_reads_the_claim(self):
+        user = get_user_model().objects.get(username='doc')
+        with self.assertNumQueries(0):
+            self.assertEqual(request_role(SimpleNamespace(auth=self.token, user=user)), 'doctor')
+
+    def test_request_role_without_claim_reads_the_profile(self):
+        user = get_user_model().objects.get(username='doc')
+        legacy = RefreshToken.for_user(user).access_token
+        with self.assertNumQueries(1):
+            self.assertEqual(request_role(SimpleNamespace(auth=legacy, user=user)), 'doctor')
@@ -0,0 +1,259 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from rest_framework import serializers
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import Acte, ActeConsumable, Billing, BillingDailyTotal, BillingPayment, InventoryItem, Patient, Staff, StockMovement
+from core.serializers import BillingSerializer
+from tenants.models import Tenant
+
+
+class BillingUpdateTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        user = get_user_model().objects.create_user(username='admin', password='x')
+        Staff.objects.create(tenant=self.tenant, user=user, role='admin')
+        patient = Patient.objects.create(tenant=self.tenant, first_name='Ada', last_name='Lovelace')
+        self.billing = Billing.objects.create(tenant=self.tenant, patient=patient, amount=Decimal('100'))
+        self.url = f'/api/billing/{self.billing.pk}/'
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}',
+            HTTP_X_TENANT_SLUG='clinic',
+        )
+
+    def test_failed_line_sync_rolls_back_header(self):
+        with mock.patch.object(BillingSerializer, 'reconcile_items', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.patch(self.url, {'description': 'edited', 'items': []}, format='json')
+        self.billing.refresh_from_db()
+        self.assertEqual(self.billing.description, '')
+
+    def test_unknown_acte_leaves_billing_unchanged(self):
+        response = self.client.patch(self.url, {'description': 'edited', 'items': [{'acte': 'nope'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.billing.refresh_from_db()
+        self.assertEqual(self.billing.description, '')
+
+
+class BillingCreateTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        user = get_user_model().objects.create_user(username='admin', password='x')
+        Staff.objects.create(tenant=self.tenant, user=user, role='admin')
+        self.patient = Patient.objects.create(tenant=self.tenant, first_name='Ada', last_name='Lovelace')
+        self.actes = [
+            Acte.objects.create(tenant=self.tenant, code=f'A{i}', name=f'Acte {i}', amount=Decimal('10'))
+            for i in range(5)
+        ]
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}',
+            HTTP_X_TENANT_SLUG='clinic',
+        )
+
+    def create(self, actes):
+        items = [{'acte': acte.code, 'quantity': 1} for acte in actes]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/billing/', {'patient': str(self.patient.pk), 'amount': '0', 'items': items}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(len(response.data['items']), len(actes))
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_items(self):
+        self.create(self.actes[:1])  # loads the acte catalog
+        self.assertEqual(self.create(self.actes[:1]), self.create(self.actes))
+
+    def test_actes_need_a_tenant(self):
+        with self.assertRaises(serializers.ValidationError):
+            BillingSerializer.resolve_actes([{'acte': 'A0'}], tenant=None)
+
+
+class PaymentTotalsTests(TestCase):
+    def setUp(self):
+        tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        patient = Patient.objects.create(tenant=tenant, first_name='Ada', last_name='Lovelace')
+        self.billing = Billing.objects.create(tenant=tenant, patient=patient, amount=Decimal('100'))
+
+    def assertTotals(self, paid):
+        self.billing.refresh_from_db()
+        self.assertEqual((self.billing.paid_total, self.billing.remaining_due), (Decimal(paid), 100 - Decimal(paid)))
+        self.assertEqual(BillingDailyTotal.objects.get().paid, Decimal(paid))
+
+    def test_save_and_delete(self):
+        payment = BillingPayment.objects.create(billing=self.billing, amount=Decimal('30'))
+        payment.amount = Decimal('40')
+        payment.save()
+        self.assertTotals('40')
+        payment.delete()
+        self.assertTotals('0')
+
+    def test_queryset_delete(self):
+        BillingPayment.objects.create(billing=self.billing, amount=Decimal('30'))
+        BillingPayment.objects.create(billing=self.billing, amount=Decimal('20'))
+        BillingPayment.objects.filter(amount=Decimal('30')).delete()
+        self.assertTotals('20')
+
+    def test_bulk_create_and_update(self):
+        BillingPayment.objects.bulk_create([
+            BillingPayment(billing=self.billing, amount=Decimal('10')),
+            BillingPayment(billing=self.billing, amount=Decimal('15')),
+        ])
+        self.assertTotals('25')
+        BillingPayment.objects.filter(billing=self.billing).update(amount=Decimal('5'))
+        self.assertTotals('10')
+
+    def test_billing_delete_leaves_no_paid_rollup(self):
+        BillingPayment.objects.create(billing=self.billing, amount=Decimal('30'))
+        self.billing.delete()
+        row = BillingDailyTotal.objects.get()
+        self.assertEqual((row.billed, row.paid), (Decimal('0'), Decimal('0')))
+
+
+class BillingSaveTests(TestCase):
+    def setUp(self):
+        tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        patient = Patient.objects.create(tenant=tenant, first_name='Ada', last_name='Lovelace')
+        self.billing = Billing.objects.create(tenant=tenant, patient=patient, amount=Decimal('100'))
+        BillingPayment.objects.create(billing=self.billing, amount=Decimal('30'))
+
+    def test_plain_save_does_not_touch_totals(self):
+        self.billing.description = 'edited'
+        with CaptureQueriesContext(connection) as ctx:
+            self.billing.save()
+        # the locking read and the UPDATE of the row, inside one savepoint
+        self.assertEqual(len([q for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]), 2)
+
+    def test_currency_change_moves_rollup_with_stored_paid_total(self):
+        stale = Billing.objects.get(pk=self.billing.pk)
+        BillingPayment.objects.create(billing=self.billing, amount=Decimal('20'))
+        stale.currency = 'USD'
+        stale.save()
+        rows = {r.currency: (r.billed, r.paid) for r in BillingDailyTotal.objects.all()}
+        self.assertEqual(rows, {'CDF': (Decimal('0'), Decimal('0')), 'USD': (Decimal('100'), Decimal('50'))})
+
+
+class BillingRollupTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        user = get_user_model().objects.create_user(username='admin', password='x')
+        Staff.objects.create(tenant=self.tenant, user=user, role='admin')
+        self.patient = Patient.objects.create(tenant=self.tenant, first_name='Ada', last_name='Lovelace')
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}',
+            HTTP_X_TENANT_SLUG='clinic',
+        )
+
+    def bill(self, amount, currency='CDF', days_ago=0):
+        billing = Billing.objects.create(tenant=self.tenant, patient=self.patient, amount=Decimal(amount), currency=currency)
+        if days_ago:
+            billing.issued_at -= timedelta(days=days_ago)
+            billing.save()
+        return billing
+
+    def assertRollupMatches(self):
+        expected = {
+            (row['day'], row['currency']): (row['billed'], row['paid'])
+            for row in Billing.objects.annotate(day=TruncDate('issued_at')).order_by()
+            .values('day', 'currency').annotate(billed=Sum('amount'), paid=Sum('paid_total'))
+        }
+        rollup = {
+            (row.day, row.currency): (row.billed, row.paid)
+            for row in BillingDailyTotal.objects.all() if row.billed or row.paid
+        }
+        self.assertEqual(rollup, expected)
+        BillingDailyTotal.rebuild()
+        rebuilt = {(row.day, row.currency): (row.billed, row.paid) for row in BillingDailyTotal.objects.all()}
+        self.assertEqual(rebuilt, expected)
+
+    def test_rollup_follows_creates_payments_and_deletes(self):
+        first = self.bill('100')
+        second = self.bill('40', currency='USD', days_ago=2)
+        self.assertRollupMatches()
+        payment = BillingPayment.objects.create(billing=first, amount=Decimal('30'))
+        BillingPayment.objects.create(billing=second, amount=Decimal('15'))
+        self.assertRollupMatches()
+        payment.delete()
+        self.assertRollupMatches()
+        second.delete()
+        self.assertRollupMatches()
+
+    def test_payments_count_toward_the_issue_day(self):
+        billing = self.bill('100', days_ago=3)
+        BillingPayment.objects.create(billing=billing, amount=Decimal('60'))
+        issued = timezone.localtime(billing.issued_at).date()
+        row = BillingDailyTotal.objects.get(tenant=self.tenant, currency='CDF', day=issued)
+        self.assertEqual((row.billed, row.paid), (Decimal('100'), Decimal('60')))
+        self.assertFalse(BillingDailyTotal.objects.filter(day=timezone.localdate()).exclude(billed=0, paid=0).exists())
+
+    def test_totals_endpoint_reads_the_rollup(self):
+        billing = self.bill('100', days_ago=3)
+        self.bill('50')
+        BillingPayment.objects.create(billing=billing, amount=Decimal('60'))
+        totals = {row['currency']: row for row in self.client.get('/api/billing/totals/').data}
+        self.assertEqual((totals['CDF']['total'], totals['CDF']['paid'], totals['CDF']['unpaid']), (150.0, 60.0, 90.0))
+
+        today = timezone.localdate().isoformat()
+        response = self.client.get('/api/billing/totals/', {'date_from': today, 'date_to': today})
+        totals = {row['currency']: row for row in response.data}
+        self.assertEqual((totals['CDF']['total'], totals['CDF']['paid']), (50.0, 0.0))
+
+
+class BillOfMaterialsTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        user = get_user_model().objects.create_user(username='admin', password='x')
+        Staff.objects.create(tenant=self.tenant, user=user, role='admin')
+        self.patient = Patient.objects.create(tenant=self.tenant, first_name='Ada', last_name='Lovelace')
+        self.items = [
+            InventoryItem.objects.create(tenant=self.tenant, sku=f'I{i}', name=f'Item {i}', quantity=100)
+            for i in range(3)
+        ]
+        self.actes = []
+        for i in range(4):
+            acte = Acte.objects.create(tenant=self.tenant, code=f'A{i}', name=f'Acte {i}', amount=Decimal('10'))
+            for item in self.items[:i % 3 + 1]:
+                ActeConsumable.objects.create(acte=acte, item=item, quantity=2)
+            self.actes.append(acte)
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}',
+            HTTP_X_TENANT_SLUG='clinic',
+        )
+
+    def post(self, lines):
+        items = [{'acte': acte.code, 'quantity': quantity} for acte, quantity in lines]
+        return self.client.post('/api/billing/', {'patient': str(self.patient.pk), 'amount': '0', 'items': items}, format='json')
+
+    def stock(self):
+        return [item.quantity for item in InventoryItem.objects.filter(tenant=self.tenant).order_by('sku')]
+
+    def count_queries(self, lines):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.post(lines).status_code, 201)
+        return len(queries)
+
+    def test_consumables_are_issued_in_a_fixed_number_of_queries(self):
+        self.count_queries([(self.actes[0], 1)])  # loads the acte catalog
+        one = self.count_queries([(self.actes[0], 1)])
+        self.assertEqual(self.count_queries([(acte, 2) for acte in self.actes]), one)
+        # 2 units per acte and item: I0 is used by every acte, I1 by A1 and A2, I2 by A2
+        self.assertEqual(self.stock(), [100 - 2 * 2 - 4 * 4, 100 - 2 * 4, 100 - 4])
+
+    def test_shortage_is_409_and_rolls_back_the_invoice(self):
+        response = self.post([(self.actes[2], 60)])
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Billing.objects.exists())
+        self.assertEqual(self.stock(), [100, 100, 100])
+        self.assertFalse(StockMovement.objects.filter(kind='issue').exists())
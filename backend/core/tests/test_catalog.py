@@ -0,0 +1,83 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import catalog
+from core.models import Acte, ActeCatalogVersion, Staff
+from tenants.models import Tenant
+
+
+class ActeCatalogTests(TestCase):
+    def setUp(self):
+        catalog.invalidate()
+        self.addCleanup(catalog.invalidate)
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        self.acte = Acte.objects.create(tenant=self.tenant, code='CONS', name='Consultation', amount=Decimal('10'))
+
+    def test_fresh_catalog_costs_one_version_check(self):
+        first = catalog.get_catalog(self.tenant)
+        hits = catalog.stats['hits']
+        with self.assertNumQueries(1):
+            self.assertIs(catalog.get_catalog(self.tenant.pk), first)
+        self.assertEqual(catalog.stats['hits'], hits + 1)
+        self.assertEqual(first.lookup('cons'), self.acte)
+        self.assertEqual(first.lookup(str(self.acte.pk)), self.acte)
+        self.assertEqual(first.lookup('consultation'), self.acte)
+
+    def test_acte_save_invalidates(self):
+        before = catalog.get_catalog(self.tenant)
+        self.acte.name = 'Follow-up'
+        self.acte.save()
+        after = catalog.get_catalog(self.tenant)
+        self.assertIsNot(after, before)
+        self.assertEqual(after.version, ActeCatalogVersion.current(self.tenant.pk))
+        self.assertEqual(after.lookup('follow-up'), self.acte)
+
+    def test_version_bump_from_another_worker_reloads(self):
+        before = catalog.get_catalog(self.tenant)
+        # what another process's write leaves behind: a new version, this cache untouched
+        ActeCatalogVersion.bump(self.tenant.pk)
+        misses = catalog.stats['misses']
+        self.assertIsNot(catalog.get_catalog(self.tenant), before)
+        self.assertEqual(catalog.stats['misses'], misses + 1)
+
+    @override_settings(ACTE_CATALOG_CACHE_SIZE=2)
+    def test_least_recently_used_tenant_is_evicted(self):
+        second = Tenant.objects.create(name='Second', slug='second')
+        third = Tenant.objects.create(name='Third', slug='third')
+        catalog.get_catalog(self.tenant)
+        catalog.get_catalog(second)
+        catalog.get_catalog(self.tenant)
+        catalog.get_catalog(third)
+        self.assertEqual(list(catalog._catalogs), [self.tenant.pk, third.pk])
+
+
+class ActeListTests(TestCase):
+    def setUp(self):
+        catalog.invalidate()
+        self.addCleanup(catalog.invalidate)
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        user = get_user_model().objects.create_user(username='admin', password='x')
+        Staff.objects.create(tenant=self.tenant, user=user, role='admin')
+        Acte.objects.create(tenant=self.tenant, code='CONS', name='Consultation', amount=Decimal('10'))
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}',
+            HTTP_X_TENANT_SLUG='clinic',
+        )
+
+    def test_not_modified_until_an_acte_changes(self):
+        response = self.client.get('/api/actes/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get('/api/actes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+
+        Acte.objects.create(tenant=self.tenant, code='XRAY', name='X-ray', amount=Decimal('20'))
+        response = self.client.get('/api/actes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()), 2)
@@ -0,0 +1,43 @@
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import Patient, Staff
+from tenants.models import Tenant
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        user = get_user_model().objects.create_user(username='admin', password='x')
+        Staff.objects.create(tenant=self.tenant, user=user, role='admin')
+        self.patient = Patient.objects.create(tenant=self.tenant, first_name='Ada', last_name='Lovelace')
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}',
+            HTTP_X_TENANT_SLUG='clinic',
+        )
+
+    def test_detail_not_modified(self):
+        url = f'/api/patients/{self.patient.pk}/'
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_list_etag_changes_with_data(self):
+        etag = self.client.get('/api/patients/')['ETag']
+        Patient.objects.create(tenant=self.tenant, first_name='Alan', last_name='Turing')
+        response = self.client.get('/api/patients/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_malformed_id_is_404(self):
+        self.assertEqual(self.client.get('/api/patients/not-a-uuid/').status_code, 404)
+        self.assertEqual(self.client.get('/api/billing/not-a-uuid/').status_code, 404)
+
+    def test_unknown_id_is_404(self):
+        self.assertEqual(self.client.get(f'/api/patients/{uuid.uuid4()}/').status_code, 404)
@@ -0,0 +1,100 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import InventoryItem, Staff, StockMovement
+from tenants.models import Tenant
+
+
+class InventoryQuantityEditTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        user = get_user_model().objects.create_user(username='admin', password='x')
+        self.staff = Staff.objects.create(tenant=self.tenant, user=user, role='admin')
+        self.item = InventoryItem.objects.create(tenant=self.tenant, sku='G-1', name='Gloves', quantity=10)
+        self.url = f'/api/inventory/{self.item.pk}/'
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}',
+            HTTP_X_TENANT_SLUG='clinic',
+        )
+
+    def test_quantity_edit_posts_adjustment(self):
+        response = self.client.patch(self.url, {'quantity': 7, 'location': 'Shelf B'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['quantity'], 7)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.quantity, self.item.location), (7, 'Shelf B'))
+        movement = StockMovement.objects.filter(item=self.item).order_by('-created_at').first()
+        self.assertEqual((movement.kind, movement.delta, movement.staff), ('adjustment', -3, self.staff))
+
+    def test_unchanged_quantity_posts_nothing(self):
+        self.client.patch(self.url, {'quantity': 10, 'name': 'Nitrile gloves'}, format='json')
+        self.assertEqual(StockMovement.objects.filter(item=self.item).count(), 1)  # opening balance
+
+    def test_negative_quantity_is_refused(self):
+        response = self.client.patch(self.url, {'quantity': -1}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 10)
+
+    def test_negative_opening_quantity_is_refused(self):
+        response = self.client.post('/api/inventory/', {
+            'tenant': str(self.tenant.pk), 'sku': 'G-2', 'name': 'Masks', 'quantity': -5,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('quantity', response.json())
+        self.assertFalse(InventoryItem.objects.filter(sku='G-2').exists())
+
+    def test_update_save_does_not_reload_quantity(self):
+        self.item.name = 'Latex gloves'
+        with self.assertNumQueries(1):
+            self.item.save()
+
+
+class LowStockTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        user = get_user_model().objects.create_user(username='admin', password='x')
+        Staff.objects.create(tenant=self.tenant, user=user, role='admin')
+        self.item = InventoryItem.objects.create(tenant=self.tenant, sku='G-1', name='Gloves', quantity=10, reorder_level=5)
+        self.key = InventoryItem.low_stock_cache_key(self.tenant.pk)
+        cache.delete(self.key)
+        self.addCleanup(cache.delete, self.key)
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}',
+            HTTP_X_TENANT_SLUG='clinic',
+        )
+
+    def low_stock(self):
+        return [row['sku'] for row in self.client.get('/api/inventory/low_stock/').json()['items']]
+
+    def issue(self, quantity):
+        StockMovement.post([StockMovement(tenant=self.tenant, item=self.item, kind='issue', delta=-quantity)])
+
+    def test_cache_is_dropped_once_the_movement_commits(self):
+        self.assertEqual(self.low_stock(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.issue(6)
+            # not committed yet: readers keep the cached list
+            self.assertIsNotNone(cache.get(self.key))
+        self.assertIsNone(cache.get(self.key))
+        self.assertEqual(self.low_stock(), ['G-1'])
+
+    def test_uncommitted_movement_keeps_the_cache(self):
+        self.assertEqual(self.low_stock(), [])
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.issue(6)
+        self.assertTrue(callbacks)
+        self.assertIsNotNone(cache.get(self.key))
+
+    def test_low_stock_query_uses_the_partial_index(self):
+        queryset = InventoryItem.objects.filter(tenant=self.tenant, quantity__lte=F('reorder_level')).order_by('name')
+        if not connection.features.supports_partial_indexes:
+            self.skipTest('no partial indexes on this backend')
+        self.assertIn('core_inventory_low_stock_idx', queryset.explain())
@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from hms import db_pool
+
+
+@override_settings(METRICS_ALLOWED_IPS=['127.0.0.1', '10.0.0.0/8'], METRICS_TRUSTED_PROXIES=[])
+class MetricsAccessTests(TestCase):
+    def test_allowed_address(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='10.1.2.3')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'hms_requests_total', response.content)
+
+    def test_other_address_is_forbidden(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.9').status_code, 403)
+
+    def test_forwarded_for_is_ignored_without_trusted_proxies(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.9', HTTP_X_FORWARDED_FOR='127.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_TRUSTED_PROXIES=['192.0.2.0/24'])
+    def test_right_most_untrusted_hop_behind_proxy(self):
+        # the proxy appends the address it saw; anything left of it is client-supplied
+        allowed = self.client.get('/metrics', REMOTE_ADDR='192.0.2.1', HTTP_X_FORWARDED_FOR='203.0.113.9, 10.1.2.3')
+        self.assertEqual(allowed.status_code, 200)
+        spoofed = self.client.get('/metrics', REMOTE_ADDR='192.0.2.1', HTTP_X_FORWARDED_FOR='127.0.0.1, 203.0.113.9')
+        self.assertEqual(spoofed.status_code, 403)
+
+
+class PoolStatsTests(SimpleTestCase):
+    def test_only_initialized_connections_are_read(self):
+        pool = mock.Mock()
+        pool.get_stats.return_value = {'pool_size': 4, 'pool_available': 1, 'requests_num': 2, 'requests_wait_ms': 5}
+        handler = mock.Mock()
+        handler.all.return_value = [SimpleNamespace(alias='default', pool=pool), SimpleNamespace(alias='shard1')]
+        with mock.patch.object(db_pool, 'connections', handler):
+            stats = db_pool.pool_stats()
+        handler.all.assert_called_once_with(initialized_only=True)
+        self.assertEqual(list(stats), ['default'])
+        self.assertEqual((stats['default']['in_use'], stats['default']['checkout_wait_ms_avg']), (3, 2.5))
@@ -0,0 +1,79 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import Appointment, Patient, Staff
+from core.pagination import KeysetPagination
+from tenants.models import Tenant
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        self.factory = APIRequestFactory()
+
+    def walk(self, queryset, ordering, page_size=2):
+        """Every page of `queryset`, following the next cursors."""
+        view = SimpleNamespace(keyset_ordering=ordering)
+        rows, cursor = [], None
+        for _ in range(100):
+            params = {'page_size': page_size}
+            if cursor:
+                params['cursor'] = cursor
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(queryset, Request(self.factory.get('/', params)), view=view)
+            self.assertLessEqual(len(page), page_size)
+            rows.extend(page)
+            if paginator.next_position is None:
+                return rows
+            cursor = paginator.encode_cursor(paginator.next_position)
+        self.fail('pagination does not end')
+
+    def test_ties_are_broken_by_id(self):
+        for first in 'abcdefg':
+            Patient.objects.create(tenant=self.tenant, first_name=first, last_name='Same')
+        Patient.objects.create(tenant=self.tenant, first_name='z', last_name='Other')
+        rows = self.walk(Patient.objects.all(), ('last_name', 'id'))
+        self.assertEqual([p.pk for p in rows], list(Patient.objects.order_by('last_name', 'id').values_list('pk', flat=True)))
+
+    def test_descending_nullable_field(self):
+        patient = Patient.objects.create(tenant=self.tenant, first_name='Ada', last_name='Lovelace')
+        now = timezone.now()
+        for days in (0, 1, 1, 2, None, None, 3):
+            Appointment.objects.create(
+                tenant=self.tenant, patient=patient, date=None if days is None else now - timedelta(days=days))
+        rows = self.walk(Appointment.objects.all(), ('-date', 'id'))
+        dated = sorted((a for a in rows if a.date), key=lambda a: a.date, reverse=True)
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(len({a.pk for a in rows}), 7)
+        # newest first, nulls last
+        self.assertEqual([a.date for a in rows[:5]], [a.date for a in dated])
+        self.assertEqual([a.date for a in rows[5:]], [None, None])
+
+    def test_foreign_key_ordering(self):
+        patient = Patient.objects.create(tenant=self.tenant, first_name='Ada', last_name='Lovelace')
+        staff = [Staff.objects.create(tenant=self.tenant, role='doctor') for _ in range(3)]
+        for member in staff + staff + [None]:
+            Appointment.objects.create(tenant=self.tenant, patient=patient, staff=member, date=timezone.now())
+        rows = self.walk(Appointment.objects.all(), ('staff', 'id'))
+        self.assertEqual(len({a.pk for a in rows}), 7)
+        self.assertEqual([a.staff_id for a in rows], sorted((s.pk for s in staff + staff), key=str) + [None])
+
+    def test_tampered_cursor_is_404(self):
+        request = Request(self.factory.get('/', {'cursor': 'not-a-cursor'}))
+        with self.assertRaises(NotFound):
+            KeysetPagination().paginate_queryset(Patient.objects.all(), request, view=SimpleNamespace(keyset_ordering=('last_name', 'id')))
+
+    def test_tampered_cursor_over_http(self):
+        user = get_user_model().objects.create_user(username='admin', password='x')
+        Staff.objects.create(tenant=self.tenant, user=user, role='admin')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}', HTTP_X_TENANT_SLUG='clinic')
+        self.assertEqual(client.get('/api/patients/', {'cursor': 'x' * 40}).status_code, 404)
@@ -0,0 +1,60 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import Patient, Staff
+from hms import perf
+from tenants.models import Tenant
+
+
+class _Slow(serializers.Serializer):
+    value = serializers.SerializerMethodField()
+
+    def get_value(self, obj):
+        perf.current().query_seconds += 1.0  # as if a lazy relation ran a 1s query
+        return obj
+
+
+class TimedSerializerTests(TestCase):
+    def test_data_time_excludes_queries(self):
+        stats = perf.RequestStats()
+        token = perf.activate(stats)
+        try:
+            serializer = perf.timed_serializer(_Slow([1, 2], many=True))
+            self.assertEqual(serializer.data, [{'value': 1}, {'value': 2}])
+            serializer.data  # cached: not timed again
+        finally:
+            perf.deactivate(token)
+        self.assertLess(stats.timings['serialize'], 0.5)
+        self.assertIsInstance(serializer, serializers.ListSerializer)
+
+    def test_untouched_outside_sampled_requests(self):
+        serializer = _Slow(1)
+        self.assertIs(type(perf.timed_serializer(serializer)), _Slow)
+
+
+@override_settings(PERF_SAMPLE_RATE=1)
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        user = get_user_model().objects.create_user(username='admin', password='x')
+        Staff.objects.create(tenant=tenant, user=user, role='admin')
+        Patient.objects.create(tenant=tenant, first_name='Ada', last_name='Lovelace')
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}',
+            HTTP_X_TENANT_SLUG='clinic',
+        )
+
+    def test_serializer_and_renderer_are_timed_apart(self):
+        with self.assertLogs('hms.perf', 'INFO') as logs:
+            response = self.client.get('/api/patients/')
+        record = logs.records[0].perf
+        self.assertGreater(record['serialize_ms'], 0)
+        self.assertIn('render_ms', record)
+        names = re.findall(r'(\w+);dur=', response['Server-Timing'])
+        self.assertEqual(names, ['db', 'serialize', 'render', 'app', 'total'])
@@ -0,0 +1,55 @@
+import threading
+from unittest import mock
+
+from django.db import DatabaseError, connections
+from django.test import TransactionTestCase
+
+from core.models import Patient, RecordNumberSequence
+from tenants.models import Tenant
+
+
+class ConcurrentRecordNumberTests(TransactionTestCase):
+    """Medical record numbers allocated from concurrent requests."""
+
+    WORKERS = 8
+    PER_WORKER = 5
+
+    def test_concurrent_registrations_get_distinct_consecutive_numbers(self):
+        tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        # no sequence row yet: the workers also race to create it
+        start = threading.Barrier(self.WORKERS)
+        errors = []
+
+        def register(worker):
+            try:
+                start.wait()
+                for i in range(self.PER_WORKER):
+                    Patient.objects.create(tenant=tenant, first_name=f'w{worker}', last_name=str(i))
+            except Exception as exc:  # reported below, threads swallow exceptions
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=register, args=(w,)) for w in range(self.WORKERS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+
+        numbers = list(Patient.objects.filter(tenant=tenant).values_list('medical_record_number', flat=True))
+        total = self.WORKERS * self.PER_WORKER
+        self.assertEqual(len(numbers), total)
+        self.assertEqual(len(set(numbers)), total, 'duplicate record numbers')
+        prefixes = {n.rsplit('/', 1)[0] for n in numbers}
+        self.assertEqual(len(prefixes), 1, numbers)
+        self.assertEqual(sorted(int(n.rsplit('/', 1)[1]) for n in numbers), list(range(1, total + 1)))
+
+
+class RecordNumberErrorTests(TransactionTestCase):
+    def test_allocation_errors_propagate(self):
+        tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        with mock.patch.object(RecordNumberSequence, 'allocate', side_effect=DatabaseError('locked')):
+            with self.assertRaises(DatabaseError):
+                Patient.objects.create(tenant=tenant, first_name='Ada', last_name='Lovelace')
+        self.assertFalse(Patient.objects.exists())
@@ -0,0 +1,86 @@
+import time
+from unittest import mock
+
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase
+
+from core.models import Patient
+from hms import replicas
+from middleware.replica_middleware import ReplicaMiddleware
+from tenants.models import Tenant
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', 'default_replica'}
+
+    def setUp(self):
+        replicas.health._checked.clear()
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        Patient.objects.create(tenant=self.tenant, first_name='Ada', last_name='Lovelace')
+        self.token = replicas.activate()
+
+    def tearDown(self):
+        replicas.deactivate(self.token)
+
+    def test_reads_go_to_replica(self):
+        qs = Patient.objects.all()
+        self.assertEqual(qs.db, 'default_replica')
+        self.assertEqual(qs.count(), 1)  # the mirror sees the primary's rows
+
+    def test_writes_and_transactions_stay_on_primary(self):
+        self.assertEqual(replicas.ReplicaRouter().db_for_write(Patient), 'default')
+        with transaction.atomic():
+            self.assertEqual(Patient.objects.all().db, 'default')
+
+    def test_instances_from_replica_save_to_primary(self):
+        patient = Patient.objects.get()
+        self.assertEqual(patient._state.db, 'default_replica')
+        patient.notes = 'edited'
+        patient.save()
+        self.assertEqual(Patient.objects.using('default').get().notes, 'edited')
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        with mock.patch.object(replicas.health, '_probe', return_value=(False, 30.0)):
+            self.assertEqual(Patient.objects.all().db, 'default')
+        self.assertEqual(replicas.health.stats()['default_replica'], {'healthy': False, 'lag': 30.0})
+
+    def test_unreachable_replica_falls_back_to_primary(self):
+        with mock.patch.object(replicas.health, '_probe', return_value=(False, None)):
+            self.assertEqual(replicas.read_alias('default'), 'default')
+
+
+class ReplicaStickinessTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.seen = []
+
+        def view(request):
+            self.seen.append(replicas.replica_reads_enabled())
+            return HttpResponse()
+        self.middleware = ReplicaMiddleware(view)
+
+    def test_safe_request_may_use_replica(self):
+        self.middleware(self.factory.get('/'))
+        self.assertEqual(self.seen, [True])
+
+    def test_write_pins_client_to_primary(self):
+        response = self.middleware(self.factory.post('/'))
+        self.assertEqual(self.seen, [False])
+        until = response.cookies[ReplicaMiddleware.cookie_name].value
+        self.assertEqual(response[ReplicaMiddleware.header_name], until)
+        self.assertGreater(float(until), time.time())
+
+    def test_cookie_keeps_reads_on_primary(self):
+        request = self.factory.get('/')
+        request.COOKIES[ReplicaMiddleware.cookie_name] = f'{time.time() + 5:.3f}'
+        self.middleware(request)
+        self.assertEqual(self.seen, [False])
+
+    def test_header_keeps_reads_on_primary(self):
+        self.middleware(self.factory.get('/', HTTP_X_READ_PRIMARY_UNTIL=f'{time.time() + 5:.3f}'))
+        self.assertEqual(self.seen, [False])
+
+    def test_expired_pin_is_ignored(self):
+        self.middleware(self.factory.get('/', HTTP_X_READ_PRIMARY_UNTIL=f'{time.time() - 1:.3f}'))
+        self.assertEqual(self.seen, [True])
@@ -0,0 +1,91 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import response_cache
+from core.models import Appointment, Patient, Staff
+from tenants.models import Tenant
+
+PATIENT = Patient._meta.label
+APPOINTMENT = Appointment._meta.label
+
+
+class GenerationTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        self.other = Tenant.objects.create(name='Other', slug='other')
+
+    def snapshot(self):
+        return (
+            response_cache.generations(self.tenant.pk, [PATIENT, APPOINTMENT]),
+            response_cache.generations(self.other.pk, [PATIENT]),
+        )
+
+    def test_save_and_delete_bump_only_their_tenant_and_model(self):
+        (patient_gen, appointment_gen), (other_gen,) = self.snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            patient = Patient.objects.create(tenant=self.tenant, first_name='Ada', last_name='Lovelace')
+        (saved_gen, appointment_after), (other_after,) = self.snapshot()
+        self.assertNotEqual(saved_gen, patient_gen)
+        self.assertEqual((appointment_after, other_after), (appointment_gen, other_gen))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            patient.delete()
+        (deleted_gen, appointment_after), (other_after,) = self.snapshot()
+        self.assertNotEqual(deleted_gen, saved_gen)
+        self.assertEqual((appointment_after, other_after), (appointment_gen, other_gen))
+
+    def test_bump_waits_for_commit(self):
+        before = self.snapshot()
+        with self.captureOnCommitCallbacks(execute=False):
+            response_cache.bump([self.tenant.pk], PATIENT)
+        self.assertEqual(self.snapshot(), before)
+
+
+class KeyTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        self.factory = RequestFactory()
+
+    def key(self, query='', role='admin', etag='"e"'):
+        request = self.factory.get('/api/patients/', query)
+        return response_cache.key_for(request, self.tenant.pk, [PATIENT], role, etag)
+
+    def test_role_query_string_and_etag_are_part_of_the_key(self):
+        base = self.key()
+        self.assertEqual(self.key(), base)
+        self.assertNotEqual(self.key(role='doctor'), base)
+        self.assertNotEqual(self.key(query={'search': 'ada'}), base)
+        self.assertNotEqual(self.key(etag='"f"'), base)
+
+
+class CachedResponseTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        Patient.objects.create(tenant=self.tenant, first_name='Ada', last_name='Lovelace')
+
+    def client_for(self, username, role):
+        user = get_user_model().objects.create_user(username=username, password='x')
+        Staff.objects.create(tenant=self.tenant, user=user, role=role)
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}',
+            HTTP_X_TENANT_SLUG='clinic',
+        )
+        return client
+
+    def test_entries_are_shared_only_by_the_same_role_and_query(self):
+        admin = self.client_for('admin', 'admin')
+        other_admin = self.client_for('admin2', 'admin')
+        doctor = self.client_for('doc', 'doctor')
+        with mock.patch.object(response_cache, 'store', wraps=response_cache.store) as store:
+            self.assertEqual(admin.get('/api/patients/').status_code, 200)
+            self.assertEqual(other_admin.get('/api/patients/').status_code, 200)
+            self.assertEqual(store.call_count, 1)
+            doctor.get('/api/patients/')
+            self.assertEqual(store.call_count, 2)
+            admin.get('/api/patients/', {'search': 'ada'})
+            self.assertEqual(store.call_count, 3)
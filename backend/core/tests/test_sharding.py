@@ -0,0 +1,64 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Staff
+from tenants import sharding
+from tenants.models import Tenant, UserShard
+
+User = get_user_model()
+
+
+class UserShardDirectoryTests(TestCase):
+    databases = {'default', 'shard1'}
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic', db_alias='shard1')
+        self.user = User.objects.create_user(username='doc', password='x')
+        with sharding.using_tenant_db(self.tenant):
+            self.staff = Staff.objects.create(tenant=self.tenant, user=self.user, role='doctor')
+
+    def test_staff_records_its_shard(self):
+        self.assertEqual(UserShard.aliases_of(self.user.pk), ['shard1'])
+        self.assertTrue(User.objects.using('shard1').filter(pk=self.user.pk).exists())
+
+    def test_find_staff_only_queries_listed_shards(self):
+        with self.assertNumQueries(1, using='default'), self.assertNumQueries(1, using='shard1'):
+            self.assertEqual(sharding.find_staff(self.user), self.staff)
+        other = User.objects.create_user(username='nobody', password='x')
+        with self.assertNumQueries(1, using='default'), self.assertNumQueries(0, using='shard1'):
+            self.assertIsNone(sharding.find_staff(other))
+
+    def test_login_does_not_touch_shards(self):
+        self.user.last_login = timezone.now()
+        with self.assertNumQueries(0, using='shard1'):
+            self.user.save(update_fields=['last_login'])
+
+    def test_profile_changes_reach_shard_copy(self):
+        self.user.first_name = 'Grace'
+        self.user.save()
+        self.assertEqual(User.objects.using('shard1').get(pk=self.user.pk).first_name, 'Grace')
+
+    def test_unlinked_users_are_not_mirrored(self):
+        other = User.objects.create_user(username='nobody', password='x')
+        with self.assertNumQueries(0, using='shard1'):
+            other.first_name = 'Alan'
+            other.save()
+
+    def test_user_delete_reaches_shard(self):
+        self.user.delete()
+        self.assertFalse(User.objects.using('shard1').filter(pk=self.staff.user_id).exists())
+        self.assertIsNone(Staff.objects.using('shard1').get(pk=self.staff.pk).user_id)
+        self.assertFalse(UserShard.objects.exists())
+
+    def test_staff_delete_forgets_shard(self):
+        self.staff.delete()
+        self.assertEqual(UserShard.aliases_of(self.user.pk), [])
+
+    def test_move_tenant_updates_directory(self):
+        call_command('move_tenant', 'clinic', 'default', '--delete-source', stdout=StringIO())
+        self.assertEqual(UserShard.aliases_of(self.user.pk), ['default'])
+        self.assertEqual(sharding.find_staff(self.user)._state.db, 'default')
@@ -0,0 +1,133 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import sync
+from core.models import Acte, Appointment, Billing, Patient, Staff, Tombstone
+from tenants.models import Tenant
+
+
+@override_settings(SYNC_SAFETY_LAG=0)
+class SyncChangesTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        self.patient = Patient.objects.create(tenant=self.tenant, first_name='Ada', last_name='Lovelace')
+
+    def changes(self, model, position=None, now=None, limit=sync.DEFAULT_LIMIT):
+        return sync.changes(
+            model.objects.filter(tenant=self.tenant), sync.SYNC_MODELS[model], self.tenant.pk,
+            position=position, limit=limit, now=now or timezone.now(),
+        )
+
+    def test_cursor_round_trip(self):
+        position = (timezone.now(), str(self.patient.pk), timezone.now(), 7)
+        self.assertEqual(sync.decode_cursor(sync.encode_cursor(position)), position)
+        self.assertEqual(sync.decode_cursor(sync.encode_cursor((None, None, None, None))), (None, None, None, None))
+        with self.assertRaises(sync.InvalidCursor):
+            sync.decode_cursor(sync.encode_cursor(position)[:-2] + 'xx')
+
+    def test_next_call_returns_only_changes(self):
+        other = Patient.objects.create(tenant=self.tenant, first_name='Alan', last_name='Turing')
+        rows, deleted, position, has_more, reset = self.changes(Patient, limit=1)
+        self.assertEqual((len(rows), deleted, has_more, reset), (1, [], True, False))
+        rows, _, position, has_more, _ = self.changes(Patient, position, limit=1)
+        self.assertEqual((len(rows), has_more), (1, False))
+        rows, _, position, _, _ = self.changes(Patient, position)
+        self.assertEqual(rows, [])
+
+        other.first_name = 'Alan M.'
+        other.save()
+        rows, _, _, _, _ = self.changes(Patient, position)
+        self.assertEqual([r.pk for r in rows], [other.pk])
+
+    def test_deletions_come_from_tombstones(self):
+        _, _, position, _, _ = self.changes(Patient)
+        patient_id = self.patient.pk
+        self.patient.delete()
+        self.assertTrue(Tombstone.objects.filter(object_id=patient_id, resource='patients').exists())
+        rows, deleted, _, _, _ = self.changes(Patient, position)
+        self.assertEqual((rows, deleted), ([], [str(patient_id)]))
+
+    def test_recent_rows_wait_for_the_safety_lag(self):
+        now = timezone.now()
+        with override_settings(SYNC_SAFETY_LAG=60):
+            rows, _, position, _, _ = self.changes(Patient, now=now)
+            self.assertEqual(rows, [])
+            rows, _, _, _, _ = self.changes(Patient, position, now=now + timedelta(seconds=61))
+        self.assertEqual([r.pk for r in rows], [self.patient.pk])
+
+    def test_cursor_past_retention_resets(self):
+        old = timezone.now() - timedelta(days=31)
+        with override_settings(SYNC_TOMBSTONE_RETENTION_DAYS=30):
+            rows, deleted, position, _, reset = self.changes(Patient, (old, None, old, None))
+        self.assertTrue(reset)
+        self.assertEqual(([r.pk for r in rows], deleted), ([self.patient.pk], []))
+        self.assertIsNotNone(position[2])
+
+    def test_prune_tombstones_keeps_recent_ones(self):
+        Tombstone.objects.create(tenant_id=self.tenant.pk, resource='patients', object_id=self.patient.pk)
+        stale = Tombstone.objects.create(tenant_id=self.tenant.pk, resource='patients', object_id=self.patient.pk)
+        Tombstone.objects.filter(pk=stale.pk).update(deleted_at=timezone.now() - timedelta(days=40))
+        self.assertEqual(sync.prune_tombstones(), 1)
+        self.assertEqual(Tombstone.objects.count(), 1)
+
+    def test_set_null_cascades_move_updated_at(self):
+        staff = Staff.objects.create(tenant=self.tenant, role='doctor')
+        appointment = Appointment.objects.create(tenant=self.tenant, patient=self.patient, staff=staff, date=timezone.now())
+        billing = Billing.objects.create(tenant=self.tenant, patient=self.patient, appointment=appointment, amount=Decimal('10'))
+        _, _, appointments, _, _ = self.changes(Appointment)
+        _, _, billings, _, _ = self.changes(Billing)
+
+        staff.delete()
+        rows, _, appointments, _, _ = self.changes(Appointment, appointments)
+        self.assertEqual([(r.pk, r.staff_id) for r in rows], [(appointment.pk, None)])
+
+        appointment.delete()
+        rows, _, _, _, _ = self.changes(Billing, billings)
+        self.assertEqual([(r.pk, r.appointment_id) for r in rows], [(billing.pk, None)])
+
+    def test_deleting_a_parent_acte_resends_its_subtree(self):
+        parent = Acte.objects.create(tenant=self.tenant, code='S', name='Surgery')
+        child = Acte.objects.create(tenant=self.tenant, code='S.1', name='Anaesthesia', parent=parent)
+        grandchild = Acte.objects.create(tenant=self.tenant, code='S.1.1', name='Sedation', parent=child)
+        _, _, position, _, _ = self.changes(Acte)
+
+        parent_id = parent.pk
+        parent.delete()
+        rows, deleted, _, _, _ = self.changes(Acte, position)
+        self.assertEqual({r.pk for r in rows}, {child.pk, grandchild.pk})
+        self.assertEqual(deleted, [str(parent_id)])
+        self.assertEqual({r.pk: r.depth for r in rows}, {child.pk: 0, grandchild.pk: 1})
+
+
+class SyncEndpointTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        user = get_user_model().objects.create_user(username='admin', password='x')
+        Staff.objects.create(tenant=self.tenant, user=user, role='admin')
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}',
+            HTTP_X_TENANT_SLUG='clinic',
+        )
+
+    @override_settings(SYNC_SAFETY_LAG=0)
+    def test_cursor_from_one_call_feeds_the_next(self):
+        patient = Patient.objects.create(tenant=self.tenant, first_name='Ada', last_name='Lovelace')
+        first = self.client.get('/api/sync/', {'resources': 'patients'})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual([r['id'] for r in first.data['patients']['updated']], [str(patient.pk)])
+
+        patient_id = patient.pk
+        patient.delete()
+        second = self.client.get('/api/sync/', {'patients': first.data['patients']['cursor']})
+        self.assertEqual(second.data['patients']['updated'], [])
+        self.assertEqual(second.data['patients']['deleted'], [str(patient_id)])
+
+    def test_tampered_cursor_is_400(self):
+        self.assertEqual(self.client.get('/api/sync/', {'patients': 'nope'}).status_code, 400)
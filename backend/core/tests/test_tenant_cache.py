@@ -0,0 +1,62 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from tenants.cache import TenantSlugCache, tenant_cache
+from tenants.models import Tenant
+
+
+class TenantSlugCacheTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+        self.cache = TenantSlugCache()
+        self.now = 1000.0
+        patcher = mock.patch('tenants.cache.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(TENANT_CACHE_TTL=60)
+    def test_entries_expire_after_the_ttl(self):
+        self.assertEqual(self.cache.get('clinic'), self.tenant)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cache.get('clinic'), self.tenant)
+        self.now += 61
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cache.get('clinic'), self.tenant)
+        self.assertEqual(self.cache.stats(), {'entries': 1, 'hits': 1, 'negative_hits': 0, 'misses': 2})
+
+    @override_settings(TENANT_CACHE_TTL=300, TENANT_CACHE_NEGATIVE_TTL=10)
+    def test_unknown_slugs_are_cached_briefly(self):
+        self.assertIsNone(self.cache.get('nope'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.cache.get('nope'))
+        Tenant.objects.create(name='Late', slug='nope')
+        self.now += 11
+        self.assertEqual(self.cache.get('nope').name, 'Late')
+        self.assertEqual(self.cache.stats()['negative_hits'], 1)
+
+    @override_settings(TENANT_CACHE_TTL=60, TENANT_CACHE_NEGATIVE_TTL=10, TENANT_CACHE_MAX_ENTRIES=2)
+    def test_max_entries_evicts_closest_to_expiry(self):
+        self.cache.get('clinic')
+        self.cache.get('nope')  # negative entry: expires first
+        self.cache.get('other')
+        self.assertEqual(set(self.cache._entries), {'clinic', 'other'})
+
+
+class TenantSlugRenameTests(TestCase):
+    def setUp(self):
+        tenant_cache.invalidate()
+        self.addCleanup(tenant_cache.invalidate)
+        self.tenant = Tenant.objects.create(name='Clinic', slug='clinic')
+
+    def test_rename_drops_the_old_slug(self):
+        self.assertEqual(tenant_cache.get('clinic'), self.tenant)
+        self.tenant.slug = 'renamed'
+        self.tenant.save()
+        self.assertIsNone(tenant_cache.get('clinic'))
+        self.assertEqual(tenant_cache.get('renamed'), self.tenant)
+
+    def test_delete_drops_the_slug(self):
+        tenant_cache.get('clinic')
+        self.tenant.delete()
+        self.assertIsNone(tenant_cache.get('clinic'))
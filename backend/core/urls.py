@@ -1,6 +1,7 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
-from .views import PatientViewSet, StaffViewSet, AppointmentViewSet, BillingViewSet, InventoryViewSet, ActeViewSet, debug_auth, dev_token_for_staff, current_user
+from .views import PatientViewSet, StaffViewSet, AppointmentViewSet, BillingViewSet, InventoryViewSet, StockMovementViewSet, ActeViewSet, debug_auth, dev_token_for_staff, current_user, sync_changes, db_pool_stats
 
 router = DefaultRouter()
 router.register(r'patients', PatientViewSet, basename='patients')
@@ -8,6 +9,7 @@ router.register(r'staff', StaffViewSet, basename='staff')
 router.register(r'appointments', AppointmentViewSet, basename='appointments')
 router.register(r'billing', BillingViewSet, basename='billing')
 router.register(r'inventory', InventoryViewSet, basename='inventory')
+router.register(r'stock-movements', StockMovementViewSet, basename='stock-movements')
 router.register(r'actes', ActeViewSet, basename='actes')
 
 urlpatterns = [
@@ -17,4 +19,16 @@ urlpatterns = [
     path('debug-auth/', debug_auth),
     path('dev-token/', dev_token_for_staff),
     path('me/', current_user),
+    path('sync/', sync_changes),
+    path('db-pool-stats/', db_pool_stats),
 ]
+
+if getattr(settings, 'ASYNC_READ_VIEWS', False):
+    # async variants of the heavy reads (see core.async_views), ahead of the router's routes
+    from . import async_views
+
+    urlpatterns = [
+        path('billing/totals/', async_views.billing_totals),
+        path('patients/<uuid:pk>/', async_views.patient_detail),
+        path('me/', async_views.current_user),
+    ] + urlpatterns
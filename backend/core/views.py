@@ -1,14 +1,18 @@
-from rest_framework import viewsets
+from rest_framework import mixins, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 import logging
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, AllowAny
+from contextlib import contextmanager
+from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, IsAdminUser, AllowAny
 from .permissions import RolePermission
 from django.shortcuts import render
 from django.conf import settings
+from django.core.cache import cache
 from django.contrib.auth import authenticate, get_user_model
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.views.decorators.http import require_GET
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -17,21 +21,80 @@ from rest_framework.permissions import IsAuthenticated
 from .serializers import StaffSerializer
 from django.contrib.auth import get_user_model
 
-from .models import Patient, Staff, Appointment, Billing, InventoryItem, Acte
-from django.db.models import Sum, Case, When, DecimalField, Q
-from .serializers import PatientSerializer, StaffSerializer, AppointmentSerializer, BillingSerializer, InventorySerializer, ActeSerializer
+from .models import Patient, Staff, Appointment, Billing, InventoryItem, Acte, ActeConsumable, StockMovement, InsufficientStock
+from django.db.models import Sum, Count, Max, Case, When, DecimalField, F, Q, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from .serializers import PatientSerializer, PatientSummarySerializer, StaffSerializer, AppointmentSerializer, BillingSerializer, InventorySerializer, StockMovementSerializer, ActeSerializer, ActeConsumableSerializer
 from django.utils import timezone
-from .mixins import TenantFilterMixin
-
-
-class PatientViewSet(TenantFilterMixin, viewsets.ModelViewSet):
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, timedelta
+from django.db import router, transaction
+from hms import db_pool
+from hms import metrics as hms_metrics
+from .mixins import ResponseCacheMixin, TenantFilterMixin
+from .catalog import get_catalog
+from .auth import add_staff_claims
+from . import availability, sync
+
+
+def insufficient_stock_response(exc):
+    """409 listing the quantity still available of each short item."""
+    return Response(
+        {'detail': 'Stock insuffisant', 'shortages': {str(pk): available for pk, available in exc.shortages.items()}},
+        status=status.HTTP_409_CONFLICT,
+    )
+
+
+class PatientViewSet(TenantFilterMixin, ResponseCacheMixin, viewsets.ModelViewSet):
     # only staff with allowed roles can access (read/write)
     permission_classes = [IsAuthenticated, RolePermission]
     allowed_roles = ['admin', 'reception', 'doctor', 'nurse', 'billing']
     queryset = Patient.objects.all().order_by('last_name')
+    keyset_ordering = ('last_name', 'id')
     serializer_class = PatientSerializer
+    # summaries and the nested history embed appointments, billings and acte names
+    response_models = ('core.Patient', 'core.Appointment', 'core.Billing', 'core.Acte')
     logger = logging.getLogger(__name__)
 
+    def get_serializer_class(self):
+        # list (and delta sync) rows are summaries; nested history only on the detail route
+        if self.action in ('list', 'sync'):
+            return PatientSummarySerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action in ('list', 'sync'):
+            qs = self.annotate_summary(qs)
+        return qs
+
+    def validator_queryset(self):
+        # the summary annotations would be computed for every row
+        return self.filter_queryset(super().get_queryset())
+
+    @staticmethod
+    def annotate_summary(qs):
+        """Annotate counts, last visit and outstanding balances with correlated
+        subqueries so the whole list is fetched in a single SQL statement
+        (subqueries avoid the row fan-out of joining appointments and billings).
+        """
+        amount_field = DecimalField(max_digits=12, decimal_places=2)
+        appts = Appointment.objects.filter(patient=OuterRef('pk')).order_by().values('patient')
+        bills = Billing.objects.filter(patient=OuterRef('pk')).order_by().values('patient')
+        qs = qs.annotate(
+            appointments_count=Coalesce(Subquery(appts.annotate(c=Count('id')).values('c')), 0),
+            billings_count=Coalesce(Subquery(bills.annotate(c=Count('id')).values('c')), 0),
+            last_visit=Subquery(
+                appts.exclude(status='cancelled')
+                .filter(date__isnull=False, date__lte=timezone.now())
+                .annotate(m=Max('date')).values('m')
+            ),
+        )
+        for cur, _label in Billing.CURRENCY_CHOICES:
+            due = Subquery(bills.filter(currency=cur).annotate(s=Sum('remaining_due')).values('s'), output_field=amount_field)
+            qs = qs.annotate(**{f'outstanding_{cur}': Coalesce(due, Value(0), output_field=amount_field)})
+        return qs
+
     def create(self, request, *args, **kwargs):
         # Log incoming payload for debugging 400 Bad Request
         try:
@@ -87,7 +150,7 @@ class PatientViewSet(TenantFilterMixin, viewsets.ModelViewSet):
     
 
 
-class StaffViewSet(TenantFilterMixin, viewsets.ModelViewSet):
+class StaffViewSet(TenantFilterMixin, ResponseCacheMixin, viewsets.ModelViewSet):
     # Only admin can manage staff
     permission_classes = [IsAuthenticated, RolePermission]
     allowed_roles = ['admin']
@@ -172,13 +235,50 @@ class StaffViewSet(TenantFilterMixin, viewsets.ModelViewSet):
         return Response(ser.data, status=status.HTTP_201_CREATED)
 
 
-class AppointmentViewSet(TenantFilterMixin, viewsets.ModelViewSet):
+class AppointmentViewSet(TenantFilterMixin, ResponseCacheMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, RolePermission]
     allowed_roles = ['admin', 'reception', 'doctor', 'nurse']
     queryset = Appointment.objects.all().order_by('-date')
+    keyset_ordering = ('-date', 'id')
     serializer_class = AppointmentSerializer
     logger = logging.getLogger(__name__)
 
+    def get_queryset(self):
+        """Optional filters: `date_from` / `date_to` (ISO date or datetime; a
+        bare `date_to` day is inclusive), `status` and `staff` (comma-separated),
+        `patient`. Served by the (tenant, date) / (tenant, status, date) indexes."""
+        qs = super().get_queryset()
+        if self.action != 'list':
+            return qs
+        params = self.request.query_params
+        if params.get('date_from'):
+            start = self._parse_moment(params['date_from'])
+            if start is None:
+                raise ValidationError({'date_from': 'Invalid date'})
+            qs = qs.filter(date__gte=start)
+        if params.get('date_to'):
+            end = self._parse_moment(params['date_to'])
+            if end is None:
+                raise ValidationError({'date_to': 'Invalid date'})
+            try:
+                whole_day = parse_date(params['date_to']) is not None
+            except ValueError:
+                whole_day = False
+            if whole_day:
+                qs = qs.filter(date__lt=end + timedelta(days=1))
+            else:
+                qs = qs.filter(date__lte=end)
+        if params.get('status'):
+            qs = qs.filter(status__in=[v.strip() for v in params['status'].split(',') if v.strip()])
+        try:
+            if params.get('staff'):
+                qs = qs.filter(staff_id__in=[uuid.UUID(v.strip()) for v in params['staff'].split(',') if v.strip()])
+            if params.get('patient'):
+                qs = qs.filter(patient_id=uuid.UUID(params['patient']))
+        except ValueError:
+            raise ValidationError({'detail': 'Invalid staff or patient id'})
+        return qs
+
     def create(self, request, *args, **kwargs):
         # Ensure tenant included before validation (similar to other create methods)
         try:
@@ -212,17 +312,128 @@ class AppointmentViewSet(TenantFilterMixin, viewsets.ModelViewSet):
                 pass
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        self.perform_create(serializer)
+        with self._booking_lock(serializer.validated_data):
+            clash = self._conflict_response(request, serializer.validated_data)
+            if clash is not None:
+                return clash
+            self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        instance = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        with self._booking_lock(serializer.validated_data, instance):
+            clash = self._conflict_response(request, serializer.validated_data, instance)
+            if clash is not None:
+                return clash
+            self.perform_update(serializer)
+        if getattr(instance, '_prefetched_objects_cache', None):
+            # as in UpdateModelMixin: drop prefetches that may now be stale
+            instance._prefetched_objects_cache = {}
+        return Response(serializer.data)
+
+    @contextmanager
+    def _booking_lock(self, data, instance=None):
+        """Transaction holding the booked staff member's row lock, so two
+        overlapping bookings cannot both pass the conflict check."""
+        staff = data.get('staff', getattr(instance, 'staff', None))
+        with transaction.atomic(using=router.db_for_write(Appointment)):
+            if staff is not None:
+                Staff.objects.select_for_update().get(pk=staff.pk)
+            yield
+
+    def _conflict_response(self, request, data, instance=None):
+        """409 response if the booking overlaps another one of the same staff.
+
+        Pass `allow_overlap=true` (query or body) to book anyway.
+        """
+        flag = request.query_params.get('allow_overlap') or (request.data.get('allow_overlap') if hasattr(request.data, 'get') else None)
+        if str(flag).lower() in ('1', 'true', 'yes'):
+            return None
+        def pick(field):
+            return data[field] if field in data else getattr(instance, field, None)
+        if instance is not None and all(pick(f) == getattr(instance, f) for f in ('staff', 'date', 'duration_minutes', 'status')):
+            # booking unchanged (e.g. only the reason was edited)
+            return None
+        staff, date, appt_status = pick('staff'), pick('date'), pick('status') or 'scheduled'
+        if staff is None or date is None or appt_status in availability.FREE_STATUSES:
+            return None
+        tenant = pick('tenant') or getattr(request, 'tenant', None)
+        found = availability.conflicts(tenant, staff.pk, date, pick('duration_minutes'), exclude_id=getattr(instance, 'pk', None))
+        if not found:
+            return None
+        return Response({'detail': 'Ce créneau chevauche un autre rendez-vous.', 'conflicts': found}, status=status.HTTP_409_CONFLICT)
+
+    @action(detail=False, methods=['get'])
+    def availability(self, request):
+        """Free slots per staff member.
+
+        Query params: `start`, `end` (ISO datetime or date; default: now, and
+        start + 1 day; at most 31 days), `slot` (minutes, default 30),
+        `staff` (comma-separated ids; default every active staff member,
+        optionally filtered by `role`).
+
+        Response: [{ 'staff': id, 'slots': [{ 'start': ..., 'end': ... }, ...] }, ...]
+        """
+        tenant = getattr(request, 'tenant', None)
+        if tenant is None:
+            return Response({'detail': 'Tenant required'}, status=status.HTTP_400_BAD_REQUEST)
+        params = request.query_params
+        start = self._parse_moment(params.get('start')) if params.get('start') else timezone.now()
+        if start is None:
+            return Response({'detail': 'Invalid start'}, status=status.HTTP_400_BAD_REQUEST)
+        end = self._parse_moment(params.get('end')) if params.get('end') else start + timedelta(days=1)
+        if end is None or end <= start or end - start > timedelta(days=31):
+            return Response({'detail': 'Invalid end (must be after start, range <= 31 days)'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            slot = int(params.get('slot', 30))
+        except (TypeError, ValueError):
+            slot = 0
+        if slot <= 0:
+            return Response({'detail': 'Invalid slot'}, status=status.HTTP_400_BAD_REQUEST)
+
+        staff_qs = Staff.objects.filter(tenant=tenant, is_active=True)
+        if params.get('staff'):
+            staff_qs = staff_qs.filter(id__in=[s.strip() for s in params['staff'].split(',') if s.strip()])
+        if params.get('role'):
+            staff_qs = staff_qs.filter(role=params['role'])
+        try:
+            staff_ids = list(staff_qs.values_list('id', flat=True))
+        except Exception:
+            return Response({'detail': 'Invalid staff'}, status=status.HTTP_400_BAD_REQUEST)
 
-class BillingViewSet(TenantFilterMixin, viewsets.ModelViewSet):
+        slots = availability.free_slots(tenant, staff_ids, start, end, slot_minutes=slot)
+        return Response([
+            {'staff': str(sid), 'slots': [{'start': s, 'end': e} for s, e in slots[sid]]}
+            for sid in staff_ids
+        ])
+
+    @staticmethod
+    def _parse_moment(raw):
+        try:
+            value = parse_datetime(raw)
+            if value is None:
+                day = parse_date(raw)
+                value = datetime.combine(day, datetime.min.time()) if day else None
+        except ValueError:
+            return None
+        if value is not None and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+
+
+class BillingViewSet(TenantFilterMixin, ResponseCacheMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, RolePermission]
     allowed_roles = ['admin', 'billing']
-    # select_related patient and prefetch items to avoid N+1 queries when listing
-    queryset = Billing.objects.all().select_related('patient').prefetch_related('items').order_by('-issued_at')
+    # select_related patient and prefetch items/payments to avoid N+1 queries when listing
+    queryset = Billing.objects.all().select_related('patient').prefetch_related('items__acte', 'payments').order_by('-issued_at')
+    keyset_ordering = ('-issued_at', 'id')
     serializer_class = BillingSerializer
+    # rows show the patient's name and item acte names
+    response_models = ('core.Billing', 'core.Patient', 'core.Acte')
 
     def create(self, request, *args, **kwargs):
         # Ensure tenant included before validation and allow convenient top-level acte/description
@@ -275,7 +486,10 @@ class BillingViewSet(TenantFilterMixin, viewsets.ModelViewSet):
                 pass
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        self.perform_create(serializer)
+        try:
+            self.perform_create(serializer)
+        except InsufficientStock as exc:
+            return insufficient_stock_response(exc)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
@@ -292,18 +506,17 @@ class BillingViewSet(TenantFilterMixin, viewsets.ModelViewSet):
             return Response({'detail': 'Amount must be > 0'}, status=status.HTTP_400_BAD_REQUEST)
         currency = data.get('currency') or billing.currency
         method = data.get('method') or ''
-        # create payment
         from .models import BillingPayment
-        pay = BillingPayment.objects.create(billing=billing, amount=amt, currency=currency, method=method)
-        # if fully paid, set paid_at
-        try:
-            total_paid = billing.payments.aggregate(s=Sum('amount'))['s'] or 0
-            if float(total_paid) >= float(billing.amount or 0):
+        with transaction.atomic():
+            # the payment receivers bump billing.paid_total / remaining_due atomically
+            BillingPayment.objects.create(billing=billing, amount=amt, currency=currency, method=method)
+            # if fully paid, set paid_at
+            if billing.paid_at is None and billing.remaining_due <= 0:
                 billing.paid_at = timezone.now()
-                billing.save()
-        except Exception:
-            pass
+                billing.save(update_fields=['paid_at', 'updated_at'])
 
+        # reload so the prefetched payments include the new one
+        billing = self.get_object()
         ser = self.get_serializer(billing)
         return Response(ser.data)
     def pay(self, request, pk=None):
@@ -321,38 +534,177 @@ class BillingViewSet(TenantFilterMixin, viewsets.ModelViewSet):
     def totals(self, request):
         """Return totals grouped by currency for the current tenant (or all if no tenant).
 
+        Optional query params `date_from` / `date_to` (YYYY-MM-DD, inclusive)
+        restrict to billings issued in that range. Served from the
+        `BillingDailyTotal` rollup with a single GROUP BY query.
+
         Response format: [{ 'currency': 'CDF', 'total': 123.45, 'paid': 100.00, 'unpaid': 23.45 }, ...]
         """
-        qs = Billing.objects.all()
+        try:
+            qs = self.totals_queryset(getattr(request, 'tenant', None), request.query_params)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.totals_result(qs))
+
+    @staticmethod
+    def totals_queryset(tenant, params):
+        """Per-currency sums of the `BillingDailyTotal` rollup (see `totals`);
+        raises ValueError for a malformed date parameter."""
+        from .models import BillingDailyTotal
+        qs = BillingDailyTotal.objects.all()
         # apply tenant filter if middleware set request.tenant
-        tenant = getattr(request, 'tenant', None)
         if tenant:
             qs = qs.filter(tenant=tenant)
-        # compute totals per currency and paid/unpaid based on actual payments (supports partial payments)
+        for param, lookup in (('date_from', 'day__gte'), ('date_to', 'day__lte')):
+            raw = params.get(param)
+            if not raw:
+                continue
+            try:
+                day = parse_date(raw)
+            except ValueError:
+                day = None
+            if day is None:
+                raise ValueError(f'Invalid {param}, expected YYYY-MM-DD')
+            qs = qs.filter(**{lookup: day})
+        return qs.order_by().values('currency').annotate(total=Sum('billed'), paid=Sum('paid'))
+
+    @staticmethod
+    def totals_result(rows):
+        grouped = {row['currency']: row for row in rows}
+        # keep every known currency in the response, in declaration order
         currencies = [c[0] for c in getattr(Billing, 'CURRENCY_CHOICES', [])]
+        currencies += sorted(c for c in grouped if c not in currencies)
         result = []
-        from .models import BillingPayment
         for cur in currencies:
-            total = qs.filter(currency=cur).aggregate(s=Sum('amount'))['s'] or 0
-            # sum payments for billings in this currency (join via billing__currency)
-            paid = BillingPayment.objects.filter(billing__currency=cur)
-            if tenant:
-                paid = paid.filter(billing__tenant=tenant)
-            paid_amt = paid.aggregate(s=Sum('amount'))['s'] or 0
-            unpaid = (total or 0) - (paid_amt or 0)
-            result.append({'currency': cur, 'total': float(total or 0), 'paid': float(paid_amt or 0), 'unpaid': float(unpaid or 0)})
-
-        return Response(result)
+            row = grouped.get(cur, {})
+            total = row.get('total') or 0
+            paid_amt = row.get('paid') or 0
+            result.append({'currency': cur, 'total': float(total), 'paid': float(paid_amt), 'unpaid': float(total - paid_amt)})
+        return result
 
 
-class InventoryViewSet(TenantFilterMixin, viewsets.ModelViewSet):
+class InventoryViewSet(TenantFilterMixin, ResponseCacheMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, RolePermission]
     allowed_roles = ['admin', 'billing']
     queryset = InventoryItem.objects.all().order_by('name')
     serializer_class = InventorySerializer
 
+    def update(self, request, *args, **kwargs):
+        # a quantity edit is posted as an adjustment movement
+        try:
+            return super().update(request, *args, **kwargs)
+        except InsufficientStock as exc:
+            return insufficient_stock_response(exc)
+
+    @action(detail=False, methods=['get'])
+    def low_stock(self, request):
+        """Items at or below their reorder level, served by the partial
+        low-stock index and cached per tenant until the next stock write
+        (at most `INVENTORY_LOW_STOCK_CACHE_TTL` seconds, default 300)."""
+        tenant = getattr(request, 'tenant', None)
+        if tenant is None:
+            return Response({'count': 0, 'items': []})
+        key = InventoryItem.low_stock_cache_key(tenant.pk)
+        items = cache.get(key)
+        hms_metrics.cache_lookup('low_stock', items is not None)
+        if items is None:
+            qs = self.get_queryset().filter(quantity__lte=F('reorder_level')).order_by('name')
+            items = self.get_serializer(qs, many=True).data
+            cache.set(key, items, getattr(settings, 'INVENTORY_LOW_STOCK_CACHE_TTL', 300))
+        return Response({'count': len(items), 'items': items})
+
+    @action(detail=False, methods=['get'])
+    def stock_at(self, request):
+        """Quantity on hand of every item at `?at=` (ISO datetime, or a date meaning
+        the end of that day); `?item=` restricts to one item."""
+        raw = request.query_params.get('at')
+        at = AppointmentViewSet._parse_moment(raw) if raw else None
+        if at is None:
+            return Response({'at': 'A valid date or datetime is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            if parse_date(raw) is not None:
+                at = at + timedelta(days=1) - timedelta(microseconds=1)
+        except ValueError:
+            pass
+        qs = self.get_queryset()
+        if request.query_params.get('item'):
+            try:
+                qs = qs.filter(pk=uuid.UUID(request.query_params['item']))
+            except ValueError:
+                return Response({'item': 'Invalid item id'}, status=status.HTTP_400_BAD_REQUEST)
+        rows = InventoryItem.with_quantity_at(qs, at).values('id', 'sku', 'name', 'unit', 'quantity_at')
+        return Response({'at': at, 'items': [
+            {'id': r['id'], 'sku': r['sku'], 'name': r['name'], 'unit': r['unit'], 'quantity': r['quantity_at']} for r in rows
+        ]})
+
+
+class StockMovementViewSet(TenantFilterMixin, ResponseCacheMixin, mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """Append-only stock ledger: movements can be posted and listed, never edited."""
 
-class ActeViewSet(TenantFilterMixin, viewsets.ModelViewSet):
+    permission_classes = [IsAuthenticated, RolePermission]
+    allowed_roles = ['admin', 'billing']
+    queryset = StockMovement.objects.all().order_by('-occurred_at')
+    keyset_ordering = ('-occurred_at', 'id')
+    serializer_class = StockMovementSerializer
+    # rows are never updated
+    validator_field = 'created_at'
+
+    def get_queryset(self):
+        """Optional filters: `item`, `kind`, `date_from` / `date_to` on occurred_at."""
+        qs = super().get_queryset()
+        if self.action != 'list':
+            return qs
+        params = self.request.query_params
+        try:
+            if params.get('item'):
+                qs = qs.filter(item_id=uuid.UUID(params['item']))
+        except ValueError:
+            raise ValidationError({'item': 'Invalid item id'})
+        if params.get('kind'):
+            qs = qs.filter(kind__in=[v.strip() for v in params['kind'].split(',') if v.strip()])
+        for param, lookup in (('date_from', 'occurred_at__gte'), ('date_to', 'occurred_at__lte')):
+            if params.get(param):
+                moment = AppointmentViewSet._parse_moment(params[param])
+                if moment is None:
+                    raise ValidationError({param: 'Invalid date'})
+                qs = qs.filter(**{lookup: moment})
+        return qs
+
+    def create(self, request, *args, **kwargs):
+        try:
+            return super().create(request, *args, **kwargs)
+        except InsufficientStock as exc:
+            return insufficient_stock_response(exc)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Post many movements (a list, or `{movements: [...]}`) in one transaction:
+        either all of them are applied or none."""
+        tenant = getattr(request, 'tenant', None)
+        if tenant is None:
+            return Response({'detail': 'Tenant required'}, status=status.HTTP_400_BAD_REQUEST)
+        rows = request.data.get('movements') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({'movements': 'A non-empty list of movements is required'}, status=status.HTTP_400_BAD_REQUEST)
+        ids = set()
+        for row in rows:
+            try:
+                ids.add(uuid.UUID(str(row.get('item'))))
+            except (AttributeError, ValueError):
+                pass
+        # one query for every referenced item instead of one per row
+        items = {item.pk: item for item in InventoryItem.objects.filter(tenant=tenant, pk__in=ids)}
+        serializer = StockMovementSerializer(data=rows, many=True, context={**self.get_serializer_context(), 'items': items})
+        serializer.is_valid(raise_exception=True)
+        movements = [serializer.child.build(attrs) for attrs in serializer.validated_data]
+        try:
+            StockMovement.post(movements)
+        except InsufficientStock as exc:
+            return insufficient_stock_response(exc)
+        return Response(StockMovementSerializer(movements, many=True).data, status=status.HTTP_201_CREATED)
+
+
+class ActeViewSet(TenantFilterMixin, ResponseCacheMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, RolePermission]
     allowed_roles = ['admin', 'doctor', 'billing']
     queryset = Acte.objects.all().order_by('name')
@@ -396,6 +748,85 @@ class ActeViewSet(TenantFilterMixin, viewsets.ModelViewSet):
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    def _catalog_or_304(self, request):
+        """Return (catalog, None), or (None, 304 response) when the client's
+        If-None-Match already matches the catalog version."""
+        tenant = getattr(request, 'tenant', None)
+        if tenant is None:
+            return None, None
+        catalog = get_catalog(tenant)
+        if catalog.etag in [t.strip() for t in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+            resp = Response(status=status.HTTP_304_NOT_MODIFIED)
+            resp['ETag'] = catalog.etag
+            return None, resp
+        return catalog, None
+
+    def list(self, request, *args, **kwargs):
+        # unpaginated listings are served from the in-process catalog cache
+        if self.paginator is not None and (set(request.query_params) & {'cursor', 'page_size'}):
+            return super().list(request, *args, **kwargs)
+        catalog, not_modified = self._catalog_or_304(request)
+        if not_modified is not None:
+            return not_modified
+        if catalog is None:
+            return super().list(request, *args, **kwargs)
+        resp = Response(catalog.get_serialized(ActeSerializer))
+        resp['ETag'] = catalog.etag
+        return resp
+
+    @action(detail=True, methods=['get', 'put'])
+    def consumables(self, request, pk=None):
+        """Bill of materials of an acte: inventory items deducted from stock each
+        time it is billed. PUT replaces the whole list with `[{item, quantity}]`."""
+        acte = self.get_object()
+        if request.method == 'PUT':
+            rows = request.data.get('consumables') if isinstance(request.data, dict) else request.data
+            if not isinstance(rows, list):
+                return Response({'consumables': 'A list of {item, quantity} is required'}, status=status.HTTP_400_BAD_REQUEST)
+            serializer = ActeConsumableSerializer(data=rows, many=True, context=self.get_serializer_context())
+            serializer.is_valid(raise_exception=True)
+            needs = {}
+            for row in serializer.validated_data:
+                needs[row['item'].pk] = needs.get(row['item'].pk, 0) + row['quantity']
+            with transaction.atomic():
+                ActeConsumable.objects.filter(acte=acte).delete()
+                ActeConsumable.objects.bulk_create([ActeConsumable(acte=acte, item_id=pk, quantity=q) for pk, q in needs.items()])
+        consumables = ActeConsumable.objects.filter(acte=acte).select_related('item').order_by('item__name')
+        return Response(ActeConsumableSerializer(consumables, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """Return the tenant's whole acte catalog as nested `children` lists.
+
+        Built from the cached catalog (or one query), walking actes in
+        materialized-path order so every parent is seen before its sub-actes.
+        Supports If-None-Match like the list route.
+        """
+        catalog, not_modified = self._catalog_or_304(request)
+        if not_modified is not None:
+            return not_modified
+        if catalog is not None:
+            by_id = {a.id: d for a, d in zip(catalog.actes, catalog.get_serialized(ActeSerializer))}
+            pairs = sorted(((a, by_id[a.id]) for a in catalog.actes), key=lambda p: p[0].path)
+        else:
+            actes = list(self.get_queryset().order_by('path'))
+            pairs = list(zip(actes, self.get_serializer(actes, many=True).data))
+        nodes = {}
+        roots = []
+        for acte, data in pairs:
+            node = dict(data, children=[])
+            nodes[acte.id] = node
+            parent = nodes.get(acte.parent_id)
+            (parent['children'] if parent is not None else roots).append(node)
+        sort_key = lambda n: (n.get('name') or '').lower()
+        for node in nodes.values():
+            node['children'].sort(key=sort_key)
+        roots.sort(key=sort_key)
+        resp = Response(roots)
+        if catalog is not None:
+            resp['ETag'] = catalog.etag
+        return resp
+
 
 def custom_404(request, exception=None):
     """Render a friendly styled 404 page.
@@ -497,7 +928,7 @@ def dev_token_for_staff(request):
         else:
             user = staff.user
 
-        refresh = RefreshToken.for_user(user)
+        refresh = add_staff_claims(RefreshToken.for_user(user), user)
         return JsonResponse({'access': str(refresh.access_token), 'refresh': str(refresh), 'username': user.username})
     except Exception as ex:
         return JsonResponse({'error': str(ex)}, status=500)
@@ -507,8 +938,15 @@ def dev_token_for_staff(request):
 @permission_classes([IsAuthenticated])
 def current_user(request):
     """Return current authenticated user profile including linked Staff and tenant info."""
-    User = get_user_model()
-    user = request.user
+    try:
+        staff = getattr(request.user, 'staff_profile', None)
+    except Exception:
+        staff = None
+    return JsonResponse(profile_payload(request.user, staff))
+
+
+def profile_payload(user, staff):
+    """Body of `current_user` for `user` and its Staff profile (or None)."""
     data = {
         'username': user.get_username(),
         'email': getattr(user, 'email', None),
@@ -517,7 +955,6 @@ def current_user(request):
     }
     # attach staff profile if exists
     try:
-        staff = getattr(user, 'staff_profile', None)
         if staff:
             ser = StaffSerializer(staff)
             data['staff'] = ser.data
@@ -529,5 +966,92 @@ def current_user(request):
             data['staff'] = None
     except Exception:
         data['staff'] = None
+    return data
+
+
+SYNC_VIEWSETS = {
+    'patients': PatientViewSet,
+    'appointments': AppointmentViewSet,
+    'billing': BillingViewSet,
+    'actes': ActeViewSet,
+    'inventory': InventoryViewSet,
+    'staff': StaffViewSet,
+}
 
-    return JsonResponse(data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync_changes(request):
+    """Delta sync: rows changed and ids deleted since each resource's cursor.
+
+    Query: `<resource>=<cursor>` for each resource to sync (a cursor returned
+    by a previous call, or an ISO datetime), or `resources=patients,billing`
+    for a first full sync; without either, every resource the caller's role
+    may list. `limit` bounds rows per resource (call again while `has_more`).
+    Rows have the same shape as in the resource's list endpoint.
+    """
+    tenant = getattr(request, 'tenant', None)
+    if tenant is None:
+        return Response({'detail': 'Tenant required'}, status=status.HTTP_400_BAD_REQUEST)
+    params = request.query_params
+    try:
+        limit = min(max(int(params.get('limit', sync.DEFAULT_LIMIT)), 1), sync.MAX_LIMIT)
+    except (TypeError, ValueError):
+        return Response({'limit': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+
+    requested = [r for r in SYNC_VIEWSETS if r in params]
+    if params.get('resources'):
+        requested += [r.strip() for r in params['resources'].split(',') if r.strip() and r.strip() not in requested]
+    explicit = bool(requested)
+    if not explicit:
+        requested = list(SYNC_VIEWSETS)
+    unknown = [r for r in requested if r not in SYNC_VIEWSETS]
+    if unknown:
+        return Response({'resources': f"Unknown resource(s): {', '.join(unknown)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    now = timezone.now()
+    data = {}
+    forbidden = []
+    for resource in requested:
+        # reuse the resource's own permissions, tenant scoping and serializer
+        # (action 'sync': list serializers, without the list query filters)
+        view = SYNC_VIEWSETS[resource](request=request, action='sync', format_kwarg=None, args=(), kwargs={})
+        if not all(p.has_permission(request, view) for p in view.get_permissions()):
+            forbidden.append(resource)
+            continue
+        try:
+            position = sync.decode_cursor(params.get(resource))
+        except sync.InvalidCursor:
+            return Response({resource: 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        rows, deleted, next_position, has_more, reset = sync.changes(
+            view.get_queryset(), resource, tenant.pk, position=position, limit=limit, now=now,
+        )
+        data[resource] = {
+            'updated': view.get_serializer(rows, many=True).data,
+            'deleted': deleted,
+            'cursor': sync.encode_cursor(next_position),
+            'has_more': has_more,
+            'reset': reset,
+        }
+    if explicit and forbidden:
+        return Response({'detail': f"Not allowed: {', '.join(forbidden)}"}, status=status.HTTP_403_FORBIDDEN)
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def db_pool_stats(request):
+    """Connection pool counters of this worker (monitoring; see hms.db_pool)."""
+    return Response({'mode': db_pool.mode(), 'pools': db_pool.pool_stats()})
+
+
+@require_GET
+def metrics(request):
+    """Prometheus scrape endpoint (hms.metrics), for clients in METRICS_ALLOWED_IPS;
+    scrapers carry no JWT, so this is a plain Django view."""
+    if not hms_metrics.enabled():
+        raise Http404
+    if not hms_metrics.allowed(hms_metrics.client_ip(request)):
+        return HttpResponseForbidden('Forbidden')
+    body, content_type = hms_metrics.render()
+    return HttpResponse(body, content_type=content_type)
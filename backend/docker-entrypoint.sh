@@ -17,4 +17,16 @@ echo "Collect static"
 python manage.py collectstatic --noinput || true
 
 echo "Starting server"
-gunicorn hms.wsgi:application --bind 0.0.0.0:8000
+# Workers share their Prometheus metrics (hms.metrics) through mmap files in
+# this directory, emptied at every start
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/hms-metrics}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# SERVER_MODE=asgi serves hms.asgi (async read views) with uvicorn workers;
+# the worker count comes from WEB_CONCURRENCY in both modes
+if [ "$SERVER_MODE" = "asgi" ]; then
+  gunicorn hms.asgi:application -c python:hms.gunicorn_conf --bind 0.0.0.0:8000 --worker-class uvicorn_worker.UvicornWorker
+else
+  gunicorn hms.wsgi:application -c python:hms.gunicorn_conf --bind 0.0.0.0:8000
+fi
@@ -0,0 +1,53 @@
+"""Database connection reuse statistics.
+
+`DB_POOL` (hms/settings.py) picks how Postgres connections are reused:
+`off`, `persistent` (Django's CONN_MAX_AGE with CONN_HEALTH_CHECKS) or
+`pool` (psycopg_pool, one pool per worker process and alias, connections
+checked on checkout). `pool_stats()` reports this worker's pools.
+"""
+from django.conf import settings
+from django.db import connections
+
+
+def mode():
+    return getattr(settings, 'DB_POOL', 'off')
+
+
+def _average(total, count):
+    return round(total / count, 3) if count else 0.0
+
+
+def pool_stats():
+    """Per-alias pool counters of this worker process, cumulative since start.
+
+    `in_use`: connections checked out (or being opened) now; `waiting`:
+    requests queued for one now; `waits`: checkouts that had to queue;
+    `checkout_wait_ms_avg`: mean time a checkout spent waiting; `errors`:
+    checkouts that timed out. Only aliases this thread has connected
+    through are reported: reading `pool` on a fresh connection creates it.
+    """
+    stats = {}
+    for connection in connections.all(initialized_only=True):
+        pool = getattr(connection, 'pool', None)
+        if pool is None:
+            continue
+        alias = connection.alias
+        raw = pool.get_stats()
+        checkouts = raw.get('requests_num', 0)
+        opened = raw.get('connections_num', 0)
+        stats[alias] = {
+            'size': raw.get('pool_size', 0),
+            'max_size': raw.get('pool_max', 0),
+            'available': raw.get('pool_available', 0),
+            'in_use': raw.get('pool_size', 0) - raw.get('pool_available', 0),
+            'waiting': raw.get('requests_waiting', 0),
+            'checkouts': checkouts,
+            'waits': raw.get('requests_queued', 0),
+            'checkout_wait_ms_avg': _average(raw.get('requests_wait_ms', 0), checkouts),
+            'errors': raw.get('requests_errors', 0),
+            'connections_opened': opened,
+            'connect_ms_avg': _average(raw.get('connections_ms', 0), opened),
+            'connections_lost': raw.get('connections_lost', 0),
+            'returned_bad': raw.get('returns_bad', 0),
+        }
+    return stats
@@ -0,0 +1,10 @@
+"""Gunicorn hooks, loaded by docker-entrypoint.sh with `-c python:hms.gunicorn_conf`."""
+import os
+
+
+def child_exit(server, worker):
+    # drop the dead worker's live gauges from the shared metrics directory (hms.metrics)
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
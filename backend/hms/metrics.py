@@ -0,0 +1,123 @@
+"""Prometheus metrics, exposed at /metrics (core.views.metrics).
+
+Every gunicorn worker is a separate process. With `PROMETHEUS_MULTIPROC_DIR`
+set (docker-entrypoint.sh does) each one writes its samples to mmap files in
+that directory and a scrape, whichever worker answers it, adds them all up;
+the gunicorn child_exit hook (hms.gunicorn_conf) retires the gauges of a
+worker that died. Without it the metrics are those of the serving process.
+
+Requests are recorded by PerformanceMiddleware: latency and status per view
+(`ViewSet.action`), and database queries per request for the requests it
+samples (`PERF_SAMPLE_RATE`). Caches count their lookups with
+`cache_lookup()`; hit ratios are `hits / (hits + misses)` of
+`hms_cache_lookups_total`.
+"""
+import ipaddress
+import os
+import resource
+
+from django.conf import settings
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+from hms import db_pool
+
+REQUEST_LATENCY = Histogram(
+    'hms_request_duration_seconds', 'Time to handle a request', ['view', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS = Counter('hms_requests', 'Handled requests by response status', ['view', 'method', 'status'])
+DB_QUERIES = Histogram(
+    'hms_request_db_queries', 'Database queries per request (sampled requests)', ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+CACHE_LOOKUPS = Counter('hms_cache_lookups', 'Cache lookups', ['cache', 'result'])
+IN_FLIGHT = Gauge('hms_requests_in_flight', 'Requests being handled', multiprocess_mode='livesum')
+WORKERS = Gauge('hms_workers', 'Live worker processes', multiprocess_mode='livesum')
+WORKER_MAX_RSS = Gauge('hms_worker_max_rss_bytes', 'Peak resident memory of each worker', multiprocess_mode='liveall')
+DB_POOL_CONNECTIONS = Gauge(
+    'hms_db_pool_connections', 'Pooled database connections (DB_POOL=pool)', ['alias', 'state'],
+    multiprocess_mode='livesum',
+)
+
+
+def _update_worker(pools=True):
+    # ru_maxrss is in KiB on Linux
+    WORKER_MAX_RSS.set(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+    if pools and db_pool.mode() == 'pool':
+        for alias, stats in db_pool.pool_stats().items():
+            DB_POOL_CONNECTIONS.labels(alias, 'in_use').set(stats['in_use'])
+            DB_POOL_CONNECTIONS.labels(alias, 'available').set(stats['available'])
+            DB_POOL_CONNECTIONS.labels(alias, 'waiting').set(stats['waiting'])
+
+
+WORKERS.set(1)
+_update_worker(pools=False)  # no connection has been made yet
+
+
+def enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+def cache_lookup(cache, hit):
+    CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def request_started():
+    IN_FLIGHT.inc()
+
+
+def request_stopped():
+    IN_FLIGHT.dec()
+
+
+def observe_request(view, method, status, seconds, queries=None):
+    view = view or 'unmatched'
+    REQUEST_LATENCY.labels(view, method).observe(seconds)
+    REQUESTS.labels(view, method, str(status)).inc()
+    if queries is not None:
+        DB_QUERIES.labels(view).observe(queries)
+    _update_worker()
+
+
+def _in_networks(ip, entries):
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    for entry in entries:
+        try:
+            if address in ipaddress.ip_network(entry, strict=False):
+                return True
+        except ValueError:
+            continue
+    return False
+
+
+def client_ip(request):
+    """Address the request came from: REMOTE_ADDR, unless that is one of
+    `METRICS_TRUSTED_PROXIES`; then the right-most X-Forwarded-For hop that
+    is not a trusted proxy (hops further left are client-supplied)."""
+    trusted = getattr(settings, 'METRICS_TRUSTED_PROXIES', [])
+    forwarded = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+    hops = forwarded + [request.META.get('REMOTE_ADDR', '')]
+    for hop in reversed(hops):
+        if not _in_networks(hop, trusted):
+            return hop
+    return hops[0]
+
+
+def allowed(ip):
+    """Whether `ip` is in `METRICS_ALLOWED_IPS` (addresses or networks)."""
+    return _in_networks(ip, getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1']))
+
+
+def render():
+    """(body, content type) of the current metrics, in text exposition format."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,124 @@
+"""Per-request performance counters.
+
+PerformanceMiddleware activates a `RequestStats` for the requests it samples
+(`PERF_SAMPLE_RATE`); while one is active, every query run on any database
+connection adds to its count and time, `timed()` blocks add to its named
+timings and serializers passed through `timed_serializer()` add their
+`.data` time to 'serialize'. Outside sampled requests the query hook costs one context
+variable lookup.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_current = ContextVar('perf_stats', default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.timings = {}
+
+    def add(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+
+def activate(stats):
+    """Collect this context's queries and timings into `stats`; returns a token for deactivate()."""
+    return _current.set(stats)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def timed(name):
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add(name, time.perf_counter() - started)
+
+
+class _TimedData:
+    """Serializer mixin timing the first evaluation of `.data` as 'serialize'.
+
+    Queries the serializer runs meanwhile (lazy relations) are left out: they
+    are already counted as database time.
+    """
+
+    @property
+    def data(self):
+        stats = _current.get()
+        if stats is None or hasattr(self, '_data'):
+            return super().data
+        started, db_before = time.perf_counter(), stats.query_seconds
+        try:
+            return super().data
+        finally:
+            stats.add('serialize', time.perf_counter() - started - (stats.query_seconds - db_before))
+
+
+_timed_classes = {}
+
+
+def timed_serializer(serializer):
+    """`serializer` with its `.data` timed (see _TimedData) while stats are active."""
+    if _current.get() is None or isinstance(serializer, _TimedData):
+        return serializer
+    cls = type(serializer)
+    timed = _timed_classes.get(cls)
+    if timed is None:
+        timed = _timed_classes[cls] = type(cls)(cls.__name__, (_TimedData, cls), {'__module__': cls.__module__})
+    serializer.__class__ = timed
+    return serializer
+
+
+def _count_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_seconds += time.perf_counter() - started
+
+
+def _install(connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def install():
+    """Hook query counting into every database connection, current and future."""
+    connection_created.connect(_install, dispatch_uid='hms.perf')
+    for connection in connections.all(initialized_only=True):
+        _install(connection)
+
+
+def view_label(request):
+    """`ViewSet.action` (or the view's name) of a resolved request, else None."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    func = match.func
+    cls = getattr(func, 'cls', None)
+    actions = getattr(func, 'actions', None)
+    if cls is not None and actions:
+        return f'{cls.__name__}.{actions.get(request.method.lower(), request.method.lower())}'
+    return getattr(func, '__name__', None) or match.view_name
@@ -0,0 +1,160 @@
+"""Read-replica routing.
+
+`DATABASE_REPLICAS` maps a primary alias (default or a tenant shard) to the
+aliases of its read replicas. ReplicaMiddleware enables replica reads for
+safe-method requests (GET/HEAD/OPTIONS) of clients that have not written
+recently; ReplicaRouter then sends their reads to a healthy replica of the
+primary the other routers picked. Writes, reads inside a transaction and
+every other request stay on the primary.
+
+A replica is skipped for `REPLICA_HEALTH_INTERVAL` seconds when it cannot
+be reached or (on Postgres) lags more than `REPLICA_MAX_LAG` seconds behind
+its primary, so reads fall back to the primary instead of serving stale or
+failing pages.
+"""
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, router
+
+logger = logging.getLogger(__name__)
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', {}) or {}
+
+
+def primary_of(alias):
+    """The primary alias of `alias` (itself when it is not a replica)."""
+    for primary, aliases in replicas().items():
+        if alias in aliases:
+            return primary
+    return alias
+
+
+def is_replica(alias):
+    return primary_of(alias) != alias
+
+
+def activate(enabled=True):
+    """Allow (or forbid) replica reads in this context; returns a token for deactivate()."""
+    return _replica_reads.set(enabled)
+
+
+def deactivate(token):
+    _replica_reads.reset(token)
+
+
+def replica_reads_enabled():
+    return _replica_reads.get()
+
+
+class ReplicaHealth:
+    """Per-process, periodically refreshed view of which replicas are usable."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked = {}  # alias -> (checked at, healthy, lag seconds)
+
+    @property
+    def interval(self):
+        return getattr(settings, 'REPLICA_HEALTH_INTERVAL', 5)
+
+    @property
+    def max_lag(self):
+        return getattr(settings, 'REPLICA_MAX_LAG', getattr(settings, 'REPLICA_STICKY_SECONDS', 5))
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._checked.get(alias)
+            if entry is not None and now - entry[0] < self.interval:
+                return entry[1]
+            # claim the check so concurrent requests keep using the last answer
+            self._checked[alias] = (now, entry[1] if entry else False, entry[2] if entry else None)
+        healthy, lag = self._probe(alias)
+        with self._lock:
+            self._checked[alias] = (time.monotonic(), healthy, lag)
+        return healthy
+
+    def _probe(self, alias):
+        try:
+            with connections[alias].cursor() as cursor:
+                if connections[alias].vendor != 'postgresql':
+                    cursor.execute('SELECT 1')
+                    return True, None
+                cursor.execute(
+                    "SELECT CASE WHEN pg_is_in_recovery() THEN "
+                    "COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) ELSE 0 END"
+                )
+                lag = float(cursor.fetchone()[0] or 0)
+        except DatabaseError as exc:
+            logger.warning('Replica %s unavailable, reading from its primary: %s', alias, exc)
+            return False, None
+        if lag > self.max_lag:
+            logger.warning('Replica %s lags %.1fs behind, reading from its primary', alias, lag)
+            return False, lag
+        return True, lag
+
+    def stats(self):
+        with self._lock:
+            return {alias: {'healthy': healthy, 'lag': lag} for alias, (_, healthy, lag) in self._checked.items()}
+
+
+health = ReplicaHealth()
+
+
+def replica_for(primary):
+    """A healthy replica of `primary`, or `primary` itself."""
+    candidates = [a for a in replicas().get(primary, ()) if health.is_healthy(a)]
+    return random.choice(candidates) if candidates else primary
+
+
+def read_alias(primary):
+    """Alias to read `primary`'s data from in the current context."""
+    if not replica_reads_enabled() or not replicas().get(primary) or connections[primary].in_atomic_block:
+        return primary
+    return replica_for(primary)
+
+
+class ReplicaRouter:
+    """Send reads to a replica when the current request allows it.
+
+    Listed first in DATABASE_ROUTERS: it asks the remaining routers for the
+    primary, then only swaps reads to one of its replicas. Instances loaded
+    from a replica are written back to its primary.
+    """
+
+    def _primary(self, method, model, hints):
+        for r in router.routers:
+            if isinstance(r, ReplicaRouter) or not hasattr(r, method):
+                continue
+            chosen = getattr(r, method)(model, **hints)
+            if chosen:
+                return primary_of(chosen)
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return primary_of(instance._state.db)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_read(self, model, **hints):
+        return read_alias(self._primary('db_for_read', model, hints))
+
+    def db_for_write(self, model, **hints):
+        return self._primary('db_for_write', model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if is_replica(obj1._state.db or '') or is_replica(obj2._state.db or ''):
+            # related rows read from a replica and from its primary are the same rows
+            return primary_of(obj1._state.db) == primary_of(obj2._state.db) or None
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema through replication
+        return False if is_replica(db) else None
@@ -1,6 +1,8 @@
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.environ.get('DJANGO_SECRET', 'dev-secret')
 
@@ -30,8 +32,10 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'middleware.performance.PerformanceMiddleware',
     'middleware.debug_guard.DebugGuardMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'middleware.static_files.StaticFilesMiddleware',
+    'middleware.replica_middleware.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -56,6 +60,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'hms.wsgi.application'
+ASGI_APPLICATION = 'hms.asgi.application'
 
 # Database configuration: prefer Postgres via env, fallback to sqlite for dev
 if os.environ.get('POSTGRES_DB'):
@@ -77,6 +82,65 @@ else:
         }
     }
 
+# Tenant shards (see tenants.sharding): extra database aliases that can hold
+# tenants' data, e.g. DB_SHARDS=shard1,shard2. With Postgres each shard uses
+# POSTGRES_DB_<NAME> / POSTGRES_HOST_<NAME> (defaulting to the main server and
+# `<POSTGRES_DB>_<name>`); without Postgres, `db_<name>.sqlite3` files.
+for _shard in [s.strip() for s in os.environ.get('DB_SHARDS', '').split(',') if s.strip()]:
+    _config = dict(DATABASES['default'])
+    if _config['ENGINE'] == 'django.db.backends.postgresql':
+        _config['NAME'] = os.environ.get(f'POSTGRES_DB_{_shard.upper()}', f"{_config['NAME']}_{_shard}")
+        _config['HOST'] = os.environ.get(f'POSTGRES_HOST_{_shard.upper()}', _config['HOST'])
+    else:
+        _config['NAME'] = BASE_DIR / f'db_{_shard}.sqlite3'
+    DATABASES[_shard] = _config
+TENANT_SHARDS = list(DATABASES)
+
+# Read replicas (see hms.replicas): DB_REPLICAS=default,shard1 adds a
+# `<alias>_replica` database for each listed alias, on POSTGRES_REPLICA_HOST_<ALIAS>.
+# Without Postgres the replica is a second connection to the primary's SQLite
+# file (nothing replicates SQLite), which only exercises the routing.
+# Safe-method requests read from it unless the client wrote in the last
+# REPLICA_STICKY_SECONDS; replicas lagging more than REPLICA_MAX_LAG seconds
+# are skipped.
+DATABASE_REPLICAS = {}
+for _primary in [s.strip() for s in os.environ.get('DB_REPLICAS', '').split(',') if s.strip()]:
+    _config = dict(DATABASES[_primary])
+    if _config['ENGINE'] == 'django.db.backends.postgresql':
+        _config['HOST'] = os.environ.get(f'POSTGRES_REPLICA_HOST_{_primary.upper()}', _config['HOST'])
+    _config['TEST'] = {'MIRROR': _primary}
+    DATABASES[f'{_primary}_replica'] = _config
+    DATABASE_REPLICAS[_primary] = [f'{_primary}_replica']
+REPLICA_STICKY_SECONDS = float(os.environ.get('REPLICA_STICKY_SECONDS', '5'))
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', str(REPLICA_STICKY_SECONDS)))
+REPLICA_HEALTH_INTERVAL = float(os.environ.get('REPLICA_HEALTH_INTERVAL', '5'))
+DATABASE_ROUTERS = ['hms.replicas.ReplicaRouter', 'tenants.sharding.TenantShardRouter']
+
+# Postgres connection reuse (see hms.db_pool): DB_POOL=off opens a connection
+# per request; `persistent` keeps each worker thread's connection for
+# DB_CONN_MAX_AGE seconds; `pool` (psycopg 3) shares at most DB_POOL_MAX_SIZE
+# connections per worker process and database, waiting up to DB_POOL_TIMEOUT
+# seconds for a free one. Reused connections are checked before each request.
+DB_POOL = os.environ.get('DB_POOL', 'off').lower()
+if DB_POOL not in ('off', 'persistent', 'pool'):
+    raise ImproperlyConfigured(f"DB_POOL must be off, persistent or pool, not '{DB_POOL}'")
+for _config in DATABASES.values():
+    if _config['ENGINE'] != 'django.db.backends.postgresql':
+        continue
+    if DB_POOL == 'off':
+        continue
+    # in pool mode this makes the pool check connections on checkout
+    _config['CONN_HEALTH_CHECKS'] = True
+    if DB_POOL == 'persistent':
+        _config['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', '60'))
+    else:
+        _config['OPTIONS'] = {**_config.get('OPTIONS', {}), 'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '1')),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+            'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', '600')),
+        }}
+
 AUTH_PASSWORD_VALIDATORS = []
 
 LANGUAGE_CODE = 'fr'
@@ -112,7 +176,10 @@ from corsheaders.defaults import default_headers
 CORS_ALLOW_HEADERS = list(default_headers) + [
     'x-tenant-slug',
     'X-Tenant-Slug',
+    'x-read-primary-until',
 ]
+# read-your-writes pin set after writes (middleware.replica_middleware)
+CORS_EXPOSE_HEADERS = ['X-Read-Primary-Until']
 
 
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
@@ -122,6 +189,8 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    # keyset pagination, opt-in per request via ?page_size= / ?cursor=
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
 }
 
 # CSRF trusted origins: allow the frontend host for cross-site POSTs when in production.
@@ -141,3 +210,73 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
+
+# Appointments: default booking length (minutes) when Appointment.duration_minutes
+# is empty, and working hours of staff without WorkingHours rows
+# ({weekday: [(start, end), ...]}, Monday = 0).
+APPOINTMENT_DEFAULT_DURATION = int(os.environ.get('APPOINTMENT_DEFAULT_DURATION', '30'))
+APPOINTMENT_WORKING_HOURS = {day: [('08:00', '17:00')] for day in range(5)}
+
+# Delta sync (/api/sync/): rows newer than SYNC_SAFETY_LAG seconds wait for the
+# next call; deletion tombstones are kept SYNC_TOMBSTONE_RETENTION_DAYS days
+# (prune with `manage.py prune_tombstones`).
+SYNC_SAFETY_LAG = int(os.environ.get('SYNC_SAFETY_LAG', '2'))
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', '30'))
+
+# Inventory: allow stock movements to take quantities below zero, and how long
+# the per-tenant low-stock list may be cached (it is also dropped on stock writes).
+INVENTORY_ALLOW_NEGATIVE_STOCK = os.environ.get('INVENTORY_ALLOW_NEGATIVE_STOCK', 'False').lower() in ('1', 'true', 'yes')
+INVENTORY_LOW_STOCK_CACHE_TTL = int(os.environ.get('INVENTORY_LOW_STOCK_CACHE_TTL', '300'))
+
+# Async read views (core.async_views) for billing totals, patient detail and
+# /api/me/; on by default when served through hms.asgi, whose workers then keep
+# handling other requests while those wait on the database.
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', 'False').lower() in ('1', 'true', 'yes')
+
+# Cache backend, no external service: CACHE_BACKEND=locmem (default; private to
+# each worker process) or file (CACHE_DIR, shared by the workers of a host).
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem').lower()
+if CACHE_BACKEND not in ('locmem', 'file'):
+    raise ImproperlyConfigured(f"CACHE_BACKEND must be locmem or file, not '{CACHE_BACKEND}'")
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache' if CACHE_BACKEND == 'file'
+        else 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.environ.get('CACHE_DIR', '/tmp/hms-cache') if CACHE_BACKEND == 'file' else 'hms',
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '5000'))},
+    }
+}
+
+# Request performance instrumentation (middleware.performance): the share of
+# requests whose queries and rendering are measured (Server-Timing header unless
+# PERF_SERVER_TIMING is off, `hms.perf` log line), and the per-request budgets
+# beyond which a request is logged as a warning.
+PERF_SAMPLE_RATE = float(os.environ.get('PERF_SAMPLE_RATE', '1' if DEBUG else '0.05'))
+if not 0 <= PERF_SAMPLE_RATE <= 1:
+    raise ImproperlyConfigured(f'PERF_SAMPLE_RATE must be between 0 and 1, not {PERF_SAMPLE_RATE}')
+PERF_SERVER_TIMING = os.environ.get('PERF_SERVER_TIMING', 'True').lower() in ('1', 'true', 'yes')
+PERF_TIME_BUDGET_MS = float(os.environ.get('PERF_TIME_BUDGET_MS', '500'))
+PERF_QUERY_BUDGET = int(os.environ.get('PERF_QUERY_BUDGET', '50'))
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {
+        # PERF_LOG_LEVEL=WARNING keeps only the over-budget requests
+        'hms.perf': {'handlers': ['console'], 'level': os.environ.get('PERF_LOG_LEVEL', 'INFO'), 'propagate': False},
+    },
+}
+
+# Prometheus metrics (hms.metrics) at /metrics, answered only for the
+# addresses or networks in METRICS_ALLOWED_IPS (comma-separated). The client
+# address is REMOTE_ADDR; X-Forwarded-For is only read behind the proxies
+# listed in METRICS_TRUSTED_PROXIES.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() in ('1', 'true', 'yes')
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1').split(',') if ip.strip()]
+METRICS_TRUSTED_PROXIES = [ip.strip() for ip in os.environ.get('METRICS_TRUSTED_PROXIES', '').split(',') if ip.strip()]
+
+# GET list/detail responses of the core viewsets (core.response_cache), per
+# tenant, role and query; dropped on writes to the models they show, else kept
+# RESPONSE_CACHE_TTL seconds (0 disables). Entries are also keyed by the
+# data's ETag, so writes made through another worker are seen at once too.
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', '30'))
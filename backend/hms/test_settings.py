@@ -0,0 +1,27 @@
+"""Settings for `manage.py test` (picked by manage.py): the project settings
+on SQLite, whatever the environment says about Postgres."""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        # concurrency tests write from several threads: an on-disk test
+        # database whose writers wait for each other instead of failing
+        'OPTIONS': {'timeout': 30},
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    },
+    # a second tenant shard (see tenants.sharding); in memory, so migrating
+    # default (which looks at every shard) leaves no file behind
+    'shard1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
+}
+TENANT_SHARDS = list(DATABASES)
+# a replica mirroring the test database: routing and stickiness are
+# exercised, reads see the same rows
+DATABASES['default_replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+DATABASE_REPLICAS = {'default': ['default_replica']}
+PERF_SAMPLE_RATE = 0
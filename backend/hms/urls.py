@@ -1,16 +1,15 @@
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework_simplejwt.views import (
-    TokenRefreshView,
-)
-from core.auth import EmailOrUsernameTokenView
+from core.auth import EmailOrUsernameTokenView, StaffClaimsTokenRefreshView
+from core.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/tenants/', include('tenants.urls')),
     path('api/', include('core.urls')),
     path('api/token/', EmailOrUsernameTokenView.as_view(), name='token_obtain_pair'),
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/token/refresh/', StaffClaimsTokenRefreshView.as_view(), name='token_refresh'),
+    path('metrics', metrics, name='metrics'),
 ]
 
 # Custom error handlers (use dotted path to view)
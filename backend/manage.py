@@ -3,7 +3,9 @@ import os
 import sys
 
 if __name__ == '__main__':
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hms.settings')
+    # tests run on SQLite with their own database aliases (hms.test_settings)
+    default_settings = 'hms.test_settings' if sys.argv[1:2] == ['test'] else 'hms.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', default_settings)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -1,4 +1,5 @@
 import os
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.conf import settings
 from django.http import HttpResponseServerError
 
@@ -21,22 +22,38 @@ class DebugGuardMiddleware:
     Configure allowed IPs with `DEBUG_ALLOWED_IPS=127.0.0.1,203.0.113.5`.
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
         raw = os.environ.get('DEBUG_ALLOWED_IPS', '127.0.0.1')
         self.allowed = {ip.strip() for ip in raw.split(',') if ip.strip()}
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         try:
             return self.get_response(request)
         except Exception:
-            # If DEBUG is enabled, only reveal the technical debug page to
-            # allowed IP addresses. Otherwise, return a simple 500.
-            if settings.DEBUG:
-                client_ip = _client_ip_from_request(request)
-                if client_ip in self.allowed:
-                    # Re-raise so Django's technical_500_response runs.
-                    raise
-                return HttpResponseServerError('Internal Server Error')
-            # In non-debug mode, behave normally (re-raise exception).
-            raise
+            return self._handle_exception(request)
+
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        except Exception:
+            return self._handle_exception(request)
+
+    def _handle_exception(self, request):
+        # If DEBUG is enabled, only reveal the technical debug page to
+        # allowed IP addresses. Otherwise, return a simple 500.
+        if settings.DEBUG:
+            client_ip = _client_ip_from_request(request)
+            if client_ip in self.allowed:
+                # Re-raise so Django's technical_500_response runs.
+                raise
+            return HttpResponseServerError('Internal Server Error')
+        # In non-debug mode, behave normally (re-raise exception).
+        raise
@@ -0,0 +1,140 @@
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from hms import metrics, perf
+
+logger = logging.getLogger('hms.perf')
+
+
+class PerformanceMiddleware:
+    """
+    Measure where requests spend their time.
+
+    Every request is timed; a share of them (`PERF_SAMPLE_RATE`, 0 to 1) is
+    fully instrumented: database query count and time, serializer time
+    (`.data` of the viewsets' serializers, queries excluded), response
+    rendering time and body size. Sampled requests get a
+    `Server-Timing` header (unless `PERF_SERVER_TIMING` is off) and an INFO
+    line on the `hms.perf` logger, with the same fields as `extra={'perf': ...}`
+    for structured formatters.
+
+    Requests slower than `PERF_TIME_BUDGET_MS`, or running more than
+    `PERF_QUERY_BUDGET` queries (only known when sampled), are logged as
+    WARNING with the exceeded budgets in `over_budget`.
+
+    Unless `METRICS_ENABLED` is off, every request is also recorded in the
+    Prometheus metrics (hms.metrics).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        perf.install()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, counted, started = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self._stop(token, counted)
+        return self._finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats, token, counted, started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._stop(token, counted)
+        return self._finish(request, response, stats, started)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook returns
+        stats = perf.current()
+        if stats is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(lambda r: stats.add('render', time.perf_counter() - started))
+        return response
+
+    @staticmethod
+    def _start():
+        stats = token = None
+        if random.random() < getattr(settings, 'PERF_SAMPLE_RATE', 0):
+            stats = perf.RequestStats()
+            token = perf.activate(stats)
+        counted = metrics.enabled()
+        if counted:
+            metrics.request_started()
+        return stats, token, counted, time.perf_counter()
+
+    @staticmethod
+    def _stop(token, counted):
+        if token is not None:
+            perf.deactivate(token)
+        if counted:
+            metrics.request_stopped()
+
+    def _finish(self, request, response, stats, started):
+        total_ms = (time.perf_counter() - started) * 1000
+        view = perf.view_label(request)
+        if metrics.enabled():
+            metrics.observe_request(view, request.method, response.status_code, total_ms / 1000,
+                                    stats.queries if stats is not None else None)
+        over_budget = []
+        if total_ms > getattr(settings, 'PERF_TIME_BUDGET_MS', 500):
+            over_budget.append('time')
+        if stats is not None and stats.queries > getattr(settings, 'PERF_QUERY_BUDGET', 50):
+            over_budget.append('queries')
+        if stats is None and not over_budget:
+            return response
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+        }
+        if stats is not None:
+            record.update({
+                'db_queries': stats.queries,
+                'db_ms': round(stats.query_seconds * 1000, 2),
+                'serialize_ms': round(stats.timings.get('serialize', 0.0) * 1000, 2),
+                'render_ms': round(stats.timings.get('render', 0.0) * 1000, 2),
+                'bytes': self._size(response),
+            })
+            if getattr(settings, 'PERF_SERVER_TIMING', True):
+                response['Server-Timing'] = self._server_timing(record)
+        record['sampled'] = stats is not None
+        if over_budget:
+            record['over_budget'] = over_budget
+        logger.log(logging.WARNING if over_budget else logging.INFO, 'request %s', json.dumps(record), extra={'perf': record})
+        return response
+
+    @staticmethod
+    def _size(response):
+        if not getattr(response, 'streaming', False):
+            return len(response.content)
+        length = response.get('Content-Length')
+        return int(length) if length else None
+
+    @staticmethod
+    def _server_timing(record):
+        app_ms = max(record['total_ms'] - record['db_ms'] - record['serialize_ms'] - record['render_ms'], 0)
+        return ', '.join([
+            f'db;dur={record["db_ms"]};desc="{record["db_queries"]} queries"',
+            f'serialize;dur={record["serialize_ms"]}',
+            f'render;dur={record["render_ms"]}',
+            f'app;dur={app_ms:.2f}',
+            f'total;dur={record["total_ms"]}',
+        ])
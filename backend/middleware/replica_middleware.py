@@ -0,0 +1,71 @@
+import math
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from hms import replicas
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaMiddleware:
+    """
+    Let safe-method requests read from database replicas (see hms.replicas),
+    except for clients that wrote recently: read-your-writes stickiness.
+
+    After any other request the response carries, as a cookie and as the
+    `X-Read-Primary-Until` header, the epoch time until which that client's
+    reads stay on the primary (`REPLICA_STICKY_SECONDS`, default 5). Clients
+    that cannot keep cookies echo the header back.
+    """
+
+    cookie_name = 'read_primary_until'
+    header_name = 'X-Read-Primary-Until'
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = replicas.activate(self._use_replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            replicas.deactivate(token)
+        return self._pin(request, response)
+
+    async def __acall__(self, request):
+        token = replicas.activate(self._use_replica(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            replicas.deactivate(token)
+        return self._pin(request, response)
+
+    def _use_replica(self, request):
+        return request.method in SAFE_METHODS and bool(replicas.replicas()) and not self._pinned(request)
+
+    def _pin(self, request, response):
+        if request.method not in SAFE_METHODS:
+            sticky = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+            until = f'{time.time() + sticky:.3f}'
+            response.set_cookie(
+                self.cookie_name, until, max_age=math.ceil(sticky),
+                httponly=True, samesite='Lax', secure=request.is_secure(),
+            )
+            response[self.header_name] = until
+        return response
+
+    def _pinned(self, request):
+        raw = request.COOKIES.get(self.cookie_name) or request.META.get('HTTP_X_READ_PRIMARY_UNTIL')
+        try:
+            return float(raw) > time.time()
+        except (TypeError, ValueError):
+            return False
@@ -1,9 +1,10 @@
 from django.utils.deprecation import MiddlewareMixin
-from tenants.models import Tenant
+from tenants import sharding
+from tenants.cache import tenant_cache
 from django.contrib.auth import get_user_model
-import base64
-import json
-from django.conf import settings
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
 
 
 class TenantMiddleware(MiddlewareMixin):
@@ -11,9 +12,31 @@ class TenantMiddleware(MiddlewareMixin):
     Simple tenant middleware: sets `request.tenant` from an HTTP header `X-Tenant-Slug`
     or query param `tenant`. For MVP we keep it simple; production may use subdomains
     or authentication-associated tenant.
+
+    Without a slug, the bearer token's signed `tenant_slug`/`tenant_id` claims
+    (see core.auth.add_staff_claims) are used; tokens issued before those
+    claims existed are resolved through the user's staff profile.
+
+    The shard of the resolved tenant (see tenants.sharding) is activated
+    until the response is returned and exposed as `request.tenant_db`.
     """
 
     def process_request(self, request):
+        self._resolve_tenant(request)
+        request.tenant_db = sharding.db_for_tenant(request.tenant) if request.tenant is not None else None
+        request._tenant_db_token = sharding.activate(request.tenant_db)
+
+    def process_response(self, request, response):
+        token = getattr(request, '_tenant_db_token', None)
+        if token is not None:
+            try:
+                sharding.deactivate(token)
+            except ValueError:
+                # created in another context (async handlers): nothing to restore here
+                pass
+        return response
+
+    def _resolve_tenant(self, request):
         slug = None
         # prefer header
         slug = request.META.get('HTTP_X_TENANT_SLUG') or request.GET.get('tenant')
@@ -22,55 +45,56 @@ class TenantMiddleware(MiddlewareMixin):
             try:
                 user = getattr(request, 'user', None)
                 if user and getattr(user, 'is_authenticated', False):
-                    staff = getattr(user, 'staff_profile', None)
+                    staff = sharding.find_staff(user)
                     if staff and getattr(staff, 'tenant', None):
                         request.tenant = staff.tenant
                         return
             except Exception:
                 pass
 
-            # Fallback 2: if Authorization: Bearer <token> header present (JWT), try to decode payload
+            # Fallback 2: if Authorization: Bearer <token> header present (JWT), verify it
+            # and use its signed tenant claims; legacy tokens without claims hit the DB.
             auth = request.META.get('HTTP_AUTHORIZATION', '')
             if auth and auth.startswith('Bearer '):
                 token = auth.split(' ', 1)[1].strip()
                 try:
-                    parts = token.split('.')
-                    if len(parts) >= 2:
-                        payload_b64 = parts[1]
-                        # base64 url decode with padding
-                        padded = payload_b64 + '=' * (-len(payload_b64) % 4)
-                        decoded = base64.urlsafe_b64decode(padded.encode('utf-8'))
-                        payload = json.loads(decoded.decode('utf-8'))
-                        user_id = payload.get('user_id') or payload.get('user') or payload.get('sub') or payload.get('username')
-                        User = get_user_model()
+                    payload = AccessToken(token).payload
+                except TokenError:
+                    payload = None
+                if payload is not None:
+                    request.jwt_claims = payload
+                    if 'tenant_slug' in payload:
+                        request.tenant = self._tenant_from_claims(payload)
+                        return
+                    try:
+                        user_id = payload.get(api_settings.USER_ID_CLAIM)
                         user_obj = None
                         if user_id:
-                            # try numeric id first
-                            try:
-                                user_obj = User.objects.filter(id=user_id).first()
-                            except Exception:
-                                # maybe username
-                                user_obj = User.objects.filter(username=user_id).first()
-                        if not user_obj and payload.get('username'):
-                            user_obj = User.objects.filter(username=payload.get('username')).first()
+                            User = get_user_model()
+                            user_obj = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
                         if user_obj:
-                            try:
-                                staff = getattr(user_obj, 'staff_profile', None)
-                                if staff and getattr(staff, 'tenant', None):
-                                    request.tenant = staff.tenant
-                                    return
-                            except Exception:
-                                pass
-                except Exception:
-                    # decoding failed; ignore and continue
-                    pass
+                            staff = sharding.find_staff(user_obj)
+                            if staff and getattr(staff, 'tenant', None):
+                                request.tenant = staff.tenant
+                                return
+                    except Exception:
+                        pass
 
             # final fallback: no tenant found
             request.tenant = None
             return
 
-        try:
-            tenant = Tenant.objects.get(slug=slug)
-            request.tenant = tenant
-        except Tenant.DoesNotExist:
-            request.tenant = None
+        # cached slug lookup (see tenants.cache); None for unknown slugs
+        request.tenant = tenant_cache.get(slug)
+
+    @staticmethod
+    def _tenant_from_claims(payload):
+        slug = payload.get('tenant_slug')
+        if not slug:
+            return None
+        tenant = tenant_cache.get(slug)
+        if payload.get('tenant_id') and (tenant is None or str(tenant.id) != str(payload.get('tenant_id'))):
+            # slug was renamed/reused since the token was issued
+            from tenants.models import Tenant
+            tenant = Tenant.objects.filter(id=payload.get('tenant_id')).first()
+        return tenant
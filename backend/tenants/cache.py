@@ -0,0 +1,88 @@
+"""In-process slug -> Tenant cache used by TenantMiddleware.
+
+Entries expire after `TENANT_CACHE_TTL` seconds (default 300) and are dropped
+as soon as the Tenant is saved or deleted in this process (see
+tenants.signals); the TTL bounds staleness in other workers. Unknown slugs
+are cached too, for `TENANT_CACHE_NEGATIVE_TTL` seconds (default 10), so
+requests with bogus slugs cannot hammer the database. At most
+`TENANT_CACHE_MAX_ENTRIES` slugs (default 1000) are kept.
+"""
+import threading
+import time
+
+from django.conf import settings
+from hms import metrics
+
+from .models import Tenant
+
+
+class TenantSlugCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'TENANT_CACHE_TTL', 300)
+
+    @property
+    def negative_ttl(self):
+        return getattr(settings, 'TENANT_CACHE_NEGATIVE_TTL', 10)
+
+    @property
+    def max_entries(self):
+        return getattr(settings, 'TENANT_CACHE_MAX_ENTRIES', 1000)
+
+    def get(self, slug):
+        """Return the Tenant for `slug`, or None if no such tenant exists."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(slug)
+            if entry is not None and entry[0] > now:
+                if entry[1] is None:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+                metrics.cache_lookup('tenant_slug', True)
+                return entry[1]
+            self.misses += 1
+        metrics.cache_lookup('tenant_slug', False)
+
+        tenant = Tenant.objects.filter(slug=slug).first()
+        ttl = self.ttl if tenant is not None else self.negative_ttl
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._evict(now)
+            self._entries[slug] = (now + ttl, tenant)
+        return tenant
+
+    def _evict(self, now):
+        # drop expired entries first, then the ones closest to expiry
+        for slug in [s for s, e in self._entries.items() if e[0] <= now]:
+            del self._entries[slug]
+        overflow = len(self._entries) - self.max_entries + 1
+        if overflow > 0:
+            for slug, _ in sorted(self._entries.items(), key=lambda item: item[1][0])[:overflow]:
+                del self._entries[slug]
+
+    def invalidate(self, slug=None):
+        with self._lock:
+            if slug is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(slug, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+            }
+
+
+tenant_cache = TenantSlugCache()
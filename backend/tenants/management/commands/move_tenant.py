@@ -0,0 +1,132 @@
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+
+# tenant data in insertion order, with the lookup selecting one tenant's rows
+TENANT_MODELS = [
+    ('core.Staff', 'tenant'),
+    ('core.WorkingHours', 'staff__tenant'),
+    ('core.Patient', 'tenant'),
+    ('core.RecordNumberSequence', 'tenant'),
+    ('core.Appointment', 'tenant'),
+    ('core.InventoryItem', 'tenant'),
+    ('core.Acte', 'tenant'),
+    ('core.ActeCatalogVersion', 'tenant'),
+    ('core.ActeConsumable', 'acte__tenant'),
+    ('core.StockMovement', 'tenant'),
+    ('core.StockSnapshot', 'item__tenant'),
+    ('core.Billing', 'tenant'),
+    ('core.BillingItem', 'billing__tenant'),
+    ('core.BillingPayment', 'billing__tenant'),
+    ('core.BillingDailyTotal', 'tenant'),
+    ('core.Tombstone', 'tenant_id'),
+]
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy a tenant's data to another database alias (shard) and point the tenant at it. "
+        "Stop writes for the tenant meanwhile: other workers follow the move once their "
+        "tenant cache expires (TENANT_CACHE_TTL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', type=str, help='Tenant slug')
+        parser.add_argument('target', type=str, help='Destination database alias (one of TENANT_SHARDS)')
+        parser.add_argument('--delete-source', action='store_true', help="Delete the tenant's rows from the old shard afterwards")
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows would be copied')
+
+    def handle(self, *args, **options):
+        from core.models import ActeCatalogVersion
+        from tenants import sharding
+        from tenants.models import Tenant, UserShard
+
+        tenant = Tenant.objects.filter(slug=options['slug']).first()
+        if tenant is None:
+            raise CommandError(f"Tenant '{options['slug']}' not found")
+        source, target = sharding.db_for_tenant(tenant), options['target']
+        if target not in sharding.shard_aliases():
+            raise CommandError(f"'{target}' is not a tenant shard (TENANT_SHARDS: {', '.join(sharding.shard_aliases())})")
+        if target == source:
+            raise CommandError(f"Tenant '{tenant.slug}' already lives on '{target}'")
+        self._check_coverage()
+
+        plan = [(apps.get_model(label), lookup) for label, lookup in TENANT_MODELS]
+        counts = {m._meta.label: self._rows(m, lookup, tenant, source).count() for m, lookup in plan}
+        for label, count in counts.items():
+            self.stdout.write(f'{label}: {count}')
+        if options['dry_run']:
+            return
+
+        with transaction.atomic(using=target):
+            # directory rows the tenant's data refers to
+            sharding.mirror(tenant, target)
+            staff_users = list(apps.get_model('core.Staff').objects.using(source).filter(tenant=tenant, user__isnull=False).values_list('user_id', flat=True))
+            for user in get_user_model().objects.filter(pk__in=staff_users):
+                sharding.mirror(user, target)
+            # leftovers of an earlier, interrupted move
+            for model, lookup in reversed(plan):
+                self._raw_delete(self._rows(model, lookup, tenant, target))
+            for model, lookup in plan:
+                self._copy(model, self._rows(model, lookup, tenant, source), target)
+            for model, lookup in plan:
+                copied = self._rows(model, lookup, tenant, target).count()
+                if copied != counts[model._meta.label]:
+                    raise CommandError(f'{model._meta.label}: copied {copied} of {counts[model._meta.label]} rows, nothing changed')
+            # cached catalogs hold Acte instances bound to the old shard
+            ActeCatalogVersion.bump(tenant.pk, using=target)
+
+        tenant.db_alias = target
+        tenant.save(update_fields=['db_alias'])
+        # the raw copies sent no signals: point the staff users' directory
+        # entries at the new shard (rows left on the source are stale)
+        for user_id in staff_users:
+            UserShard.record(user_id, target)
+            UserShard.forget(user_id, source)
+        self.stdout.write(self.style.SUCCESS(f"Tenant '{tenant.slug}' moved from '{source}' to '{target}'."))
+
+        if options['delete_source']:
+            with transaction.atomic(using=source):
+                for model, lookup in reversed(plan):
+                    self._raw_delete(self._rows(model, lookup, tenant, source))
+                if source != DEFAULT_DB_ALIAS:
+                    Tenant.objects.using(source).filter(pk=tenant.pk).delete()
+            self.stdout.write(self.style.SUCCESS(f"Deleted the tenant's rows from '{source}'."))
+
+    @staticmethod
+    def _check_coverage():
+        listed = {label for label, _ in TENANT_MODELS}
+        missing = [m._meta.label for m in apps.get_app_config('core').get_models() if m._meta.label not in listed]
+        if missing:
+            raise CommandError(f"Models not handled by move_tenant: {', '.join(missing)}")
+
+    @staticmethod
+    def _rows(model, lookup, tenant, alias):
+        return model._base_manager.using(alias).filter(**{lookup: tenant.pk}).order_by('pk')
+
+    @staticmethod
+    def _copy(model, queryset, target):
+        # raw inserts (as loaddata does): keep timestamps and computed columns as
+        # they are and fire no signals. Integer ids are reassigned by the target,
+        # where they could collide with other tenants' rows; nothing refers to them.
+        fields = [
+            f for f in model._meta.local_concrete_fields
+            if not (f.primary_key and isinstance(f, models.AutoField))
+        ]
+        manager = model._base_manager.using(target)
+        batch = []
+        for obj in queryset.iterator(chunk_size=BATCH_SIZE):
+            batch.append(obj)
+            if len(batch) >= BATCH_SIZE:
+                manager._insert(batch, fields=fields, using=target, raw=True)
+                batch = []
+        if batch:
+            manager._insert(batch, fields=fields, using=target, raw=True)
+
+    @staticmethod
+    def _raw_delete(queryset):
+        # the rows are moved, not deleted: no tombstones, rollup updates or cascades
+        queryset._raw_delete(queryset.db)
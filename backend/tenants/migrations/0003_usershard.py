@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, migrations, models
+
+
+def record_staff_users(apps, schema_editor):
+    # the directory lives on `default`; shards may be migrated before or after it
+    UserShard = apps.get_model('tenants', 'UserShard')
+    Staff = apps.get_model('core', 'Staff')
+    db = schema_editor.connection.alias
+    if db == DEFAULT_DB_ALIAS:
+        shards = getattr(settings, 'TENANT_SHARDS', None) or settings.DATABASES
+        sources = [a for a in shards if Staff._meta.db_table in connections[a].introspection.table_names()]
+    elif UserShard._meta.db_table in connections[DEFAULT_DB_ALIAS].introspection.table_names():
+        sources = [db]
+    else:
+        return
+    for alias in sources:
+        UserShard.objects.using(DEFAULT_DB_ALIAS).bulk_create([
+            UserShard(user_id=user_id, db_alias=alias)
+            for user_id in Staff.objects.using(alias).filter(user__isnull=False).values_list('user_id', flat=True)
+        ], batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0002_tenant_db_alias'),
+        ('core', '0016_acte_consumables'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('db_alias', models.CharField(max_length=64)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'db_alias')},
+            },
+        ),
+        migrations.RunPython(record_staff_users, migrations.RunPython.noop),
+    ]
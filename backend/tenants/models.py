@@ -1,5 +1,6 @@
 import uuid
-from django.db import models
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, models
 
 
 class Tenant(models.Model):
@@ -7,6 +8,39 @@ class Tenant(models.Model):
     name = models.CharField(max_length=255)
     slug = models.SlugField(max_length=128, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # database alias holding this tenant's data (see tenants.sharding);
+    # change it with `manage.py move_tenant`
+    db_alias = models.CharField(max_length=64, default='default')
 
     def __str__(self):
         return self.name
+
+
+class UserShard(models.Model):
+    """Directory entry: `user` has a Staff profile on shard `db_alias`.
+
+    Kept on `default` (see tenants.sharding) by the Staff signal handlers and
+    `move_tenant`, so finding a user's profile and refreshing their mirrors
+    only touches the shards that hold them.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    db_alias = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = (('user', 'db_alias'),)
+
+    def __str__(self):
+        return f"{self.user_id} @ {self.db_alias}"
+
+    @classmethod
+    def aliases_of(cls, user_id):
+        return list(cls.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id).values_list('db_alias', flat=True))
+
+    @classmethod
+    def record(cls, user_id, alias):
+        cls.objects.using(DEFAULT_DB_ALIAS).bulk_create([cls(user_id=user_id, db_alias=alias)], ignore_conflicts=True)
+
+    @classmethod
+    def forget(cls, user_id, alias):
+        cls.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id, db_alias=alias).delete()
@@ -0,0 +1,128 @@
+"""Tenant sharding: every tenant's rows live in a single database alias, its shard.
+
+`Tenant.db_alias` is the shard map. TenantMiddleware activates the shard of
+`request.tenant` for the duration of the request, and TenantShardRouter
+sends every query on tenant data (the `core` app) there; outside a request
+(shell, management commands) wrap the work in `using_tenant_db(tenant)`.
+
+Directory data (tenants, users, sessions, admin) is canonical on `default`.
+Every shard carries the full schema (`migrate --database=<alias>`) and keeps
+mirrors of its tenants' Tenant rows and of the Users linked to their staff,
+so foreign keys and joins such as `order_by('user__last_name')` stay local
+to the shard. Mirrors are maintained by tenants.signals; the UserShard
+directory on `default` records which shards hold a copy of each user.
+
+Aliases listed in `TENANT_SHARDS` (default: every database) can host tenants.
+"""
+import copy
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# apps whose rows belong to a tenant and follow it to its shard
+SHARDED_APPS = {'core'}
+
+_current_db = ContextVar('tenant_db', default=None)
+
+
+def shard_aliases():
+    return list(getattr(settings, 'TENANT_SHARDS', None) or settings.DATABASES)
+
+
+def db_for_tenant(tenant):
+    """Alias holding `tenant`'s rows (`default` when unsharded or unknown)."""
+    return getattr(tenant, 'db_alias', None) or DEFAULT_DB_ALIAS
+
+
+def current_db():
+    """Shard activated for the current request / context, if any."""
+    return _current_db.get()
+
+
+def activate(alias):
+    """Route tenant data to `alias` in this context; returns a token for deactivate()."""
+    return _current_db.set(alias)
+
+
+def deactivate(token):
+    _current_db.reset(token)
+
+
+@contextmanager
+def using_tenant_db(tenant):
+    token = activate(db_for_tenant(tenant))
+    try:
+        yield
+    finally:
+        deactivate(token)
+
+
+def is_sharded(model):
+    return model._meta.app_label in SHARDED_APPS
+
+
+def mirror(instance, alias):
+    """Upsert a copy of directory row `instance` into shard `alias`, as is
+    (raw save: no auto_now values, signal handlers see raw=True)."""
+    if alias == DEFAULT_DB_ALIAS:
+        return
+    clone = copy.copy(instance)
+    clone._state = copy.copy(instance._state)
+    clone.save_base(raw=True, using=alias)
+
+
+def find_staff(user):
+    """The Staff profile of `user`: on `default` when unsharded, else on the
+    shards the UserShard directory lists for the user, the active one first
+    (logins happen before any tenant is known)."""
+    from core.models import Staff
+    from tenants.models import UserShard
+
+    if user is None or user.pk is None:
+        return None
+    aliases = shard_aliases()
+    if aliases != [DEFAULT_DB_ALIAS]:
+        known = UserShard.aliases_of(user.pk)
+        aliases = [a for a in aliases if a in known]
+    active = current_db()
+    if active in aliases:
+        aliases.remove(active)
+        aliases.insert(0, active)
+    for alias in aliases:
+        staff = Staff.objects.using(alias).select_related('tenant').filter(user_id=user.pk).first()
+        if staff is not None:
+            return staff
+    return None
+
+
+class TenantShardRouter:
+    """Route tenant data to the active shard; directory data to `default`."""
+
+    def _shard(self, hints):
+        instance = hints.get('instance')
+        if instance is not None and is_sharded(type(instance)) and instance._state.db:
+            # related lookups stay in the instance's own database
+            return instance._state.db
+        return current_db()
+
+    def db_for_read(self, model, **hints):
+        if is_sharded(model):
+            return self._shard(hints)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if is_sharded(model):
+            return self._shard(hints)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if is_sharded(type(obj1)) and is_sharded(type(obj2)):
+            return obj1._state.db == obj2._state.db
+        # tenant data referencing directory rows (mirrored on every shard)
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # full schema on every shard
+        return db in shard_aliases() or None
@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import sharding
+from .cache import tenant_cache
+from .models import Tenant, UserShard
+
+
+@receiver(pre_save, sender=Tenant)
+def tenant_slug_changing(sender, instance, using, raw=False, **kwargs):
+    # a renamed slug must stop resolving to this tenant
+    if instance.pk is not None and not raw and using == DEFAULT_DB_ALIAS:
+        old_slug = Tenant.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+        if old_slug and old_slug != instance.slug:
+            tenant_cache.invalidate(old_slug)
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def tenant_changed(sender, instance, **kwargs):
+    tenant_cache.invalidate(instance.slug)
+
+
+@receiver(post_save, sender=Tenant)
+def tenant_mirrored(sender, instance, using, raw=False, **kwargs):
+    # keep the copy on the tenant's shard in sync (see tenants.sharding)
+    if not raw and using == DEFAULT_DB_ALIAS:
+        sharding.mirror(instance, sharding.db_for_tenant(instance))
+
+
+@receiver(post_delete, sender=Tenant)
+def tenant_deleted(sender, instance, using, **kwargs):
+    # deleting the shard's copy cascades to the tenant's data there
+    alias = sharding.db_for_tenant(instance)
+    if using == DEFAULT_DB_ALIAS and alias != DEFAULT_DB_ALIAS:
+        Tenant.objects.using(alias).filter(pk=instance.pk).delete()
+
+
+def _user_shards(user_id):
+    # shards other than default holding a copy of the user
+    if sharding.shard_aliases() == [DEFAULT_DB_ALIAS]:
+        return []
+    return [a for a in UserShard.aliases_of(user_id) if a != DEFAULT_DB_ALIAS]
+
+
+@receiver(post_save, sender=get_user_model())
+def user_mirrored(sender, instance, using, raw=False, update_fields=None, **kwargs):
+    # refresh the copies of this user held by shards (update only: a shard
+    # gets its copy when a Staff profile there is linked to the user);
+    # last_login is only read on default
+    if raw or using != DEFAULT_DB_ALIAS:
+        return
+    fields = [f for f in sender._meta.concrete_fields if not f.primary_key and f.name != 'last_login']
+    if update_fields is not None:
+        fields = [f for f in fields if f.name in update_fields or f.attname in update_fields]
+    if not fields:
+        return
+    values = {f.attname: getattr(instance, f.attname) for f in fields}
+    for alias in _user_shards(instance.pk):
+        sender.objects.using(alias).filter(pk=instance.pk).update(**values)
+
+
+@receiver(pre_delete, sender=get_user_model())
+def user_deleting(sender, instance, using, **kwargs):
+    # the directory rows go with the user (cascade): read them first
+    if using == DEFAULT_DB_ALIAS:
+        instance._mirrored_on = _user_shards(instance.pk)
+
+
+@receiver(post_delete, sender=get_user_model())
+def user_deleted(sender, instance, using, **kwargs):
+    # drop the shards' copies (their Staff profiles are unlinked, SET_NULL)
+    for alias in getattr(instance, '_mirrored_on', ()):
+        sender.objects.using(alias).filter(pk=instance.pk).delete()
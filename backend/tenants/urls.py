@@ -1,10 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import TenantViewSet
+from .views import TenantViewSet, cache_stats
 
 router = DefaultRouter()
 router.register(r'', TenantViewSet, basename='tenants')
 
 urlpatterns = [
+    # must come before the router, whose detail route would capture it as a pk
+    path('cache-stats/', cache_stats, name='tenant-cache-stats'),
     path('', include(router.urls)),
 ]
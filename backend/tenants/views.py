@@ -1,4 +1,8 @@
 from rest_framework import viewsets
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from .cache import tenant_cache
 from .models import Tenant
 from .serializers import TenantSerializer
 
@@ -6,3 +10,10 @@ from .serializers import TenantSerializer
 class TenantViewSet(viewsets.ModelViewSet):
     queryset = Tenant.objects.all().order_by('name')
     serializer_class = TenantSerializer
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """Hit/miss counters of this worker's tenant slug cache (monitoring)."""
+    return Response(tenant_cache.stats())